@@ -0,0 +1,243 @@
+"""
+analytics.py - Ocupación, ADR y RevPAR por tipo de habitación
+Sistema de Gestión Hotelera (SGH)
+
+Las estancias (incluido el archivo histórico) y las habitaciones se cargan
+una sola vez en arreglos de NumPy; la carga se reutiliza durante el día
+mientras el registro de Cambios no muestre estancias, habitaciones ni cargos
+modificados (los pagos no la invalidan). Al cambiar el día se recarga: las
+estancias activas con la salida vencida ocupan hasta hoy. Las estancias
+con fechas ilegibles se omiten y se cuentan. Cada reporte expande los
+intervalos con un arreglo de diferencias (+1 en la noche de entrada, -1 en
+la de salida, suma acumulada), sin consultar la base día por día.
+
+  ocupación = habitaciones-noche vendidas / habitaciones disponibles
+  ADR       = ingreso de habitaciones / habitaciones-noche vendidas
+  RevPAR    = ingreso de habitaciones / habitaciones disponibles
+
+El ingreso de una estancia es la suma de sus cargos (tipo 'Cargo') repartida
+en partes iguales entre sus noches; si no tiene cargos se estima con el
+precio de la habitación. La capacidad es el inventario actual de habitaciones.
+El ingreso en Bs es el que se cobró: monto_bs de cada cargo, a su propia
+tasa_cambio. El historial de TasasCambio solo valora lo que no trae tasa:
+los cargos sin tasa (a la de su fecha) y las estancias sin cargos (a la tasa
+con la que cerró cada noche). Un mes pasado conserva sus bolívares.
+
+Requiere numpy (opcional: pip install numpy).
+"""
+import threading
+from dataclasses import dataclass
+from datetime import date
+
+try:
+    import numpy as np
+except ImportError:     # solo se necesita para los reportes de ocupación
+    np = None
+
+import database as db
+from queries import registry
+
+
+@dataclass
+class OccupancyData:
+    """Estancias y habitaciones en arreglos, listas para expandir por rango."""
+    tipos:      list        # nombres de tipo, en el orden de los índices
+    capacidad:  "np.ndarray"    # habitaciones por tipo
+    tipo_idx:   "np.ndarray"    # tipo de cada estancia
+    entrada:    "np.ndarray"    # datetime64[D], primera noche
+    salida:     "np.ndarray"    # datetime64[D], día de salida (no se cuenta)
+    tarifa:     "np.ndarray"    # ingreso por noche de cada estancia
+    tarifa_bs:  "np.ndarray"    # ingreso por noche en Bs cobrado (NaN: sin cargos)
+    seq:        int             # último cambio revisado
+    dia:        date            # día de la carga (las activas vencidas llegan hasta él)
+    omitidas:   int = 0         # estancias con fechas ilegibles (no se cuentan)
+
+
+_cache      = {}        # clave del motor -> OccupancyData
+_cache_lock = threading.Lock()
+
+# Tablas cuyos cambios alteran la carga
+_TABLAS = ("Registros", "Habitaciones")
+
+
+def _require_numpy():
+    if np is None:
+        raise RuntimeError("Los reportes de ocupación requieren: pip install numpy")
+
+
+def _fecha(texto: str) -> "np.datetime64":
+    try:
+        return np.datetime64(texto, "D")
+    except ValueError:
+        return np.datetime64("NaT", "D")
+
+
+def _fechas(valores) -> "np.ndarray":
+    """AAAA-MM-DD de cada valor; NaT si falta o no es una fecha válida."""
+    textos = [str(v or "")[:10] for v in valores]
+    try:
+        return np.array(textos, dtype="datetime64[D]")
+    except ValueError:      # datos viejos o cargados a mano: valor por valor
+        return np.array([_fecha(t) for t in textos], dtype="datetime64[D]")
+
+
+def load_data() -> OccupancyData:
+    """Carga estancias y habitaciones desde la base (sin caché)."""
+    _require_numpy()
+    with db.get_connection() as conn:
+        seq          = registry.execute(conn, "cambios.ultimo_seq").fetchone()[0]
+        habitaciones = registry.execute(conn, "analitica.habitaciones").fetchall()
+        estancias    = registry.execute(conn, "analitica.estancias").fetchall()
+        sin_tasa     = registry.execute(conn, "analitica.cargos_sin_tasa").fetchall()
+
+    tipos     = sorted({h["tipo"] for h in habitaciones})
+    indice    = {t: i for i, t in enumerate(tipos)}
+    tipo_hab  = {h["numero"]: indice[h["tipo"]] for h in habitaciones}
+    capacidad = np.bincount([tipo_hab[h["numero"]] for h in habitaciones],
+                            minlength=len(tipos))
+
+    estancias = [e for e in estancias if e["habitacion_id"] in tipo_hab]
+    entrada   = _fechas([e["fecha_entrada"] for e in estancias])
+    salida    = _fechas([e["fecha_salida_prevista"] for e in estancias])
+    validas   = ~(np.isnat(entrada) | np.isnat(salida))
+    omitidas  = int((~validas).sum())
+    estancias = [e for e, ok in zip(estancias, validas) if ok]
+    entrada, salida = entrada[validas], salida[validas]
+    # Estancias activas con la salida vencida siguen ocupando hasta hoy
+    dia       = date.today()
+    hoy       = np.datetime64(dia, "D")
+    activas   = np.array([e["estado"] == "Activo" for e in estancias], dtype=bool)
+    salida    = np.where(activas, np.maximum(salida, hoy + 1), salida)
+    salida    = np.maximum(salida, entrada + 1)       # mínimo una noche
+    noches    = (salida - entrada).astype(np.int64)
+
+    precio    = np.array([e["precio_usd"] or 0.0 for e in estancias], dtype=float)
+    cargos    = np.array([e["cargos"] or 0.0 for e in estancias], dtype=float)
+    ingreso   = np.where(cargos > 0, cargos, precio * noches)
+
+    historico = {}
+    for c in db.convertir_a_bs_historico(sin_tasa):
+        historico[c["registro_id"]] = historico.get(c["registro_id"], 0.0) + (c["monto_bs_historico"] or 0.0)
+    cargos_bs = np.array([(e["cargos_bs"] or 0.0) + historico.get(e["id"], 0.0)
+                          for e in estancias], dtype=float)
+    ingreso_bs = np.where(cargos > 0, cargos_bs, np.nan)
+
+    return OccupancyData(
+        tipos=tipos,
+        capacidad=capacidad,
+        tipo_idx=np.array([tipo_hab[e["habitacion_id"]] for e in estancias], dtype=np.int64),
+        entrada=entrada,
+        salida=salida,
+        tarifa=ingreso / np.maximum(noches, 1),
+        tarifa_bs=ingreso_bs / np.maximum(noches, 1),
+        seq=seq,
+        dia=dia,
+        omitidas=omitidas,
+    )
+
+
+def _cargos_modificados(seq: int, hasta: int) -> bool:
+    with db.get_connection() as conn:
+        return registry.execute(conn, "analitica.cargos_modificados",
+                                {"seq": seq, "hasta": hasta}).fetchone() is not None
+
+
+def get_data() -> OccupancyData:
+    """
+    Datos cargados; se recargan si cambió el día o si cambiaron estancias,
+    habitaciones o cargos desde la última revisión. Si no, se avanza el seq
+    revisado: la próxima consulta solo mira los cambios posteriores.
+    """
+    clave = db.get_backend().key
+    with _cache_lock:
+        datos = _cache.get(clave)
+        if datos is not None and datos.dia != date.today():
+            datos = None
+        if datos is not None:
+            delta = db.get_changes_since(datos.seq, _TABLAS, limit=1)
+            if (delta["reload"] or delta["cambios"]
+                    or _cargos_modificados(datos.seq, delta["seq"])):
+                datos = None
+            else:
+                datos.seq = delta["seq"]
+        if datos is None:
+            datos = _cache[clave] = load_data()
+        return datos
+
+
+def _ratio(a, b):
+    return np.divide(a, b, out=np.zeros(np.broadcast(a, b).shape), where=b > 0)
+
+
+def _acumular(tipo, ini, fin, valores, t: int, n: int) -> "np.ndarray":
+    """Arreglo de diferencias por tipo (+x al entrar, -x al salir), acumulado por día."""
+    serie = np.zeros((t, n + 1))
+    np.add.at(serie, (tipo, ini), valores)
+    np.add.at(serie, (tipo, fin), -valores)
+    return np.cumsum(serie, axis=1)[:, :n]
+
+
+def _resumen(vendidas, ingresos, disponibles, ingresos_bs) -> dict:
+    return {
+        "noches_vendidas": int(vendidas),
+        "ingresos":        round(float(ingresos), 2),
+        "ingresos_bs":     round(float(ingresos_bs), 2),
+        "ocupacion":       round(float(_ratio(vendidas, disponibles)) * 100, 2),
+        "adr":             round(float(_ratio(ingresos, vendidas)), 2),
+        "revpar":          round(float(_ratio(ingresos, disponibles)), 2),
+    }
+
+
+def get_ocupacion(desde: str, hasta: str, datos: OccupancyData | None = None) -> dict:
+    """
+    Ocupación %, ADR y RevPAR por día y por tipo de habitación entre dos
+    fechas AAAA-MM-DD (inclusive). Retorna:
+      {"desde", "hasta", "dias": [fechas],
+       "tipos": {tipo: {"habitaciones", "ocupacion": [%/día], "adr": [...],
+                        "revpar": [...], "resumen": {...}}},
+       "total": {"habitaciones", "ocupacion": [...], ..., "resumen": {...}},
+       "tasas": [tasa Bs/$ de cada día], "omitidas": estancias sin fechas válidas}
+    """
+    _require_numpy()
+    datos = datos or get_data()
+    d0    = np.datetime64(desde, "D")
+    n     = int((np.datetime64(hasta, "D") - d0).astype(np.int64)) + 1
+    if n <= 0:
+        raise ValueError("La fecha final debe ser igual o posterior a la inicial.")
+
+    # Intervalos recortados al rango, en índices de día [ini, fin)
+    ini    = np.clip((datos.entrada - d0).astype(np.int64), 0, n)
+    fin    = np.clip((datos.salida - d0).astype(np.int64), 0, n)
+    dentro = fin > ini
+    ini, fin, tipo = ini[dentro], fin[dentro], datos.tipo_idx[dentro]
+    tarifa, tarifa_bs = datos.tarifa[dentro], datos.tarifa_bs[dentro]
+    cobrado = ~np.isnan(tarifa_bs)
+
+    t           = len(datos.tipos)
+    ocupadas    = _acumular(tipo, ini, fin, np.ones(len(ini)), t, n)
+    ingresos    = _acumular(tipo, ini, fin, tarifa, t, n)
+    # Bs cobrados en los cargos; el USD estimado sin cargos va a la tasa de cada noche
+    ingresos_bs = _acumular(tipo, ini, fin, np.where(cobrado, tarifa_bs, 0.0), t, n)
+    sin_bs      = _acumular(tipo, ini, fin, np.where(cobrado, 0.0, tarifa), t, n)
+
+    dias  = (d0 + np.arange(n)).astype(str).tolist()
+    tasas = np.array(db.get_rate_history().tasas_por_dia(dias), dtype=float)
+    tasas = np.nan_to_num(tasas, nan=db.get_tasa())
+
+    def serie(ocup, ingr, ingr_bs, sin, cap: float) -> dict:
+        return {
+            "habitaciones": int(cap),
+            "ocupacion":    np.round(_ratio(ocup, cap) * 100, 2).tolist(),
+            "adr":          np.round(_ratio(ingr, ocup), 2).tolist(),
+            "revpar":       np.round(_ratio(ingr, cap), 2).tolist(),
+            "resumen":      _resumen(ocup.sum(), ingr.sum(), cap * n, ingr_bs.sum() + sin @ tasas),
+        }
+
+    capacidad = datos.capacidad.astype(float)
+    tipos = {nombre: serie(ocupadas[i], ingresos[i], ingresos_bs[i], sin_bs[i], capacidad[i])
+             for i, nombre in enumerate(datos.tipos)}
+    total = serie(ocupadas.sum(axis=0), ingresos.sum(axis=0), ingresos_bs.sum(axis=0),
+                  sin_bs.sum(axis=0), capacidad.sum())
+
+    return {"desde": desde, "hasta": hasta, "dias": dias, "tipos": tipos, "total": total,
+            "tasas": tasas.tolist(), "omitidas": datos.omitidas}
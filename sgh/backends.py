@@ -0,0 +1,455 @@
+"""
+backends.py - Motores de almacenamiento del DAL (SQLite y PostgreSQL)
+Sistema de Gestión Hotelera (SGH)
+
+database.py no abre conexiones por su cuenta: se las pide al motor activo
+(database.get_backend()). Un motor sabe prestar y devolver conexiones, abrir
+una transacción de escritura, obtener el id de un INSERT, reconocer errores
+de bloqueo reintentables y leer/fijar la versión del esquema.
+
+  SQLiteBackend    ← archivo local con pool por hilo (por defecto)
+  PostgresBackend  ← servidor PostgreSQL (psycopg 3 + psycopg_pool), para
+                     varias sedes/terminales contra una sola base en red
+
+Las sentencias del DAL se escriben con los marcadores de sqlite3 (? y
+:nombre); PostgresBackend los traduce y entrega filas que se comportan como
+sqlite3.Row (acceso por índice, por nombre y dict(fila)).
+"""
+import functools
+import re
+import sqlite3
+import threading
+
+from queries import STATEMENT_CACHE_SIZE
+
+try:
+    import psycopg
+    from psycopg import errors as pg_errors
+    from psycopg_pool import ConnectionPool as PgConnectionPool
+except ImportError:     # PostgreSQL es opcional: solo se necesita con BACKEND="postgresql"
+    psycopg = None
+
+
+def split_sql(script: str) -> list[str]:
+    """Divide un script en sentencias completas (respeta los BEGIN…END de triggers)."""
+    statements, buf = [], ""
+    for line in script.splitlines(keepends=True):
+        buf += line
+        if sqlite3.complete_statement(buf):
+            if buf.strip():
+                statements.append(buf.strip())
+            buf = ""
+    if buf.strip():
+        statements.append(buf.strip())
+    return statements
+
+
+# ─── SQLITE ───────────────────────────────────────────────────────────────────
+
+def _open_connection(database: str, busy_timeout_ms: int, wal: bool,
+                     attach: dict | None = None, connect_script: str = "") -> sqlite3.Connection:
+    """
+    Abre una conexión nueva con la configuración estándar del DAL. `attach`
+    ({alias: archivo}) se adjunta antes de cualquier transacción y
+    connect_script (p. ej. vistas TEMP) se ejecuta en cada conexión nueva.
+    """
+    conn = sqlite3.connect(database, detect_types=sqlite3.PARSE_DECLTYPES,
+                           timeout=busy_timeout_ms / 1000, check_same_thread=False,
+                           cached_statements=STATEMENT_CACHE_SIZE)
+    conn.row_factory = sqlite3.Row
+    conn.execute("PRAGMA foreign_keys = ON")
+    conn.execute(f"PRAGMA busy_timeout = {int(busy_timeout_ms)}")
+    if wal:
+        conn.execute("PRAGMA synchronous = NORMAL")
+    for alias, archivo in (attach or {}).items():
+        conn.execute(f"ATTACH DATABASE ? AS {alias}", (archivo,))
+        if wal:
+            conn.execute(f"PRAGMA {alias}.synchronous = NORMAL")
+    for stmt in split_sql(connect_script):
+        conn.execute(stmt)
+    return conn
+
+
+class ConnectionPool:
+    """
+    Pool acotado de conexiones SQLite de larga vida.
+    Cada hilo recupera preferentemente la última conexión que usó, de modo que
+    en la práctica hay una conexión persistente por hilo de la interfaz.
+    """
+
+    def __init__(self, connect, max_size: int, timeout: float):
+        self.connect  = connect     # connect() → conexión nueva
+        self.max_size = max_size
+        self.timeout  = timeout
+        self._idle    = []          # conexiones libres
+        self._total   = 0           # conexiones abiertas (libres + prestadas)
+        self._cond    = threading.Condition()
+        self._local   = threading.local()
+        self._closed  = False
+
+    def acquire(self) -> sqlite3.Connection:
+        """Presta una conexión sana; espera si el pool está agotado."""
+        with self._cond:
+            while True:
+                if self._closed:
+                    raise sqlite3.ProgrammingError("El pool de conexiones está cerrado.")
+                preferida = getattr(self._local, "conn", None)
+                if preferida is not None and preferida in self._idle:
+                    self._idle.remove(preferida)
+                    conn = preferida
+                    break
+                if self._idle:
+                    conn = self._idle.pop()
+                    break
+                if self._total < self.max_size:
+                    self._total += 1
+                    conn = None
+                    break
+                if not self._cond.wait(self.timeout):
+                    raise sqlite3.OperationalError(
+                        "Tiempo de espera agotado: no hay conexiones libres en el pool.")
+
+        if conn is not None and not self._is_healthy(conn):
+            self._discard(conn)
+            with self._cond:
+                self._total += 1
+            conn = None
+        if conn is None:
+            try:
+                conn = self.connect()
+            except Exception:
+                with self._cond:
+                    self._total -= 1
+                    self._cond.notify()
+                raise
+        self._local.conn = conn
+        return conn
+
+    def release(self, conn: sqlite3.Connection, discard: bool = False):
+        """Devuelve una conexión al pool (o la descarta si quedó inutilizable)."""
+        if not discard and conn.in_transaction:
+            try:
+                conn.rollback()
+            except sqlite3.Error:
+                discard = True
+        if discard or self._closed:
+            self._discard(conn)
+            return
+        with self._cond:
+            self._idle.append(conn)
+            self._cond.notify()
+
+    def close(self):
+        """Cierra todas las conexiones libres; las prestadas se cierran al devolverse."""
+        with self._cond:
+            self._closed = True
+            idle, self._idle = self._idle, []
+        for conn in idle:
+            self._discard(conn)
+
+    @staticmethod
+    def _is_healthy(conn: sqlite3.Connection) -> bool:
+        try:
+            conn.execute("SELECT 1").fetchone()
+            return True
+        except sqlite3.Error:
+            return False
+
+    def _discard(self, conn: sqlite3.Connection):
+        try:
+            conn.close()
+        except sqlite3.Error:
+            pass
+        with self._cond:
+            self._total -= 1
+            self._cond.notify()
+
+
+class SQLiteBackend:
+    name           = "sqlite"
+    Error          = sqlite3.Error
+    supports_fts   = True
+
+    def __init__(self, database: str, pooled: bool = True, pool_size: int = 8,
+                 pool_timeout: float = 10.0, busy_timeout_ms: int = 5000, wal: bool = True,
+                 attach: dict | None = None, connect_script: str = ""):
+        self.key             = database
+        self.database        = database
+        self.busy_timeout_ms = busy_timeout_ms
+        self.wal             = wal
+        self.attach          = dict(attach or {})   # alias -> archivo (p. ej. el archivo histórico)
+        self.connect_script  = connect_script
+        self._pool = ConnectionPool(self.connect, pool_size, pool_timeout) if pooled else None
+
+    def connect(self) -> sqlite3.Connection:
+        """Conexión nueva fuera del pool (sondas, copias de seguridad, …)."""
+        return _open_connection(self.database, self.busy_timeout_ms, self.wal,
+                                self.attach, self.connect_script)
+
+    def acquire(self) -> sqlite3.Connection:
+        return self._pool.acquire() if self._pool else self.connect()
+
+    def release(self, conn: sqlite3.Connection, discard: bool = False):
+        if self._pool:
+            self._pool.release(conn, discard=discard)
+        else:
+            conn.close()
+
+    def close(self):
+        if self._pool:
+            self._pool.close()
+
+    def should_discard(self, conn: sqlite3.Connection, ex: Exception) -> bool:
+        """Tras un error: ¿la conexión quedó inutilizable?"""
+        if isinstance(ex, sqlite3.DatabaseError) and not isinstance(ex, sqlite3.IntegrityError):
+            return not ConnectionPool._is_healthy(conn)
+        return False
+
+    @staticmethod
+    def is_busy_error(ex: Exception) -> bool:
+        if not isinstance(ex, sqlite3.OperationalError):
+            return False
+        code = getattr(ex, "sqlite_errorcode", None)
+        if code is not None:
+            return code & 0xFF in (sqlite3.SQLITE_BUSY, sqlite3.SQLITE_LOCKED)
+        msg = str(ex).lower()
+        return "locked" in msg or "busy" in msg
+
+    @staticmethod
+    def begin_write(conn: sqlite3.Connection):
+        # El bloqueo de escritura se toma al inicio y no a mitad de la operación
+        conn.execute("BEGIN IMMEDIATE")
+
+    # Con BEGIN IMMEDIATE dos terminales no migran a la vez
+    lock_schema = begin_write
+
+    @staticmethod
+    def lock_key(conn: sqlite3.Connection, clase: int, clave: int):
+        pass    # BEGIN IMMEDIATE ya serializa a todos los escritores
+
+    @staticmethod
+    def insert_id(conn: sqlite3.Connection, sql: str, params=()) -> int:
+        return conn.execute(sql, params).lastrowid
+
+    @staticmethod
+    def get_schema_version(conn: sqlite3.Connection) -> int:
+        return conn.execute("PRAGMA user_version").fetchone()[0]
+
+    @staticmethod
+    def set_schema_version(conn: sqlite3.Connection, version: int):
+        conn.execute(f"PRAGMA user_version = {int(version)}")
+
+    @staticmethod
+    def run_script(conn: sqlite3.Connection, script: str):
+        for stmt in split_sql(script):
+            conn.execute(stmt)
+
+    @staticmethod
+    def stream(conn: sqlite3.Connection, sql: str, params=(), size: int = 500):
+        """
+        Filas de la consulta de a `size` por vez. El cursor de SQLite avanza
+        sobre la base sin materializar el resultado, y la sentencia abierta
+        mantiene una instantánea consistente hasta agotarse.
+        """
+        cur = conn.execute(sql, params)
+        try:
+            while rows := cur.fetchmany(size):
+                yield from rows
+        finally:
+            cur.close()
+
+    def prepare(self, conn: sqlite3.Connection):
+        # journal_mode es persistente en el archivo: basta con fijarlo una vez
+        conn.execute(f"PRAGMA journal_mode = {'WAL' if self.wal else 'DELETE'}")
+        for alias in self.attach:
+            conn.execute(f"PRAGMA {alias}.journal_mode = {'WAL' if self.wal else 'DELETE'}")
+
+    def probe_factory(self) -> sqlite3.Connection:
+        """Conexión dedicada para PRAGMA data_version (ver config_cache.py)."""
+        return self.connect()
+
+
+# ─── POSTGRESQL ───────────────────────────────────────────────────────────────
+
+# Literales, casts (::), :nombre, ? y % (que en psycopg debe escaparse)
+_MARCADORES = re.compile(r"'(?:[^']|'')*'|::|:(\w+)|\?|%")
+
+
+@functools.lru_cache(maxsize=512)
+def to_pyformat(sql: str) -> str:
+    """Traduce los marcadores de sqlite3 (? y :nombre) a los de psycopg."""
+    def sub(m):
+        token = m.group(0)
+        if token == "?":
+            return "%s"
+        if token == "%":
+            return "%%"
+        if m.group(1):
+            return f"%({m.group(1)})s"
+        if token.startswith("'"):
+            return token.replace("%", "%%")     # psycopg también ve % dentro de literales
+        return token
+    return _MARCADORES.sub(sub, sql)
+
+
+class Row:
+    """Fila con acceso por índice y por nombre, como sqlite3.Row."""
+    __slots__ = ("_keys", "_index", "_values")
+
+    def __init__(self, keys, index, values):
+        self._keys   = keys
+        self._index  = index
+        self._values = values
+
+    def __getitem__(self, key):
+        if isinstance(key, str):
+            return self._values[self._index[key]]
+        return self._values[key]
+
+    def __iter__(self):
+        return iter(self._values)
+
+    def __len__(self):
+        return len(self._values)
+
+    def keys(self) -> list[str]:
+        return list(self._keys)
+
+
+def _row_factory(cursor):
+    keys  = tuple(c.name for c in cursor.description or ())
+    index = {k: i for i, k in enumerate(keys)}
+    return lambda values: Row(keys, index, values)
+
+
+class _PgConnection:
+    """Adapta una conexión psycopg a la interfaz de sqlite3.Connection que usa el DAL."""
+
+    def __init__(self, raw):
+        self.raw = raw
+
+    def execute(self, sql: str, params=None):
+        cur = self.raw.cursor()
+        if params is None:
+            cur.execute(sql)                    # sin parámetros: se admite un script completo
+        else:
+            cur.execute(to_pyformat(sql), params)
+        return cur
+
+    def executemany(self, sql: str, seq_params):
+        cur = self.raw.cursor()
+        cur.executemany(to_pyformat(sql), list(seq_params))
+        return cur
+
+    @property
+    def in_transaction(self) -> bool:
+        return self.raw.info.transaction_status != psycopg.pq.TransactionStatus.IDLE
+
+    def commit(self):
+        self.raw.commit()
+
+    def rollback(self):
+        self.raw.rollback()
+
+    def close(self):
+        self.raw.close()
+
+
+def _configure(raw):
+    raw.row_factory  = _row_factory
+    raw.prepared_max = STATEMENT_CACHE_SIZE    # sentencias preparadas por conexión
+
+
+class PostgresBackend:
+    name           = "postgresql"
+    supports_fts   = False      # search_huespedes usa ILIKE
+    probe_factory  = None       # sin data_version: la configuración no se cachea
+
+    _SCHEMA_LOCK = 0x5347480    # clave del advisory lock de migraciones
+
+    def __init__(self, dsn: str, pool_size: int = 8, pool_timeout: float = 10.0):
+        if psycopg is None:
+            raise RuntimeError("El motor PostgreSQL requiere: pip install 'psycopg[binary]' psycopg_pool")
+        self.key   = dsn
+        self.Error = psycopg.Error
+        self._pool = PgConnectionPool(
+            dsn, min_size=1, max_size=pool_size, timeout=pool_timeout,
+            configure=_configure, open=True,
+        )
+
+    def connect(self) -> _PgConnection:
+        conn = psycopg.connect(self.key)
+        _configure(conn)
+        return _PgConnection(conn)
+
+    def acquire(self) -> _PgConnection:
+        return _PgConnection(self._pool.getconn())
+
+    def release(self, conn: _PgConnection, discard: bool = False):
+        if not discard and conn.in_transaction:
+            try:
+                conn.rollback()
+            except psycopg.Error:
+                discard = True
+        if discard:
+            conn.close()    # el pool la reemplaza al devolverla cerrada
+        self._pool.putconn(conn.raw)
+
+    def close(self):
+        self._pool.close()
+
+    @staticmethod
+    def should_discard(conn: _PgConnection, ex: Exception) -> bool:
+        return conn.raw.closed or conn.raw.broken
+
+    @staticmethod
+    def is_busy_error(ex: Exception) -> bool:
+        # Conflictos de concurrencia que se resuelven repitiendo la transacción
+        return isinstance(ex, (pg_errors.SerializationFailure, pg_errors.DeadlockDetected,
+                               pg_errors.LockNotAvailable))
+
+    @staticmethod
+    def begin_write(conn: _PgConnection):
+        pass    # psycopg abre la transacción con la primera sentencia
+
+    def lock_schema(self, conn: _PgConnection):
+        conn.execute("SELECT pg_advisory_xact_lock(?)", (self._SCHEMA_LOCK,))
+
+    @staticmethod
+    def lock_key(conn: _PgConnection, clase: int, clave: int):
+        """Serializa hasta el fin de la transacción las escrituras sobre (clase, clave)."""
+        conn.execute("SELECT pg_advisory_xact_lock(?, ?)", (clase, clave))
+
+    @staticmethod
+    def insert_id(conn: _PgConnection, sql: str, params=()) -> int:
+        return conn.execute(sql.rstrip().rstrip(";") + " RETURNING id", params).fetchone()[0]
+
+    @staticmethod
+    def get_schema_version(conn: _PgConnection) -> int:
+        if conn.execute("SELECT to_regclass('sgh_schema')", ()).fetchone()[0] is None:
+            return 0
+        row = conn.execute("SELECT version FROM sgh_schema", ()).fetchone()
+        return row[0] if row else 0
+
+    @staticmethod
+    def set_schema_version(conn: _PgConnection, version: int):
+        conn.execute("CREATE TABLE IF NOT EXISTS sgh_schema (version INTEGER NOT NULL)")
+        conn.execute("DELETE FROM sgh_schema")
+        conn.execute("INSERT INTO sgh_schema (version) VALUES (?)", (int(version),))
+
+    @staticmethod
+    def run_script(conn: _PgConnection, script: str):
+        conn.execute(script)
+
+    @staticmethod
+    def stream(conn: _PgConnection, sql: str, params=(), size: int = 500):
+        """Cursor del lado del servidor (con nombre): trae `size` filas por viaje."""
+        with conn.raw.cursor(name="sgh_stream") as cur:
+            cur.itersize = size
+            cur.execute(to_pyformat(sql), params)
+            while rows := cur.fetchmany(size):
+                yield from rows
+        conn.rollback()     # cierra la transacción de lectura del cursor
+
+    def prepare(self, conn: _PgConnection):
+        pass
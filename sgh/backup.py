@@ -0,0 +1,270 @@
+"""
+backup.py - Copias de seguridad en caliente de la base SQLite
+Sistema de Gestión Hotelera (SGH)
+
+La copia usa la API de backup de SQLite sobre una conexión propia: copia
+BACKUP_PAGES_PER_STEP páginas, duerme BACKUP_STEP_SLEEP y sigue, de modo que
+las terminales apenas notan la copia. La conexión abre antes una transacción
+de lectura sobre la base y su archivo histórico adjunto: en WAL eso fija una
+misma instantánea para ambos, así que las dos copias forman un conjunto
+consistente aunque se escriba mientras tanto.
+
+Cada copia se verifica como si se fuera a restaurar: se descomprime si hace
+falta, se abre y se ejecuta PRAGMA integrity_check. Solo se conservan las
+BACKUP_KEEP más recientes. Si hay archivo histórico adjunto (ver
+database.archivar_historial) se copia junto a la base como <copia>.archivo.db.
+
+BackupScheduler hace una copia cada BACKUP_INTERVAL segundos en un hilo de
+fondo (main.py lo arranca en cada terminal); el turno se elige en la base
+con database.tomar_turno, así que copia una sola. manage.py ofrece "backup"
+y "verificar-backup".
+"""
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+import zlib
+from datetime import datetime
+
+import database as db
+
+BACKUP_DIR            = "backups"   # relativo a la carpeta de la base
+BACKUP_KEEP           = 14          # copias que se conservan
+BACKUP_INTERVAL       = 24 * 3600   # segundos entre copias automáticas
+BACKUP_COMPRESS       = True        # comprimir con zlib (.db.z)
+BACKUP_PAGES_PER_STEP = 256         # páginas copiadas por paso
+BACKUP_STEP_SLEEP     = 0.05        # segundos de pausa entre pasos
+
+_CHUNK = 1 << 20
+
+
+def backup_dir() -> str:
+    base = os.path.dirname(os.path.abspath(db.DB_NAME))
+    return os.path.join(base, BACKUP_DIR)
+
+
+def _prefijo() -> str:
+    return os.path.splitext(os.path.basename(db.DB_NAME))[0] + "-"
+
+
+def list_backups() -> list[str]:
+    """Copias existentes de la base actual, de la más reciente a la más antigua."""
+    carpeta = backup_dir()
+    if not os.path.isdir(carpeta):
+        return []
+    nombres = [n for n in os.listdir(carpeta)
+               if n.startswith(_prefijo()) and n.endswith((".db", ".db.z"))
+               and ".archivo." not in n]
+    return [os.path.join(carpeta, n) for n in sorted(nombres, reverse=True)]
+
+
+def archivo_de(path: str) -> str | None:
+    """Copia del archivo histórico hecha junto con `path`, si existe."""
+    base, ext = os.path.splitext(path)
+    if ext == ".z":
+        base, ext = os.path.splitext(base)
+        ext += ".z"
+    companera = f"{base}.archivo{ext}"
+    return companera if os.path.exists(companera) else None
+
+
+def _copiar(destinos: dict[str, str]):
+    """
+    Copia cada esquema ({"main": ruta, "archivo": ruta}) por pasos con la API
+    de backup, todos dentro de una misma transacción de lectura.
+    """
+    backend = db.get_backend()
+    if backend.name != "sqlite":
+        raise RuntimeError("La copia en caliente es solo para SQLite; en PostgreSQL use pg_dump.")
+    origen = backend.connect()
+    try:
+        # La instantánea de cada base se fija en su primera lectura
+        origen.execute("BEGIN")
+        for esquema in destinos:
+            origen.execute(f"SELECT COUNT(*) FROM {esquema}.sqlite_master").fetchone()
+        for esquema, destino in destinos.items():
+            copia = sqlite3.connect(destino)
+            try:
+                origen.backup(copia, pages=BACKUP_PAGES_PER_STEP, name=esquema,
+                              progress=lambda *_: time.sleep(BACKUP_STEP_SLEEP))
+                # La copia hereda el modo WAL del origen; como archivo suelto no lo necesita
+                copia.execute("PRAGMA journal_mode = DELETE")
+            finally:
+                copia.close()
+        origen.rollback()
+    finally:
+        origen.close()
+
+
+def _comprimir(origen: str, destino: str):
+    z = zlib.compressobj(6)
+    with open(origen, "rb") as src, open(destino, "wb") as dst:
+        while bloque := src.read(_CHUNK):
+            dst.write(z.compress(bloque))
+        dst.write(z.flush())
+
+
+def _descomprimir(origen: str, destino: str):
+    z = zlib.decompressobj()
+    with open(origen, "rb") as src, open(destino, "wb") as dst:
+        while bloque := src.read(_CHUNK):
+            dst.write(z.decompress(bloque))
+        dst.write(z.flush())
+
+
+def verificar_backup(path: str, comprimido: bool | None = None) -> tuple[bool, str]:
+    """
+    Comprueba que la copia se puede restaurar: la descomprime si hace falta
+    (por defecto, si termina en .z), la abre en solo lectura y ejecuta
+    PRAGMA integrity_check. Retorna (ok, detalle).
+    """
+    if comprimido is None:
+        comprimido = path.endswith(".z")
+    with tempfile.TemporaryDirectory(prefix="sgh-verif-") as tmp:
+        archivo = path
+        try:
+            if comprimido:
+                archivo = os.path.join(tmp, "restaurada.db")
+                _descomprimir(path, archivo)
+            conn = sqlite3.connect(f"file:{archivo}?mode=ro", uri=True)
+            try:
+                resultado = [r[0] for r in conn.execute("PRAGMA integrity_check")]
+                version   = conn.execute("PRAGMA user_version").fetchone()[0]
+            finally:
+                conn.close()
+        except (OSError, zlib.error, sqlite3.DatabaseError) as ex:
+            return False, str(ex)
+    if resultado != ["ok"]:
+        return False, "; ".join(resultado[:5])
+    return True, f"integridad ok, esquema v{version}"
+
+
+def rotar_backups(conservar: int | None = None) -> list[str]:
+    """Borra las copias más antiguas (deja BACKUP_KEEP). Retorna las rutas eliminadas."""
+    sobrantes = list_backups()[BACKUP_KEEP if conservar is None else conservar:]
+    for path in sobrantes:
+        companera = archivo_de(path)
+        if companera:
+            os.remove(companera)
+        os.remove(path)
+    return sobrantes
+
+
+def _guardar(parcial: str, final: str, comprimir: bool) -> str:
+    """Comprime (si corresponde) y verifica la copia `parcial`; la deja en `final`."""
+    if comprimir:
+        _comprimir(parcial, final + ".parcial")
+        os.remove(parcial)
+        parcial = final + ".parcial"
+    ok, detalle = verificar_backup(parcial, comprimido=comprimir)
+    if not ok:
+        raise RuntimeError(f"La copia no pasó la verificación: {detalle}")
+    os.replace(parcial, final)
+    return detalle
+
+
+def crear_backup(comprimir: bool | None = None) -> dict:
+    """
+    Crea una copia verificada de la base actual en backup_dir() (y de su
+    archivo histórico adjunto, como <copia>.archivo.db, de la misma
+    instantánea) y rota las antiguas.
+    Retorna {"archivo", "archivo_historico", "bytes", "segundos", "detalle"}.
+    Una copia que no pasa la verificación se descarta y lanza RuntimeError.
+    """
+    comprimir = BACKUP_COMPRESS if comprimir is None else comprimir
+    carpeta   = backup_dir()
+    os.makedirs(carpeta, exist_ok=True)
+    base      = _prefijo() + datetime.now().strftime("%Y%m%d-%H%M%S")
+    inicio    = time.perf_counter()
+    # El archivo primero: list_backups() solo ve el conjunto cuando aparece la base
+    nombres   = {}
+    if "archivo" in getattr(db.get_backend(), "attach", {}):
+        nombres["archivo"] = base + ".archivo.db"
+    nombres["main"] = base + ".db"
+    finales   = {esquema: os.path.join(carpeta, nombre + (".z" if comprimir else ""))
+                 for esquema, nombre in nombres.items()}
+    parciales = {esquema: os.path.join(carpeta, nombre + ".parcial")
+                 for esquema, nombre in nombres.items()}
+    try:
+        _copiar(parciales)
+        detalles = {esquema: _guardar(parciales[esquema], finales[esquema], comprimir)
+                    for esquema in nombres}
+    except Exception:
+        for path in [*parciales.values(), *(p + ".parcial" for p in finales.values()),
+                     *finales.values()]:
+            if os.path.exists(path):
+                os.remove(path)
+        raise
+    rotar_backups()
+    final = finales["main"]
+    return {"archivo": final, "archivo_historico": finales.get("archivo"),
+            "bytes": os.path.getsize(final),
+            "segundos": round(time.perf_counter() - inicio, 2), "detalle": detalles["main"]}
+
+
+# ─── COPIAS AUTOMÁTICAS ───────────────────────────────────────────────────────
+
+class BackupScheduler(threading.Thread):
+    """
+    Hilo de fondo que hace una copia cada `intervalo` segundos. Al arrancar
+    toma en cuenta la última copia existente: si es reciente, espera lo que
+    falta en lugar de copiar de inmediato. Cada terminal corre el suyo, pero
+    antes de copiar piden el turno en la base (database.tomar_turno) y solo
+    una lo obtiene por intervalo; las demás esperan al siguiente.
+    """
+
+    def __init__(self, intervalo: float | None = None):
+        super().__init__(name="sgh-backup", daemon=True)
+        self.intervalo    = BACKUP_INTERVAL if intervalo is None else intervalo
+        self.ultimo       = None    # resultado de la última copia
+        self.ultimo_error = None
+        self._detener     = threading.Event()
+
+    def _espera_inicial(self) -> float:
+        copias = list_backups()
+        if not copias:
+            return 0.0
+        edad = time.time() - os.path.getmtime(copias[0])
+        return max(0.0, self.intervalo - edad)
+
+    def run(self):
+        espera = self._espera_inicial()
+        while not self._detener.wait(espera):
+            espera = self.intervalo
+            try:
+                espera = db.tomar_turno("backup", self.intervalo)
+                if espera == 0:
+                    self.ultimo       = crear_backup()
+                    self.ultimo_error = None
+                    espera            = self.intervalo
+            except Exception as ex:
+                self.ultimo_error = ex
+
+    def stop(self, timeout: float | None = None):
+        self._detener.set()
+        self.join(timeout)
+
+
+_scheduler      = None
+_scheduler_lock = threading.Lock()
+
+
+def start_scheduler(intervalo: float | None = None) -> BackupScheduler | None:
+    """Arranca las copias automáticas (una vez por proceso; no aplica a PostgreSQL)."""
+    global _scheduler
+    if db.get_backend().name != "sqlite":
+        return None
+    with _scheduler_lock:
+        if _scheduler is None or not _scheduler.is_alive():
+            _scheduler = BackupScheduler(intervalo)
+            _scheduler.start()
+        return _scheduler
+
+
+def stop_scheduler():
+    global _scheduler
+    with _scheduler_lock:
+        if _scheduler is not None:
+            _scheduler.stop(timeout=5)
+            _scheduler = None
@@ -32,7 +32,21 @@ def dias_restantes(fecha_salida: str) -> int | None:
         return None
 
 
-def RoomCard(hab: dict, on_click) -> ft.Container:
+def card_signature(hab: dict) -> tuple:
+    """Campos que determinan cómo se pinta la tarjeta; si no cambian, no se repinta."""
+    f_salida = hab.get("fecha_salida_prevista", "")
+    return (
+        hab.get("estado", "Libre"),
+        hab.get("tipo", ""),
+        hab.get("precio_usd", 0),
+        hab.get("huesped_nombre", ""),
+        hab.get("huesped_saldo", 0) or 0,
+        f_salida,
+        dias_restantes(f_salida) if f_salida else None,
+    )
+
+
+def _card_content(hab: dict) -> tuple[ft.Column, str]:
     estado   = hab.get("estado", "Libre")
     numero   = hab.get("numero", "?")
     tipo     = hab.get("tipo", "")
@@ -111,17 +125,23 @@ def RoomCard(hab: dict, on_click) -> ft.Container:
         padding=ft.padding.symmetric(horizontal=5, vertical=2),
     )
 
+    content = ft.Column(
+        controls=[
+            header,
+            ft.Column(controls=body_controls, spacing=2),
+            ft.Row(controls=[estado_badge],
+                   alignment=ft.MainAxisAlignment.END),
+        ],
+        spacing=6,
+        expand=True,
+    )
+    return content, bg_color
+
+
+def RoomCard(hab: dict, on_click) -> ft.Container:
+    content, bg_color = _card_content(hab)
     return ft.Container(
-        content=ft.Column(
-            controls=[
-                header,
-                ft.Column(controls=body_controls, spacing=2),
-                ft.Row(controls=[estado_badge],
-                       alignment=ft.MainAxisAlignment.END),
-            ],
-            spacing=6,
-            expand=True,
-        ),
+        content=content,
         bgcolor=bg_color,
         border_radius=10,
         padding=10,
@@ -135,3 +155,9 @@ def RoomCard(hab: dict, on_click) -> ft.Container:
             offset=ft.Offset(0, 2)
         ),
     )
+
+
+def update_room_card(card: ft.Container, hab: dict, on_click):
+    """Repinta en sitio una tarjeta existente (no llama a update())."""
+    card.content, card.bgcolor = _card_content(hab)
+    card.on_click = lambda e: on_click(hab)
@@ -0,0 +1,74 @@
+"""
+config_cache.py - Caché en memoria de la configuración (tasa, turno, hotel)
+Sistema de Gestión Hotelera (SGH)
+
+Cada conversión Bs/USD consulta la tasa; en lugar de leer Configuracion cada
+vez, se sirve desde memoria. La validez se comprueba con PRAGMA data_version
+sobre una conexión dedicada: ese contador cambia cuando cualquier OTRA conexión
+(otra terminal, otro hilo) confirma una escritura, por lo que un cambio de tasa
+hecho en otra terminal se ve en la siguiente lectura sin consultar la tabla.
+"""
+import sqlite3
+import threading
+
+
+class ConfigCache:
+    """
+    loader()         → dict con la fila de Configuracion (usa el DAL normal).
+    probe_factory()  → conexión SQLite propia, usada solo para data_version.
+                       None si el motor no la ofrece: entonces no se cachea.
+    copy(valor)      → lo que entrega get(); por defecto una copia del dict.
+                       Para valores que nadie modifica (el historial de tasas)
+                       se pasa una identidad.
+    """
+
+    def __init__(self, loader, probe_factory, copy=dict):
+        self._loader        = loader
+        self._copy          = copy
+        self._probe_factory = probe_factory
+        self._probe         = None
+        self._value         = None
+        self._version       = None
+        self._lock          = threading.Lock()
+
+    def get(self):
+        with self._lock:
+            version = self._data_version()
+            if self._value is None or version is None or version != self._version:
+                # La versión se lee ANTES de cargar: si otra escritura entra en
+                # medio, la próxima lectura verá una versión distinta y recargará.
+                self._value   = self._loader()
+                self._version = version
+            return self._copy(self._value)
+
+    def invalidate(self):
+        """Descarta el valor en memoria (escrituras hechas por este proceso)."""
+        with self._lock:
+            self._value = None
+
+    def close(self):
+        with self._lock:
+            self._value = None
+            if self._probe is not None:
+                try:
+                    self._probe.close()
+                except sqlite3.Error:
+                    pass
+                self._probe = None
+
+    def _data_version(self) -> int | None:
+        if self._probe_factory is None:
+            return None
+        try:
+            if self._probe is None:
+                self._probe = self._probe_factory()
+            return self._probe.execute("PRAGMA data_version").fetchone()[0]
+        except sqlite3.Error:
+            # Sin sonda fiable no se cachea: se lee siempre de la base
+            if self._probe is not None:
+                try:
+                    self._probe.close()
+                except sqlite3.Error:
+                    pass
+            self._probe = None
+            return None
@@ -4,113 +4,841 @@ Sistema de Gestión Hotelera (SGH)
 """
 import sqlite3
 import json
-from datetime import datetime
+import os
+import queue
+import threading
+import re
+import time
+import functools
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta
+from concurrent.futures import Future
 from contextlib import contextmanager
 
+from backends import SQLiteBackend, PostgresBackend, split_sql as _split_sql
+from config_cache import ConfigCache
+from queries import registry, HABITACIONES_BASE, UPDATABLE_COLUMNS
+from schema_pg import MIGRATIONS_PG
+from tasas import RateHistory
+
+# Motor de almacenamiento (ver backends.py): "sqlite" usa el archivo DB_NAME;
+# "postgresql" se conecta a PG_DSN, p. ej. "host=10.0.0.5 dbname=sgh user=sgh".
+# PostgreSQL es experimental: además exige PG_EXPERIMENTAL = True y conviene
+# correr antes tests/test_postgres.py contra el servidor (SGH_TEST_PG_DSN).
+BACKEND = "sqlite"
 DB_NAME = "hotel.db"
+PG_DSN  = ""
+PG_EXPERIMENTAL = False
+
+# Pool de conexiones: cada hilo reutiliza una conexión ya configurada en vez de
+# abrir una nueva en cada llamada al DAL.
+POOL_ENABLED  = True
+POOL_MAX_SIZE = 8       # conexiones abiertas como máximo
+POOL_TIMEOUT  = 10.0    # segundos de espera si el pool está agotado
+
+# Concurrencia multi-terminal: WAL permite lecturas mientras otra terminal
+# escribe; las escrituras esperan el bloqueo y se reintentan si siguen ocupadas.
+WAL_MODE        = True
+BUSY_TIMEOUT_MS = 5000  # espera de SQLite ante un bloqueo antes de fallar
+BUSY_RETRIES    = 5     # reintentos de una escritura con SQLITE_BUSY
+BUSY_BACKOFF    = 0.05  # segundos; se duplica en cada reintento
+
+# Cola de escritura (opcional): un único hilo escritor ejecuta las funciones
+# @_escritura en lotes, con un solo BEGIN/COMMIT por lote (group commit).
+WRITE_QUEUE_ENABLED   = False
+WRITE_QUEUE_MAX_BATCH = 64     # escrituras como máximo por commit
+
+EXPORT_FETCH_SIZE = 500   # filas por lectura al exportar (fetchmany)
+
+# Archivo histórico (solo SQLite): las estancias cerradas hace más de
+# ARCHIVE_AFTER_DAYS pasan, con sus acompañantes y transacciones, a una base
+# adjunta (ATTACH ... AS archivo). Los reportes leen ambas vía las vistas
+# RegistrosHistorico / TransaccionesHistorico / AcompanantesHistorico.
+ARCHIVE_ENABLED    = True
+ARCHIVE_DB         = ""     # vacío: "<base>_archivo.db" junto a DB_NAME
+ARCHIVE_AFTER_DAYS = 365
+ARCHIVE_BATCH      = 500    # estancias por transacción al archivar
+
+
+_backend = None
+_backend_lock = threading.Lock()
+
+
+def archive_path() -> str:
+    return ARCHIVE_DB or os.path.splitext(DB_NAME)[0] + "_archivo.db"
+
+
+def _new_backend():
+    if BACKEND == "postgresql":
+        if not PG_EXPERIMENTAL:
+            raise RuntimeError("El motor PostgreSQL es experimental: active "
+                               "PG_EXPERIMENTAL = True en database.py para usarlo.")
+        return PostgresBackend(PG_DSN, pool_size=POOL_MAX_SIZE, pool_timeout=POOL_TIMEOUT)
+    return SQLiteBackend(DB_NAME, pooled=POOL_ENABLED, pool_size=POOL_MAX_SIZE,
+                         pool_timeout=POOL_TIMEOUT, busy_timeout_ms=BUSY_TIMEOUT_MS,
+                         wal=WAL_MODE,
+                         attach={"archivo": archive_path()} if ARCHIVE_ENABLED else None,
+                         connect_script=_VISTAS_HISTORICO if ARCHIVE_ENABLED else "")
+
+
+def get_backend():
+    """Motor del proceso (se recrea si cambian BACKEND, DB_NAME o PG_DSN)."""
+    global _backend
+    destino = (BACKEND, PG_DSN if BACKEND == "postgresql" else DB_NAME)
+    with _backend_lock:
+        if _backend is None or (_backend.name, _backend.key) != destino:
+            if _backend is not None:
+                _backend.close()
+            _backend = _new_backend()
+        return _backend
+
+
+def close_pool():
+    """Cierra el motor y su pool de conexiones (p. ej. al salir de la aplicación)."""
+    global _backend
+    with _backend_lock:
+        if _backend is not None:
+            _backend.close()
+            _backend = None
+
+
+_scope = threading.local()   # conexión en uso por el hilo (ver get_connection)
+
+
+def in_transaction_scope() -> bool:
+    """True si el hilo actual está dentro de un get_connection()/transaccion()."""
+    return getattr(_scope, "conn", None) is not None
 
 
 @contextmanager
-def get_connection():
-    """Context manager para conexiones seguras a SQLite."""
-    conn = sqlite3.connect(DB_NAME, detect_types=sqlite3.PARSE_DECLTYPES)
-    conn.row_factory = sqlite3.Row
-    conn.execute("PRAGMA foreign_keys = ON")
+def _nested_scope(conn: sqlite3.Connection, write: bool):
+    """
+    Bloque anidado: reutiliza la conexión del bloque externo. Si hay una
+    transacción abierta se protege con un SAVEPOINT, de modo que un error
+    interno deshace solo su parte y el commit lo hace el bloque externo.
+    """
+    if write and not conn.in_transaction:
+        _scope.backend.begin_write(conn)
+    if not conn.in_transaction:
+        yield conn
+        return
+    _scope.depth += 1
+    savepoint = f"sp_{_scope.depth}"
+    conn.execute(f"SAVEPOINT {savepoint}")
     try:
         yield conn
+    except Exception:
+        try:
+            conn.execute(f"ROLLBACK TO {savepoint}")
+            conn.execute(f"RELEASE {savepoint}")
+        except _scope.backend.Error:
+            pass    # la transacción ya fue abortada; el bloque externo hace rollback
+        # Lo registrado dentro del savepoint deshecho ya no debe ejecutarse
+        _scope.after_commit = [(d, cb) for d, cb in _scope.after_commit
+                               if d < _scope.depth]
+        raise
+    else:
+        conn.execute(f"RELEASE {savepoint}")
+    finally:
+        _scope.depth -= 1
+
+
+@contextmanager
+def get_connection(write: bool = False):
+    """
+    Context manager para conexiones seguras a SQLite.
+    Con write=True la transacción se abre con BEGIN IMMEDIATE, de modo que el
+    bloqueo de escritura se toma al inicio y no a mitad de la operación.
+    Si el hilo ya está dentro de otro get_connection(), se reutiliza esa
+    conexión y el commit queda a cargo del bloque más externo.
+    """
+    if in_transaction_scope():
+        with _nested_scope(_scope.conn, write) as conn:
+            yield conn
+        return
+
+    backend = get_backend()
+    conn    = backend.acquire()
+    _scope.conn, _scope.depth, _scope.after_commit = conn, 0, []
+    _scope.backend = backend
+    broken = False
+    try:
+        if write:
+            backend.begin_write(conn)
+        yield conn
+        conn.commit()
+    except Exception as ex:
+        try:
+            conn.rollback()
+        except backend.Error:
+            broken = True
+        broken = broken or backend.should_discard(conn, ex)
+        raise
+    finally:
+        callbacks = _scope.after_commit
+        _scope.conn, _scope.after_commit = None, []
+        backend.release(conn, discard=broken)
+
+    # Solo se llega aquí si hubo commit
+    for _, callback in callbacks:
+        try:
+            callback()
+        except Exception:
+            pass    # un efecto posterior nunca invalida una escritura ya confirmada
+
+
+def _q(conn, name: str, params=()):
+    """Ejecuta la sentencia con nombre `name` del registro de queries.py."""
+    return registry.execute(conn, name, params)
+
+
+def _insert_id(conn, name: str, params=()) -> int:
+    """Ejecuta el INSERT con nombre `name` y retorna el id generado (lastrowid / RETURNING id)."""
+    return registry.call(name, _scope.backend.insert_id, conn, registry.sql(name), params)
+
+
+def get_query_stats() -> list[dict]:
+    """Llamadas y segundos acumulados por sentencia con nombre, de la más usada a la menos."""
+    return registry.stats()
+
+
+def _after_commit(callback):
+    """
+    Programa callback() para después del commit del bloque más externo del
+    hilo actual. Si la transacción se deshace, no se ejecuta.
+    """
+    _scope.after_commit.append((_scope.depth, callback))
+
+
+_listeners = []     # fn(tabla, fila_id), ver add_change_listener
+
+
+def add_change_listener(fn):
+    """
+    Registra fn(tabla, fila_id) para después de cada commit que crea o cierra
+    una estancia o una reserva en este proceso (p. ej. notificaciones.py).
+    Corre en el hilo que escribió: debe ser breve y no usar la base.
+    """
+    if fn not in _listeners:
+        _listeners.append(fn)
+
+
+def remove_change_listener(fn):
+    if fn in _listeners:
+        _listeners.remove(fn)
+
+
+def _avisar_cambio(tabla: str, fila_id: int):
+    for fn in list(_listeners):
+        _after_commit(functools.partial(fn, tabla, fila_id))
+
+
+@contextmanager
+def transaccion():
+    """
+    Unidad de trabajo: todas las funciones del DAL llamadas dentro del bloque
+    comparten una conexión y se confirman con un único commit, o se deshacen
+    juntas si algo falla.
+
+        with db.transaccion():
+            reg_id = db.create_registro(...)
+            db.add_acompanante(reg_id, ...)
+    """
+    with get_connection(write=True) as conn:
+        yield conn
+
+
+def _is_busy_error(ex: Exception) -> bool:
+    return get_backend().is_busy_error(ex)
+
+
+def _reintentar_ocupado(func, *args, **kwargs):
+    """Ejecuta func; ante SQLITE_BUSY reintenta con backoff exponencial acotado."""
+    espera = BUSY_BACKOFF
+    for intento in range(BUSY_RETRIES + 1):
+        try:
+            return func(*args, **kwargs)
+        except Exception as ex:
+            if not _is_busy_error(ex) or intento == BUSY_RETRIES:
+                raise
+            time.sleep(espera)
+            espera *= 2
+
+
+def _escritura(func=None, *, cola: bool = True):
+    """
+    Marca una función de escritura del DAL: si la base sigue bloqueada por otra
+    terminal tras BUSY_TIMEOUT_MS, reintenta con backoff exponencial acotado.
+    Con WRITE_QUEUE_ENABLED la llamada se encola en el hilo escritor y espera
+    su resultado; cola=False la excluye (p. ej. si no admite ir dentro de
+    una transacción, como init_db).
+    """
+    if func is None:
+        return functools.partial(_escritura, cola=cola)
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        if in_transaction_scope():
+            # Dentro de una unidad de trabajo el reintento corresponde al bloque externo
+            return func(*args, **kwargs)
+        if cola and WRITE_QUEUE_ENABLED and not WriteQueue.is_writer_thread():
+            return get_write_queue().submit(func, *args, **kwargs).result()
+        return _reintentar_ocupado(func, *args, **kwargs)
+    return wrapper
+
+
+# ─── COLA DE ESCRITURA ────────────────────────────────────────────────────────
+
+class WriteQueue:
+    """
+    Hilo escritor único. Toma todas las escrituras encoladas (hasta
+    WRITE_QUEUE_MAX_BATCH) y las ejecuta en una sola transacción; cada una
+    corre en su propio SAVEPOINT (el get_connection anidado), así un error
+    deshace solo esa escritura. Los Future se resuelven después del COMMIT,
+    cuando el resultado ya es durable.
+    """
+
+    _writer_threads = set()
+
+    def __init__(self, max_batch: int = WRITE_QUEUE_MAX_BATCH):
+        self._max_batch = max_batch
+        self._queue     = queue.Queue()
+        self._thread    = threading.Thread(target=self._run, name="sgh-writer", daemon=True)
+        self._thread.start()
+        WriteQueue._writer_threads.add(self._thread)
+
+    @classmethod
+    def is_writer_thread(cls) -> bool:
+        return threading.current_thread() in cls._writer_threads
+
+    def submit(self, func, *args, **kwargs) -> Future:
+        future = Future()
+        self._queue.put((future, func, args, kwargs))
+        return future
+
+    def close(self):
+        """Procesa lo ya encolado y detiene el hilo escritor."""
+        self._queue.put(None)
+        self._thread.join()
+        WriteQueue._writer_threads.discard(self._thread)
+
+    def _run(self):
+        while True:
+            item = self._queue.get()
+            if item is None:
+                return
+            lote = [item]
+            while len(lote) < self._max_batch:
+                try:
+                    siguiente = self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                if siguiente is None:
+                    self._queue.put(None)   # terminar después de este lote
+                    break
+                lote.append(siguiente)
+            self._execute(lote)
+
+    def _execute(self, lote):
+        vivos = [it for it in lote if it[0].set_running_or_notify_cancel()]
+        try:
+            resultados = _reintentar_ocupado(self._execute_batch, vivos)
+        except BaseException as ex:
+            for future, *_ in vivos:
+                future.set_exception(ex)
+            return
+        for (future, *_), (ok, valor) in zip(vivos, resultados):
+            if ok:
+                future.set_result(valor)
+            else:
+                future.set_exception(valor)
+
+    @staticmethod
+    def _execute_batch(lote) -> list[tuple[bool, object]]:
+        resultados = []
+        with get_connection(write=True) as conn:
+            for _, func, args, kwargs in lote:
+                try:
+                    with _nested_scope(conn, True):
+                        resultados.append((True, func(*args, **kwargs)))
+                except Exception as ex:
+                    resultados.append((False, ex))
+        return resultados
+
+
+_write_queue      = None
+_write_queue_lock = threading.Lock()
+
+
+def get_write_queue() -> WriteQueue:
+    global _write_queue
+    with _write_queue_lock:
+        if _write_queue is None:
+            _write_queue = WriteQueue()
+        return _write_queue
+
+
+def close_write_queue():
+    """Vacía la cola pendiente y detiene el hilo escritor."""
+    global _write_queue
+    with _write_queue_lock:
+        if _write_queue is not None:
+            _write_queue.close()
+            _write_queue = None
+
+
+# ─── ESQUEMA Y MIGRACIONES ────────────────────────────────────────────────────
+# Cada migración lleva el esquema de la versión N-1 a la N. La versión aplicada
+# se guarda en PRAGMA user_version; init_db aplica solo las pendientes, en orden.
+# Una migración es un script SQL o, si necesita lógica, una función(conn).
+# Nunca modificar una migración ya publicada: agregar una nueva al final.
+
+def _change_log_triggers(*tablas: str) -> str:
+    """Triggers que registran en Cambios cada INSERT/UPDATE/DELETE de las tablas."""
+    partes = []
+    for tabla in tablas:
+        for op, evento, fila in (("I", "INSERT", "NEW"), ("U", "UPDATE", "NEW"),
+                                 ("D", "DELETE", "OLD")):
+            partes.append(f"""
+        CREATE TRIGGER IF NOT EXISTS trg_cambios_{tabla.lower()}_{op.lower()}
+        AFTER {evento} ON {tabla}
+        BEGIN
+            INSERT INTO Cambios (tabla, fila_id, op) VALUES ('{tabla}', {fila}.rowid, '{op}');
+        END;
+""")
+    return "".join(partes)
+
+
+def _migrate_huespedes_fts(conn: sqlite3.Connection):
+    """
+    Tabla FTS5 sobre Huespedes (documento, nombres), sincronizada por triggers.
+    unicode61 con remove_diacritics ignora tildes ("Perez" encuentra "Pérez").
+    Si el SQLite instalado no trae FTS5 se omite y search_huespedes usa LIKE.
+    """
+    try:
+        conn.execute("""
+            CREATE VIRTUAL TABLE IF NOT EXISTS HuespedesFTS USING fts5(
+                documento, nombres,
+                content='Huespedes', content_rowid='id',
+                tokenize="unicode61 remove_diacritics 2",
+                prefix='2 3'
+            )
+        """)
+    except sqlite3.OperationalError:
+        return
+    for stmt in _split_sql("""
+        CREATE TRIGGER IF NOT EXISTS trg_huespedes_fts_i AFTER INSERT ON Huespedes
+        BEGIN
+            INSERT INTO HuespedesFTS (rowid, documento, nombres)
+            VALUES (NEW.id, NEW.documento, NEW.nombres);
+        END;
+
+        CREATE TRIGGER IF NOT EXISTS trg_huespedes_fts_d AFTER DELETE ON Huespedes
+        BEGIN
+            INSERT INTO HuespedesFTS (HuespedesFTS, rowid, documento, nombres)
+            VALUES ('delete', OLD.id, OLD.documento, OLD.nombres);
+        END;
+
+        CREATE TRIGGER IF NOT EXISTS trg_huespedes_fts_u
+        AFTER UPDATE OF documento, nombres ON Huespedes
+        BEGIN
+            INSERT INTO HuespedesFTS (HuespedesFTS, rowid, documento, nombres)
+            VALUES ('delete', OLD.id, OLD.documento, OLD.nombres);
+            INSERT INTO HuespedesFTS (rowid, documento, nombres)
+            VALUES (NEW.id, NEW.documento, NEW.nombres);
+        END;
+
+        INSERT INTO HuespedesFTS (HuespedesFTS) VALUES ('rebuild');
+    """):
+        conn.execute(stmt)
+
+
+
+# Recalcula el resumen diario desde las tablas base. Los filtros permiten
+# limitarlo a un rango de fechas (ver rebuild_resumen_diario).
+_REBUILD_RESUMEN_SQL = """
+        INSERT INTO ResumenDiarioPagos (fecha, metodo_pago, total_usd, total_bs, cantidad)
+        SELECT DATE(fecha_hora), metodo_pago, SUM(monto_usd), SUM(monto_bs), COUNT(*)
+        FROM {transacciones}
+        WHERE tipo = 'Pago' {filtro_pagos}
+        GROUP BY DATE(fecha_hora), metodo_pago;
+
+        INSERT INTO ResumenDiarioEstancias (fecha, checkins)
+        SELECT DATE(fecha_entrada), COUNT(*)
+        FROM {registros}
+        WHERE 1 = 1 {filtro_entrada}
+        GROUP BY DATE(fecha_entrada);
+
+        INSERT INTO ResumenDiarioEstancias (fecha, checkouts)
+        SELECT DATE(fecha_salida_prevista), COUNT(*)
+        FROM {registros}
+        WHERE estado = 'Cerrado' {filtro_salida}
+        GROUP BY DATE(fecha_salida_prevista)
+        ON CONFLICT (fecha) DO UPDATE SET checkouts = excluded.checkouts;
+"""
+
+
+MIGRATIONS = [
+    # 1 — Esquema base
+    (1, """
+        CREATE TABLE IF NOT EXISTS Configuracion (
+            id            INTEGER PRIMARY KEY,
+            nombre_hotel  TEXT    DEFAULT 'Mi Hotel',
+            tasa_dolar_bs REAL    DEFAULT 36.0,
+            usuario_activo TEXT,
+            turno_inicio  TEXT
+        );
+
+        CREATE TABLE IF NOT EXISTS Usuarios (
+            id       INTEGER PRIMARY KEY AUTOINCREMENT,
+            username TEXT    UNIQUE NOT NULL,
+            password TEXT    NOT NULL,
+            nombre   TEXT    NOT NULL,
+            rol      TEXT    DEFAULT 'recepcionista',
+            activo   INTEGER DEFAULT 1
+        );
+
+        CREATE TABLE IF NOT EXISTS Huespedes (
+            id               INTEGER PRIMARY KEY AUTOINCREMENT,
+            documento        TEXT    UNIQUE NOT NULL,
+            nombres          TEXT    NOT NULL,
+            telefono         TEXT,
+            fecha_nacimiento TEXT,
+            nacionalidad     TEXT    DEFAULT 'Venezolano',
+            profesion        TEXT,
+            vehiculo         TEXT,
+            saldo_acumulado  REAL    DEFAULT 0.0
+        );
+
+        CREATE TABLE IF NOT EXISTS Habitaciones (
+            numero      INTEGER PRIMARY KEY,
+            tipo        TEXT    DEFAULT 'Estándar',
+            descripcion TEXT,
+            precio_usd  REAL    DEFAULT 30.0,
+            estado      TEXT    DEFAULT 'Libre'
+        );
+
+        CREATE TABLE IF NOT EXISTS Registros (
+            id                    INTEGER PRIMARY KEY AUTOINCREMENT,
+            huesped_principal_id  INTEGER NOT NULL,
+            habitacion_id         INTEGER NOT NULL,
+            fecha_entrada         TEXT    NOT NULL,
+            fecha_salida_prevista TEXT    NOT NULL,
+            estado                TEXT    DEFAULT 'Activo',
+            notas                 TEXT,
+            FOREIGN KEY(huesped_principal_id) REFERENCES Huespedes(id),
+            FOREIGN KEY(habitacion_id)        REFERENCES Habitaciones(numero)
+        );
+
+        CREATE TABLE IF NOT EXISTS Acompanantes (
+            id          INTEGER PRIMARY KEY AUTOINCREMENT,
+            registro_id INTEGER NOT NULL,
+            huesped_id  INTEGER NOT NULL,
+            FOREIGN KEY(registro_id) REFERENCES Registros(id),
+            FOREIGN KEY(huesped_id)  REFERENCES Huespedes(id)
+        );
+
+        CREATE TABLE IF NOT EXISTS Transacciones (
+            id          INTEGER PRIMARY KEY AUTOINCREMENT,
+            registro_id INTEGER,
+            monto_usd   REAL    NOT NULL,
+            tasa_cambio REAL    NOT NULL,
+            monto_bs    REAL    NOT NULL,
+            metodo_pago TEXT    NOT NULL,
+            tipo        TEXT    NOT NULL,
+            fecha_hora  TEXT    NOT NULL,
+            usuario_id  INTEGER,
+            referencia  TEXT,
+            descripcion TEXT
+        );
+
+        CREATE TABLE IF NOT EXISTS CierresTurno (
+            id             INTEGER PRIMARY KEY AUTOINCREMENT,
+            usuario_id     INTEGER,
+            fecha_apertura TEXT,
+            fecha_cierre   TEXT,
+            total_usd      REAL,
+            total_bs       REAL,
+            resumen        TEXT
+        );
+    """),
+
+    # 2 — Índices para los accesos frecuentes del DAL
+    (2, """
+        CREATE INDEX IF NOT EXISTS idx_transacciones_usuario_fecha
+            ON Transacciones (usuario_id, fecha_hora);
+
+        CREATE INDEX IF NOT EXISTS idx_transacciones_registro
+            ON Transacciones (registro_id, fecha_hora);
+
+        CREATE INDEX IF NOT EXISTS idx_registros_activos
+            ON Registros (habitacion_id) WHERE estado = 'Activo';
+
+        CREATE INDEX IF NOT EXISTS idx_registros_huesped
+            ON Registros (huesped_principal_id);
+
+        CREATE INDEX IF NOT EXISTS idx_acompanantes_registro
+            ON Acompanantes (registro_id);
+
+        CREATE INDEX IF NOT EXISTS idx_cierres_fecha
+            ON CierresTurno (fecha_cierre);
+    """),
+
+    # 3 — Registro de cambios para refresco incremental entre terminales
+    (3, """
+        CREATE TABLE IF NOT EXISTS Cambios (
+            seq     INTEGER PRIMARY KEY AUTOINCREMENT,
+            tabla   TEXT    NOT NULL,
+            fila_id INTEGER NOT NULL,
+            op      TEXT    NOT NULL
+        );
+    """ + _change_log_triggers("Habitaciones", "Registros", "Huespedes", "Transacciones")),
+
+    # 4 — Índice de texto completo de huéspedes (ver _migrate_huespedes_fts)
+    (4, lambda conn: _migrate_huespedes_fts(conn)),
+
+    # 5 — Resumen diario precalculado (pagos por método y check-ins/outs).
+    #     Los triggers lo mantienen al insertar pagos, registros y al cerrar
+    #     una estancia; rebuild_resumen_diario() lo recalcula desde cero.
+    (5, """
+        CREATE TABLE IF NOT EXISTS ResumenDiarioPagos (
+            fecha       TEXT    NOT NULL,
+            metodo_pago TEXT    NOT NULL,
+            total_usd   REAL    NOT NULL DEFAULT 0,
+            total_bs    REAL    NOT NULL DEFAULT 0,
+            cantidad    INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (fecha, metodo_pago)
+        ) WITHOUT ROWID;
+
+        CREATE TABLE IF NOT EXISTS ResumenDiarioEstancias (
+            fecha     TEXT    PRIMARY KEY,
+            checkins  INTEGER NOT NULL DEFAULT 0,
+            checkouts INTEGER NOT NULL DEFAULT 0
+        ) WITHOUT ROWID;
+
+        CREATE TRIGGER IF NOT EXISTS trg_resumen_pago
+        AFTER INSERT ON Transacciones WHEN NEW.tipo = 'Pago'
+        BEGIN
+            INSERT INTO ResumenDiarioPagos (fecha, metodo_pago, total_usd, total_bs, cantidad)
+            VALUES (DATE(NEW.fecha_hora), NEW.metodo_pago, NEW.monto_usd, NEW.monto_bs, 1)
+            ON CONFLICT (fecha, metodo_pago) DO UPDATE SET
+                total_usd = total_usd + excluded.total_usd,
+                total_bs  = total_bs  + excluded.total_bs,
+                cantidad  = cantidad  + 1;
+        END;
+
+        CREATE TRIGGER IF NOT EXISTS trg_resumen_checkin
+        AFTER INSERT ON Registros
+        BEGIN
+            INSERT INTO ResumenDiarioEstancias (fecha, checkins)
+            VALUES (DATE(NEW.fecha_entrada), 1)
+            ON CONFLICT (fecha) DO UPDATE SET checkins = checkins + 1;
+        END;
+
+        CREATE TRIGGER IF NOT EXISTS trg_resumen_checkout
+        AFTER UPDATE OF estado ON Registros
+        WHEN NEW.estado = 'Cerrado' AND OLD.estado IS NOT 'Cerrado'
+        BEGIN
+            INSERT INTO ResumenDiarioEstancias (fecha, checkouts)
+            VALUES (DATE(NEW.fecha_salida_prevista), 1)
+            ON CONFLICT (fecha) DO UPDATE SET checkouts = checkouts + 1;
+        END;
+    """ + _REBUILD_RESUMEN_SQL.format(transacciones="Transacciones", registros="Registros",
+                                      filtro_pagos="", filtro_entrada="", filtro_salida="")),
+
+    # 6 — Libro de movimientos de saldo. Huespedes.saldo_acumulado queda como
+    #     total materializado: cada cambio pasa por _registrar_movimiento.
+    (6, """
+        CREATE TABLE IF NOT EXISTS MovimientosSaldo (
+            id               INTEGER PRIMARY KEY AUTOINCREMENT,
+            huesped_id       INTEGER NOT NULL REFERENCES Huespedes(id),
+            registro_id      INTEGER REFERENCES Registros(id),
+            transaccion_id   INTEGER REFERENCES Transacciones(id),
+            monto            REAL    NOT NULL,  -- >0 crédito (a favor), <0 débito (deuda)
+            saldo_resultante REAL    NOT NULL,
+            concepto         TEXT,
+            fecha_hora       TEXT    NOT NULL
+        );
+
+        CREATE INDEX IF NOT EXISTS idx_movimientos_huesped
+            ON MovimientosSaldo (huesped_id, id);
+
+        CREATE INDEX IF NOT EXISTS idx_huespedes_saldo
+            ON Huespedes (saldo_acumulado) WHERE saldo_acumulado <> 0;
+
+        CREATE TABLE IF NOT EXISTS Metadatos (
+            clave TEXT PRIMARY KEY,
+            valor TEXT
+        ) WITHOUT ROWID;
+
+        INSERT INTO MovimientosSaldo (huesped_id, monto, saldo_resultante, concepto, fecha_hora)
+        SELECT id, saldo_acumulado, saldo_acumulado, 'Saldo inicial',
+               strftime('%Y-%m-%dT%H:%M:%S', 'now', 'localtime')
+        FROM Huespedes WHERE saldo_acumulado <> 0;
+    """),
+
+    # 7 — Índice por fecha para exportar/consultar Transacciones por rango
+    (7, """
+        CREATE INDEX IF NOT EXISTS idx_transacciones_fecha
+            ON Transacciones (fecha_hora);
+    """),
+
+    # 8 — Archivo histórico. MovimientosSaldo se reconstruye sin FOREIGN KEY a
+    #     Registros/Transacciones: sus filas pueden pasar al archivo y el
+    #     vínculo se conserva como referencia. Las vistas *Historico de main
+    #     leen solo la base activa; cada conexión con el archivo adjunto las
+    #     reemplaza por vistas TEMP que unen ambas (ver _VISTAS_HISTORICO).
+    (8, """
+        CREATE TABLE MovimientosSaldo_v8 (
+            id               INTEGER PRIMARY KEY AUTOINCREMENT,
+            huesped_id       INTEGER NOT NULL REFERENCES Huespedes(id),
+            registro_id      INTEGER,
+            transaccion_id   INTEGER,
+            monto            REAL    NOT NULL,
+            saldo_resultante REAL    NOT NULL,
+            concepto         TEXT,
+            fecha_hora       TEXT    NOT NULL
+        );
+        INSERT INTO MovimientosSaldo_v8 SELECT * FROM MovimientosSaldo;
+        DROP TABLE MovimientosSaldo;
+        ALTER TABLE MovimientosSaldo_v8 RENAME TO MovimientosSaldo;
+
+        CREATE INDEX IF NOT EXISTS idx_movimientos_huesped
+            ON MovimientosSaldo (huesped_id, id);
+
+        CREATE INDEX IF NOT EXISTS idx_registros_cerrados
+            ON Registros (fecha_salida_prevista) WHERE estado = 'Cerrado';
+
+        CREATE VIEW IF NOT EXISTS RegistrosHistorico     AS SELECT * FROM Registros;
+        CREATE VIEW IF NOT EXISTS TransaccionesHistorico AS SELECT * FROM Transacciones;
+        CREATE VIEW IF NOT EXISTS AcompanantesHistorico  AS SELECT * FROM Acompanantes;
+    """),
+
+    # 9 — Reservas con fecha. fecha_salida es el día de salida (no se cuenta):
+    #     dos reservas de la misma habitación se solapan si
+    #     entrada_a < salida_b AND entrada_b < salida_a. El índice en memoria
+    #     de reservas.py se mantiene al día con el registro de Cambios.
+    (9, """
+        CREATE TABLE IF NOT EXISTS Reservas (
+            id              INTEGER PRIMARY KEY AUTOINCREMENT,
+            habitacion_id   INTEGER NOT NULL REFERENCES Habitaciones(numero),
+            huesped_id      INTEGER REFERENCES Huespedes(id),
+            nombre_contacto TEXT    NOT NULL,
+            telefono        TEXT,
+            fecha_entrada   TEXT    NOT NULL,   -- AAAA-MM-DD
+            fecha_salida    TEXT    NOT NULL,   -- AAAA-MM-DD, exclusiva
+            estado          TEXT    NOT NULL DEFAULT 'Confirmada',  -- Confirmada | Cancelada | Cumplida
+            notas           TEXT,
+            usuario_id      INTEGER REFERENCES Usuarios(id),
+            fecha_creacion  TEXT    NOT NULL,
+            CHECK (fecha_salida > fecha_entrada)
+        );
+
+        CREATE INDEX IF NOT EXISTS idx_reservas_habitacion
+            ON Reservas (habitacion_id, fecha_entrada) WHERE estado = 'Confirmada';
+
+        CREATE INDEX IF NOT EXISTS idx_reservas_salida
+            ON Reservas (fecha_salida) WHERE estado = 'Confirmada';
+    """ + _change_log_triggers("Reservas")),
+
+    # 10 — Historial de la tasa Bs/$ (una fila por cambio, ver tasas.py).
+    #      Se siembra con los cambios de tasa que dejaron las transacciones
+    #      (incluido el archivo) y con la tasa actual si difiere de la última.
+    (10, """
+        CREATE TABLE IF NOT EXISTS TasasCambio (
+            id            INTEGER PRIMARY KEY AUTOINCREMENT,
+            tasa          REAL    NOT NULL,
+            vigente_desde TEXT    NOT NULL,   -- ISO, mismo formato que fecha_hora
+            usuario       TEXT,
+            origen        TEXT    NOT NULL DEFAULT 'config'   -- config | transacciones
+        );
+
+        CREATE INDEX IF NOT EXISTS idx_tasas_vigente
+            ON TasasCambio (vigente_desde, id);
+
+        INSERT INTO TasasCambio (tasa, vigente_desde, origen)
+        SELECT tasa_cambio, fecha_hora, 'transacciones'
+        FROM (SELECT tasa_cambio, fecha_hora,
+                     LAG(tasa_cambio) OVER (ORDER BY fecha_hora, id) AS anterior
+              FROM TransaccionesHistorico) AS t
+        WHERE anterior IS NULL OR anterior <> tasa_cambio;
+
+        INSERT INTO TasasCambio (tasa, vigente_desde, usuario)
+        SELECT tasa_dolar_bs, strftime('%Y-%m-%dT%H:%M:%S', 'now', 'localtime'), usuario_activo
+        FROM Configuracion
+        WHERE id = 1
+          AND tasa_dolar_bs IS NOT (SELECT tasa FROM TasasCambio
+                                    ORDER BY vigente_desde DESC, id DESC LIMIT 1);
+    """),
+
+    # 11 — Documentos de huéspedes en forma canónica (como normalizar_documento).
+    #      Solo los que no chocan con otro huésped: "V-12.345.678" y
+    #      "V12345678" quedan como están hasta que el operador revise y
+    #      aplique la fusión (manage.py fusionar-documentos).
+    (11, """
+        WITH n AS (
+            SELECT id, documento,
+                   UPPER(REPLACE(REPLACE(REPLACE(REPLACE(REPLACE(REPLACE(documento,
+                         ' ', ''), '.', ''), '-', ''), char(9), ''), char(10), ''),
+                         char(13), '')) AS doc
+            FROM Huespedes
+        )
+        UPDATE Huespedes
+        SET documento = (SELECT doc FROM n WHERE n.id = Huespedes.id)
+        WHERE id IN (SELECT id FROM n
+                     WHERE doc <> documento
+                       AND doc IN (SELECT doc FROM n GROUP BY doc HAVING COUNT(*) = 1));
+    """),
+]
+
+SCHEMA_VERSION = MIGRATIONS[-1][0]
+assert MIGRATIONS_PG[-1][0] == SCHEMA_VERSION, "schema_pg.py debe tener las mismas versiones"
+
+CHANGE_LOG_KEEP = 50_000   # cambios que se conservan al depurar el registro
+
+
+def get_schema_version(conn: sqlite3.Connection) -> int:
+    return get_backend().get_schema_version(conn)
+
+
+def migrate(conn: sqlite3.Connection) -> int:
+    """
+    Aplica las migraciones pendientes en una sola transacción con el bloqueo
+    de esquema tomado (BEGIN IMMEDIATE en SQLite, advisory lock en
+    PostgreSQL). La versión se relee con el bloqueo tomado, así dos terminales
+    que arrancan a la vez no aplican la misma migración dos veces.
+    Retorna la versión final.
+    """
+    backend     = get_backend()
+    migraciones = MIGRATIONS_PG if backend.name == "postgresql" else MIGRATIONS
+    if backend.get_schema_version(conn) >= SCHEMA_VERSION:
+        return backend.get_schema_version(conn)
+    backend.lock_schema(conn)
+    try:
+        actual = backend.get_schema_version(conn)
+        for version, script in migraciones:
+            if version <= actual:
+                continue
+            if callable(script):
+                script(conn)
+            else:
+                backend.run_script(conn, script)
+            backend.set_schema_version(conn, version)
         conn.commit()
     except Exception:
         conn.rollback()
         raise
-    finally:
-        conn.close()
+    return get_schema_version(conn)
 
 
+@_escritura(cola=False)
 def init_db():
     """Inicializa todas las tablas y datos por defecto."""
     with get_connection() as conn:
-        conn.executescript("""
-            CREATE TABLE IF NOT EXISTS Configuracion (
-                id            INTEGER PRIMARY KEY,
-                nombre_hotel  TEXT    DEFAULT 'Mi Hotel',
-                tasa_dolar_bs REAL    DEFAULT 36.0,
-                usuario_activo TEXT,
-                turno_inicio  TEXT
-            );
-
-            CREATE TABLE IF NOT EXISTS Usuarios (
-                id       INTEGER PRIMARY KEY AUTOINCREMENT,
-                username TEXT    UNIQUE NOT NULL,
-                password TEXT    NOT NULL,
-                nombre   TEXT    NOT NULL,
-                rol      TEXT    DEFAULT 'recepcionista',
-                activo   INTEGER DEFAULT 1
-            );
-
-            CREATE TABLE IF NOT EXISTS Huespedes (
-                id               INTEGER PRIMARY KEY AUTOINCREMENT,
-                documento        TEXT    UNIQUE NOT NULL,
-                nombres          TEXT    NOT NULL,
-                telefono         TEXT,
-                fecha_nacimiento TEXT,
-                nacionalidad     TEXT    DEFAULT 'Venezolano',
-                profesion        TEXT,
-                vehiculo         TEXT,
-                saldo_acumulado  REAL    DEFAULT 0.0
-            );
-
-            CREATE TABLE IF NOT EXISTS Habitaciones (
-                numero      INTEGER PRIMARY KEY,
-                tipo        TEXT    DEFAULT 'Estándar',
-                descripcion TEXT,
-                precio_usd  REAL    DEFAULT 30.0,
-                estado      TEXT    DEFAULT 'Libre'
-            );
-
-            CREATE TABLE IF NOT EXISTS Registros (
-                id                    INTEGER PRIMARY KEY AUTOINCREMENT,
-                huesped_principal_id  INTEGER NOT NULL,
-                habitacion_id         INTEGER NOT NULL,
-                fecha_entrada         TEXT    NOT NULL,
-                fecha_salida_prevista TEXT    NOT NULL,
-                estado                TEXT    DEFAULT 'Activo',
-                notas                 TEXT,
-                FOREIGN KEY(huesped_principal_id) REFERENCES Huespedes(id),
-                FOREIGN KEY(habitacion_id)        REFERENCES Habitaciones(numero)
-            );
-
-            CREATE TABLE IF NOT EXISTS Acompanantes (
-                id          INTEGER PRIMARY KEY AUTOINCREMENT,
-                registro_id INTEGER NOT NULL,
-                huesped_id  INTEGER NOT NULL,
-                FOREIGN KEY(registro_id) REFERENCES Registros(id),
-                FOREIGN KEY(huesped_id)  REFERENCES Huespedes(id)
-            );
-
-            CREATE TABLE IF NOT EXISTS Transacciones (
-                id          INTEGER PRIMARY KEY AUTOINCREMENT,
-                registro_id INTEGER,
-                monto_usd   REAL    NOT NULL,
-                tasa_cambio REAL    NOT NULL,
-                monto_bs    REAL    NOT NULL,
-                metodo_pago TEXT    NOT NULL,
-                tipo        TEXT    NOT NULL,
-                fecha_hora  TEXT    NOT NULL,
-                usuario_id  INTEGER,
-                referencia  TEXT,
-                descripcion TEXT
-            );
-
-            CREATE TABLE IF NOT EXISTS CierresTurno (
-                id             INTEGER PRIMARY KEY AUTOINCREMENT,
-                usuario_id     INTEGER,
-                fecha_apertura TEXT,
-                fecha_cierre   TEXT,
-                total_usd      REAL,
-                total_bs       REAL,
-                resumen        TEXT
-            );
-        """)
+        get_backend().prepare(conn)
+        if _archivo_disponible():
+            _ensure_archivo(conn)   # antes de migrar: las vistas TEMP lo referencian
+        migrate(conn)
 
         # Config por defecto
         if conn.execute("SELECT COUNT(*) FROM Configuracion").fetchone()[0] == 0:
@@ -118,6 +846,7 @@ def init_db():
                 "INSERT INTO Configuracion (nombre_hotel, tasa_dolar_bs) VALUES (?,?)",
                 ("Mi Hotel", 36.0)
             )
+            _q(conn, "tasas.agregar", (36.0, datetime.now().isoformat(), None))
 
         # Usuario admin por defecto
         if conn.execute("SELECT COUNT(*) FROM Usuarios").fetchone()[0] == 0:
@@ -148,20 +877,77 @@ def init_db():
                 rooms
             )
 
+        # Depurar el registro de cambios (las terminales atrasadas recargan todo)
+        conn.execute(
+            "DELETE FROM Cambios WHERE seq <= (SELECT MAX(seq) FROM Cambios) - ?",
+            (CHANGE_LOG_KEEP,)
+        )
+
 
 # ─── CONFIGURACIÓN ────────────────────────────────────────────────────────────
 
-def get_config() -> dict:
+def _load_config() -> dict:
     with get_connection() as conn:
-        row = conn.execute("SELECT * FROM Configuracion WHERE id=1").fetchone()
+        row = _q(conn, "config.obtener").fetchone()
         return dict(row) if row else {}
 
 
-def update_config(data: dict):
+def _load_tasas() -> RateHistory:
     with get_connection() as conn:
-        placeholders = ", ".join(f"{k}=?" for k in data)
-        conn.execute(f"UPDATE Configuracion SET {placeholders} WHERE id=1",
-                     list(data.values()))
+        filas = _q(conn, "tasas.historial").fetchall()
+        row   = _q(conn, "config.obtener").fetchone()
+        return RateHistory(filas, row["tasa_dolar_bs"] if row else None)
+
+
+_config_caches: dict[tuple[str, str], ConfigCache] = {}
+_config_caches_lock = threading.Lock()
+
+
+def _cache(nombre: str, loader, copy=dict) -> ConfigCache:
+    """Caché `nombre` de la base actual (una por motor/base)."""
+    backend = get_backend()
+    with _config_caches_lock:
+        cache = _config_caches.get((backend.key, nombre))
+        if cache is None:
+            cache = ConfigCache(loader, backend.probe_factory, copy)
+            _config_caches[(backend.key, nombre)] = cache
+        return cache
+
+
+def _config_cache() -> ConfigCache:
+    return _cache("config", _load_config)
+
+
+def _tasas_cache() -> ConfigCache:
+    return _cache("tasas", _load_tasas, copy=lambda historial: historial)
+
+
+def get_config() -> dict:
+    return _config_cache().get()
+
+
+def _check_columns(tabla: str, data: dict):
+    desconocidas = set(data) - set(UPDATABLE_COLUMNS[tabla])
+    if desconocidas:
+        raise ValueError(f"Columnas no modificables en {tabla}: {', '.join(sorted(desconocidas))}")
+
+
+@_escritura
+def update_config(data: dict):
+    """
+    Actualiza las columnas indicadas de la configuración. Siempre ejecuta la
+    misma sentencia (fila completa), de modo que queda preparada en caché.
+    """
+    _check_columns("Configuracion", data)
+    with get_connection(write=True) as conn:
+        actual = dict(_q(conn, "config.obtener").fetchone())
+        nueva  = {k: data.get(k, actual[k]) for k in UPDATABLE_COLUMNS["Configuracion"]}
+        _q(conn, "config.actualizar", nueva)
+        if nueva["tasa_dolar_bs"] != actual["tasa_dolar_bs"]:
+            _q(conn, "tasas.agregar", (nueva["tasa_dolar_bs"], datetime.now().isoformat(),
+                                       nueva["usuario_activo"]))
+    _config_cache().invalidate()
+    _tasas_cache().invalidate()
 
 
 def get_tasa() -> float:
@@ -177,85 +963,301 @@ def bs_to_usd(monto_bs: float) -> float:
     return round(monto_bs / tasa, 4) if tasa else 0.0
 
 
+# Tasas históricas: un cambio de tasa no altera lo ya cobrado (cada transacción
+# guarda su tasa_cambio), pero los montos en USD sin tasa propia (ingresos por
+# noche, precios) se convierten con la tasa vigente en su fecha, no la de hoy.
+
+def get_rate_history() -> RateHistory:
+    """Historial de tasas en memoria (se recarga solo si cambió la base)."""
+    return _tasas_cache().get()
+
+
+def convertir_a_bs_historico(filas, campo_fecha: str = "fecha_hora",
+                             campo_usd: str = "monto_usd") -> list[dict]:
+    """
+    Copia de `filas` con "tasa_historica" y "monto_bs_historico" según la tasa
+    vigente en campo_fecha de cada una, en una sola pasada sobre el historial.
+    """
+    return get_rate_history().convertir(filas, campo_fecha, campo_usd)
+
+
 # ─── USUARIOS ─────────────────────────────────────────────────────────────────
 
 def login(username: str, password: str) -> dict | None:
     with get_connection() as conn:
-        row = conn.execute(
-            "SELECT * FROM Usuarios WHERE username=? AND password=? AND activo=1",
-            (username, password)
-        ).fetchone()
+        row = _q(conn, "usuarios.login", (username, password)).fetchone()
         return dict(row) if row else None
 
 
 def get_all_users() -> list[dict]:
     with get_connection() as conn:
-        return [dict(r) for r in conn.execute("SELECT * FROM Usuarios").fetchall()]
+        return [dict(r) for r in _q(conn, "usuarios.todos").fetchall()]
 
 
+@_escritura
 def create_user(data: dict):
-    with get_connection() as conn:
-        conn.execute(
-            "INSERT INTO Usuarios (username, password, nombre, rol) VALUES (:username,:password,:nombre,:rol)",
-            data
-        )
+    with get_connection(write=True) as conn:
+        _q(conn, "usuarios.crear", data)
 
 
+@_escritura
 def toggle_user_activo(user_id: int):
-    with get_connection() as conn:
-        conn.execute("UPDATE Usuarios SET activo = CASE WHEN activo=1 THEN 0 ELSE 1 END WHERE id=?",
-                     (user_id,))
+    with get_connection(write=True) as conn:
+        _q(conn, "usuarios.alternar_activo", (user_id,))
 
 
 # ─── HUÉSPEDES ────────────────────────────────────────────────────────────────
 
+def normalizar_documento(doc: str) -> str:
+    """Documento en forma canónica: mayúsculas, sin espacios, puntos ni guiones."""
+    return re.sub(r"[\s.\-]", "", doc or "").upper()
+
+
+# Datos del huésped que una fusión completa con los del duplicado si faltan
+_HUESPED_DATOS = ("nombres", "telefono", "fecha_nacimiento", "nacionalidad",
+                  "profesion", "vehiculo")
+
+
+def _plan_documentos(conn) -> list[dict]:
+    """
+    Documentos que no están en forma canónica, agrupados por la forma
+    canónica: {"documento", "conservar", "duplicados"}. Se conserva el
+    huésped que ya tiene el documento normalizado (o el más antiguo).
+    """
+    grupos: dict[str, list[dict]] = {}
+    for row in conn.execute("SELECT * FROM Huespedes ORDER BY id").fetchall():
+        grupos.setdefault(normalizar_documento(row["documento"]), []).append(dict(row))
+    plan = []
+    for documento, filas in grupos.items():
+        if len(filas) == 1 and filas[0]["documento"] == documento:
+            continue
+        conservar = next((f for f in filas if f["documento"] == documento), filas[0])
+        plan.append({"documento": documento, "conservar": conservar,
+                     "duplicados": [f for f in filas if f is not conservar]})
+    return plan
+
+
+def plan_fusion_documentos() -> list[dict]:
+    """Lo que haría fusionar_documentos(), sin modificar nada."""
+    with get_connection() as conn:
+        return _plan_documentos(conn)
+
+
+@_escritura
+def fusionar_documentos() -> list[dict]:
+    """
+    Lleva todos los documentos a la forma de normalizar_documento y fusiona
+    los huéspedes que quedan con el mismo ("V-12.345.678" y "V12345678"):
+    sus datos vacíos se completan con los del duplicado, estancias,
+    acompañantes, reservas y movimientos pasan al que se conserva y los
+    saldos se suman. Cada fusión queda asentada en MovimientosSaldo (monto 0).
+    Retorna el plan aplicado (ver plan_fusion_documentos).
+    """
+    referencias = [("Registros", "huesped_principal_id"), ("Acompanantes", "huesped_id"),
+                   ("Reservas", "huesped_id"), ("MovimientosSaldo", "huesped_id")]
+    if _archivo_disponible():
+        referencias += [("archivo.Registros", "huesped_principal_id"),
+                        ("archivo.Acompanantes", "huesped_id")]
+    ahora = datetime.now().isoformat(timespec="seconds")
+
+    with get_connection(write=True) as conn:
+        plan = _plan_documentos(conn)
+        for grupo in plan:
+            conservar = dict(grupo["conservar"])
+            conservar["saldo_acumulado"] = conservar["saldo_acumulado"] or 0.0
+            for dup in grupo["duplicados"]:
+                for tabla, columna in referencias:
+                    conn.execute(f"UPDATE {tabla} SET {columna}=? WHERE {columna}=?",
+                                 (conservar["id"], dup["id"]))
+                for columna in _HUESPED_DATOS:
+                    if not conservar[columna] and dup[columna]:
+                        conservar[columna] = dup[columna]
+                conservar["saldo_acumulado"] = round(conservar["saldo_acumulado"]
+                                                     + (dup["saldo_acumulado"] or 0.0), 2)
+                conn.execute("DELETE FROM Huespedes WHERE id=?", (dup["id"],))
+                _q(conn, "saldos.insertar_movimiento",
+                   (conservar["id"], None, None, 0.0, conservar["saldo_acumulado"],
+                    f"Fusión con el huésped #{dup['id']} (documento {dup['documento']})", ahora))
+            conn.execute("""
+                UPDATE Huespedes SET documento=:documento, nombres=:nombres,
+                    telefono=:telefono, fecha_nacimiento=:fecha_nacimiento,
+                    nacionalidad=:nacionalidad, profesion=:profesion,
+                    vehiculo=:vehiculo, saldo_acumulado=:saldo_acumulado
+                WHERE id=:id
+            """, {**conservar, "documento": grupo["documento"]})
+        return plan
+
+
 def get_huesped_by_documento(doc: str) -> dict | None:
     with get_connection() as conn:
-        row = conn.execute("SELECT * FROM Huespedes WHERE documento=?", (doc,)).fetchone()
+        row = _q(conn, "huespedes.por_documento", (doc,)).fetchone()
         return dict(row) if row else None
 
 
 def get_huesped_by_id(hid: int) -> dict | None:
     with get_connection() as conn:
-        row = conn.execute("SELECT * FROM Huespedes WHERE id=?", (hid,)).fetchone()
+        row = _q(conn, "huespedes.por_id", (hid,)).fetchone()
         return dict(row) if row else None
 
 
-def search_huespedes(query: str) -> list[dict]:
-    q = f"%{query}%"
+def _has_huespedes_fts(conn) -> bool:
+    if not get_backend().supports_fts:
+        return False
+    return conn.execute(
+        "SELECT 1 FROM sqlite_master WHERE name='HuespedesFTS'"
+    ).fetchone() is not None
+
+
+def search_huespedes(query: str, limit: int = 20) -> list[dict]:
+    """
+    Búsqueda de huéspedes ordenada por relevancia: primero los documentos que
+    empiezan por el texto (rango sobre el índice único de documento), luego
+    coincidencias por prefijo de palabra en nombres/documento vía FTS5.
+    """
+    query = query.strip()
+    if not query:
+        return []
+    # Los documentos se guardan normalizados: "v-12.345" busca "V12345"
+    doc = normalizar_documento(query)
     with get_connection() as conn:
-        rows = conn.execute(
-            "SELECT * FROM Huespedes WHERE documento LIKE ? OR nombres LIKE ? LIMIT 20",
-            (q, q)
-        ).fetchall()
-        return [dict(r) for r in rows]
+        if not _has_huespedes_fts(conn):
+            like = "LIKE" if get_backend().name == "sqlite" else "ILIKE"
+            rows = conn.execute(
+                f"SELECT * FROM Huespedes WHERE documento {like} ? OR nombres {like} ? LIMIT ?",
+                (f"%{doc or query}%", f"%{query}%", limit)
+            ).fetchall()
+            return [dict(r) for r in rows]
+
+        resultados = []
+        if doc:
+            doc_fin = doc[:-1] + chr(ord(doc[-1]) + 1)
+            resultados = [dict(r) for r in _q(conn, "huespedes.rango_documento",
+                                              (doc, doc_fin, limit)).fetchall()]
+
+        tokens = re.findall(r"\w+", query)
+        if tokens and len(resultados) < limit:
+            match = " ".join(f'"{t}"*' for t in tokens)
+            vistos = {r["id"] for r in resultados}
+            rows = _q(conn, "huespedes.buscar_fts", (match, limit)).fetchall()
+            for r in rows:
+                if r["id"] not in vistos and len(resultados) < limit:
+                    resultados.append(dict(r))
+        return resultados
+
+
+@_escritura
+def create_huesped(data: dict) -> int:
+    with get_connection(write=True) as conn:
+        return _insert_id(conn, "huespedes.crear", data)
 
 
-def create_huesped(data: dict) -> int:
-    with get_connection() as conn:
-        conn.execute("""
-            INSERT INTO Huespedes (documento, nombres, telefono, fecha_nacimiento,
-                                   nacionalidad, profesion, vehiculo, saldo_acumulado)
-            VALUES (:documento,:nombres,:telefono,:fecha_nacimiento,
-                    :nacionalidad,:profesion,:vehiculo, 0)
-        """, data)
-        return conn.execute("SELECT last_insert_rowid()").fetchone()[0]
+@_escritura
+def upsert_huespedes(rows: list[dict]) -> int:
+    """
+    Inserta o actualiza (por documento) varios huéspedes con un solo
+    executemany y un solo commit. En los existentes no toca el saldo y los
+    campos vacíos conservan el valor guardado. Retorna la cantidad de filas.
+    """
+    if not rows:
+        return 0
+    with get_connection(write=True) as conn:
+        registry.executemany(conn, "huespedes.upsert", rows)
+    return len(rows)
 
 
+@_escritura
 def update_huesped(data: dict):
+    with get_connection(write=True) as conn:
+        _q(conn, "huespedes.actualizar", data)
+
+
+@_escritura
+def update_huesped_saldo(huesped_id: int, nuevo_saldo: float, concepto: str = "Ajuste"):
+    with get_connection(write=True) as conn:
+        _registrar_movimiento(conn, huesped_id, nuevo_saldo, concepto=concepto)
+
+
+def _registrar_movimiento(conn: sqlite3.Connection, huesped_id: int, saldo_nuevo: float,
+                          registro_id: int | None = None,
+                          transaccion_id: int | None = None,
+                          concepto: str = "") -> float:
+    """
+    Lleva saldo_acumulado a saldo_nuevo y asienta la diferencia en
+    MovimientosSaldo. Debe llamarse dentro de una transacción de escritura.
+    Retorna el monto asentado (0 si el saldo no cambió).
+    """
+    row = _q(conn, "huespedes.saldo", (huesped_id,)).fetchone()
+    if row is None:
+        raise ValueError(f"No existe el huésped {huesped_id}.")
+    saldo_nuevo = round(saldo_nuevo, 2)
+    monto       = round(saldo_nuevo - (row[0] or 0.0), 2)
+    if monto == 0:
+        return 0.0
+    _q(conn, "huespedes.fijar_saldo", (saldo_nuevo, huesped_id))
+    _q(conn, "saldos.insertar_movimiento", (huesped_id, registro_id, transaccion_id, monto, saldo_nuevo, concepto,
+          datetime.now().isoformat(timespec="seconds")))
+    return monto
+
+
+def get_movimientos_saldo(huesped_id: int, limit: int = 50) -> list[dict]:
+    """Últimos movimientos de saldo del huésped, del más reciente al más antiguo."""
     with get_connection() as conn:
-        conn.execute("""
-            UPDATE Huespedes SET nombres=:nombres, telefono=:telefono,
-                fecha_nacimiento=:fecha_nacimiento, nacionalidad=:nacionalidad,
-                profesion=:profesion, vehiculo=:vehiculo
-            WHERE id=:id
-        """, data)
+        rows = _q(conn, "saldos.movimientos", (huesped_id, limit)).fetchall()
+        return [dict(r) for r in rows]
 
 
-def update_huesped_saldo(huesped_id: int, nuevo_saldo: float):
+def get_huespedes_con_saldo() -> list[dict]:
+    """Huéspedes con deuda o saldo a favor (usa el índice parcial de saldo)."""
     with get_connection() as conn:
-        conn.execute("UPDATE Huespedes SET saldo_acumulado=? WHERE id=?",
-                     (round(nuevo_saldo, 2), huesped_id))
+        rows = _q(conn, "huespedes.con_saldo").fetchall()
+        return [dict(r) for r in rows]
+
+
+_VERIFICAR_SALDOS_SQL = """
+    SELECT h.id AS huesped_id, h.saldo_acumulado,
+           COALESCE((SELECT ROUND(SUM(m.monto), 2) FROM MovimientosSaldo m
+                     WHERE m.huesped_id = h.id), 0) AS saldo_libro
+    FROM Huespedes h
+    {filtro}
+"""
+
+
+@_escritura
+def verificar_saldos(completo: bool = False) -> list[dict]:
+    """
+    Compara saldo_acumulado con la suma del libro de movimientos.
+    Por defecto solo revisa los huéspedes modificados desde la última
+    verificación (según el registro de Cambios); si nunca se verificó o el
+    registro ya fue depurado más allá de ese punto, revisa todos.
+    Retorna las diferencias encontradas; el punto de control solo avanza
+    cuando no hay ninguna, para que se sigan reportando hasta corregirlas.
+    """
+    with get_connection(write=True) as conn:
+        row = conn.execute(
+            "SELECT valor FROM Metadatos WHERE clave='saldos_verificados_hasta'"
+        ).fetchone()
+        desde  = int(row[0]) if row and not completo else None
+        hasta  = _q(conn, "cambios.ultimo_seq").fetchone()[0]
+        minimo = conn.execute("SELECT MIN(seq) FROM Cambios").fetchone()[0]
+        if desde is not None and minimo is not None and minimo > desde + 1:
+            desde = None    # hubo depuración: faltan cambios intermedios
+
+        if desde is None:
+            rows = conn.execute(_VERIFICAR_SALDOS_SQL.format(filtro="")).fetchall()
+        else:
+            rows = conn.execute(_VERIFICAR_SALDOS_SQL.format(filtro="""
+                WHERE h.id IN (SELECT fila_id FROM Cambios
+                               WHERE seq > ? AND tabla = 'Huespedes')
+            """), (desde,)).fetchall()
+
+        diferencias = [dict(r) for r in rows
+                       if abs((r["saldo_acumulado"] or 0.0) - r["saldo_libro"]) > 0.005]
+        if not diferencias:
+            conn.execute("""
+                INSERT INTO Metadatos (clave, valor) VALUES ('saldos_verificados_hasta', ?)
+                ON CONFLICT (clave) DO UPDATE SET valor = excluded.valor
+            """, (str(hasta),))
+        return diferencias
 
 
 # ─── HABITACIONES ─────────────────────────────────────────────────────────────
@@ -263,218 +1265,762 @@ def update_huesped_saldo(huesped_id: int, nuevo_saldo: float):
 def get_all_habitaciones() -> list[dict]:
     """Retorna habitaciones con info del huésped activo si aplica."""
     with get_connection() as conn:
-        rows = conn.execute("""
-            SELECT h.*,
-                   r.id              AS registro_id,
-                   r.fecha_entrada,
-                   r.fecha_salida_prevista,
-                   g.nombres         AS huesped_nombre,
-                   g.documento       AS huesped_doc,
-                   g.saldo_acumulado AS huesped_saldo
-            FROM Habitaciones h
-            LEFT JOIN Registros r ON h.numero = r.habitacion_id AND r.estado = 'Activo'
-            LEFT JOIN Huespedes g ON r.huesped_principal_id = g.id
-            ORDER BY h.numero
-        """).fetchall()
+        rows = _q(conn, "habitaciones.todas").fetchall()
+        return [dict(r) for r in rows]
+
+
+def get_habitaciones(numeros: list[int]) -> list[dict]:
+    """Como get_all_habitaciones, pero solo para los números indicados."""
+    if not numeros:
+        return []
+    marcas = ",".join("?" * len(numeros))
+    with get_connection() as conn:
+        rows = conn.execute(
+            HABITACIONES_BASE + f" WHERE h.numero IN ({marcas}) ORDER BY h.numero",
+            list(numeros)
+        ).fetchall()
         return [dict(r) for r in rows]
 
 
 def get_habitacion(numero: int) -> dict | None:
     with get_connection() as conn:
-        row = conn.execute("SELECT * FROM Habitaciones WHERE numero=?", (numero,)).fetchone()
+        row = _q(conn, "habitaciones.por_numero", (numero,)).fetchone()
         return dict(row) if row else None
 
 
+@_escritura
 def update_habitacion(numero: int, data: dict):
-    with get_connection() as conn:
-        placeholders = ", ".join(f"{k}=?" for k in data)
-        conn.execute(f"UPDATE Habitaciones SET {placeholders} WHERE numero=?",
-                     list(data.values()) + [numero])
+    _check_columns("Habitaciones", data)
+    with get_connection(write=True) as conn:
+        actual = _q(conn, "habitaciones.por_numero", (numero,)).fetchone()
+        if actual is None:
+            raise ValueError(f"No existe la habitación #{numero}.")
+        fila = {k: data.get(k, actual[k]) for k in UPDATABLE_COLUMNS["Habitaciones"]}
+        _q(conn, "habitaciones.actualizar", {**fila, "numero": numero})
 
 
+@_escritura
 def set_estado_habitacion(numero: int, estado: str):
-    with get_connection() as conn:
-        conn.execute("UPDATE Habitaciones SET estado=? WHERE numero=?", (estado, numero))
+    with get_connection(write=True) as conn:
+        _q(conn, "habitaciones.fijar_estado", (estado, numero))
 
 
 # ─── REGISTROS (CHECK-IN / CHECK-OUT) ─────────────────────────────────────────
 
+@_escritura
 def create_registro(huesped_principal_id: int, habitacion_id: int,
                     fecha_entrada: str, fecha_salida_prevista: str,
                     notas: str = "") -> int:
-    with get_connection() as conn:
-        conn.execute("UPDATE Habitaciones SET estado='Ocupada' WHERE numero=?", (habitacion_id,))
-        conn.execute("""
-            INSERT INTO Registros (huesped_principal_id, habitacion_id, fecha_entrada,
-                                   fecha_salida_prevista, estado, notas)
-            VALUES (?,?,?,?,'Activo',?)
-        """, (huesped_principal_id, habitacion_id, fecha_entrada, fecha_salida_prevista, notas))
-        return conn.execute("SELECT last_insert_rowid()").fetchone()[0]
+    with get_connection(write=True) as conn:
+        _q(conn, "habitaciones.fijar_estado", ("Ocupada", habitacion_id))
+        reg_id = _insert_id(conn, "registros.crear", (huesped_principal_id, habitacion_id, fecha_entrada, fecha_salida_prevista, notas))
+        _avisar_cambio("Registros", reg_id)
+        return reg_id
 
 
 def get_registro_activo(habitacion_id: int) -> dict | None:
     with get_connection() as conn:
-        row = conn.execute("""
-            SELECT r.*,
-                   g.nombres         AS huesped_nombre,
-                   g.documento       AS huesped_doc,
-                   g.saldo_acumulado AS huesped_saldo,
-                   g.id              AS guest_id
-            FROM Registros r
-            JOIN Huespedes g ON r.huesped_principal_id = g.id
-            WHERE r.habitacion_id=? AND r.estado='Activo'
-        """, (habitacion_id,)).fetchone()
+        row = _q(conn, "registros.activo", (habitacion_id,)).fetchone()
         return dict(row) if row else None
 
 
 def get_registro_by_id(reg_id: int) -> dict | None:
     with get_connection() as conn:
-        row = conn.execute("""
-            SELECT r.*,
-                   g.nombres         AS huesped_nombre,
-                   g.documento       AS huesped_doc,
-                   g.saldo_acumulado AS huesped_saldo,
-                   g.id              AS guest_id,
-                   hab.precio_usd,
-                   hab.tipo          AS hab_tipo
-            FROM Registros r
-            JOIN Huespedes   g   ON r.huesped_principal_id = g.id
-            JOIN Habitaciones hab ON r.habitacion_id = hab.numero
-            WHERE r.id=?
-        """, (reg_id,)).fetchone()
+        row = _q(conn, "registros.por_id", (reg_id,)).fetchone()
         return dict(row) if row else None
 
 
+@_escritura
 def checkout_registro(registro_id: int, habitacion_id: int,
                       huesped_id: int, saldo_nuevo: float):
-    with get_connection() as conn:
+    with get_connection(write=True) as conn:
         ahora = datetime.now().strftime("%Y-%m-%d")
-        conn.execute(
-            "UPDATE Registros SET estado='Cerrado', fecha_salida_prevista=? WHERE id=?",
-            (ahora, registro_id)
-        )
-        conn.execute("UPDATE Habitaciones SET estado='Aseo' WHERE numero=?", (habitacion_id,))
-        conn.execute("UPDATE Huespedes SET saldo_acumulado=? WHERE id=?",
-                     (round(saldo_nuevo, 2), huesped_id))
+        _q(conn, "registros.cerrar", (ahora, registro_id))
+        _q(conn, "habitaciones.fijar_estado", ("Aseo", habitacion_id))
+        _avisar_cambio("Registros", registro_id)
+        # El movimiento se asocia al último pago registrado de la estancia
+        ultima = _q(conn, "transacciones.ultima_de_registro", (registro_id,)).fetchone()[0]
+        _registrar_movimiento(conn, huesped_id, saldo_nuevo, registro_id=registro_id,
+                              transaccion_id=ultima, concepto="Checkout")
+
+
+@_escritura
+def checkin_completo(huesped_principal_id: int, habitacion_id: int,
+                     fecha_entrada: str, fecha_salida_prevista: str,
+                     notas: str = "", acompanantes: list[int] = (),
+                     cargo: dict | None = None) -> int:
+    """
+    Check-in completo en una sola transacción: registro, acompañantes, cargo
+    de la estancia y, si la habitación tenía una reserva confirmada para ese
+    día, la marca Cumplida. Si algo falla no queda una habitación ocupada sin
+    cargo. `cargo` tiene los campos de create_transaccion salvo registro_id.
+    """
+    with transaccion() as conn:
+        get_backend().lock_key(conn, _RESERVA_LOCK, habitacion_id)
+        if get_registro_activo(habitacion_id):
+            raise ValueError(f"La habitación #{habitacion_id} ya tiene un registro activo.")
+        reg_id = create_registro(huesped_principal_id, habitacion_id,
+                                 fecha_entrada, fecha_salida_prevista, notas)
+        for huesped_id in acompanantes:
+            add_acompanante(reg_id, huesped_id)
+        if cargo:
+            create_transaccion({**cargo, "registro_id": reg_id})
+        _cumplir_reserva(conn, habitacion_id, huesped_principal_id, fecha_entrada)
+        return reg_id
 
 
 # ─── ACOMPAÑANTES ─────────────────────────────────────────────────────────────
 
+@_escritura
 def add_acompanante(registro_id: int, huesped_id: int):
-    with get_connection() as conn:
-        conn.execute(
-            "INSERT INTO Acompanantes (registro_id, huesped_id) VALUES (?,?)",
-            (registro_id, huesped_id)
-        )
+    with get_connection(write=True) as conn:
+        _q(conn, "acompanantes.agregar", (registro_id, huesped_id))
 
 
+@_escritura
 def remove_acompanante(registro_id: int, huesped_id: int):
-    with get_connection() as conn:
-        conn.execute(
-            "DELETE FROM Acompanantes WHERE registro_id=? AND huesped_id=?",
-            (registro_id, huesped_id)
-        )
+    with get_connection(write=True) as conn:
+        _q(conn, "acompanantes.quitar", (registro_id, huesped_id))
 
 
 def get_acompanantes(registro_id: int) -> list[dict]:
     with get_connection() as conn:
-        rows = conn.execute("""
-            SELECT h.* FROM Acompanantes a
-            JOIN Huespedes h ON a.huesped_id = h.id
-            WHERE a.registro_id=?
-        """, (registro_id,)).fetchall()
+        rows = _q(conn, "acompanantes.por_registro", (registro_id,)).fetchall()
         return [dict(r) for r in rows]
 
 
 # ─── TRANSACCIONES ────────────────────────────────────────────────────────────
 
+@_escritura
 def create_transaccion(data: dict):
-    with get_connection() as conn:
-        conn.execute("""
-            INSERT INTO Transacciones
-                (registro_id, monto_usd, tasa_cambio, monto_bs, metodo_pago,
-                 tipo, fecha_hora, usuario_id, referencia, descripcion)
-            VALUES (:registro_id,:monto_usd,:tasa_cambio,:monto_bs,:metodo_pago,
-                    :tipo,:fecha_hora,:usuario_id,:referencia,:descripcion)
-        """, data)
+    with get_connection(write=True) as conn:
+        _q(conn, "transacciones.insertar", data)
+        _after_commit(lambda: _refresh_shift_totals({data.get("usuario_id")}))
+
+
+@_escritura
+def create_transacciones(rows: list[dict]):
+    """Inserta varias transacciones con un solo executemany y un solo commit."""
+    if not rows:
+        return
+    with get_connection(write=True) as conn:
+        registry.executemany(conn, "transacciones.insertar", rows)
+        usuarios = {r.get("usuario_id") for r in rows}
+        _after_commit(lambda: _refresh_shift_totals(usuarios))
+
+
+@_escritura
+def registrar_pagos_y_checkout(registro_id: int, habitacion_id: int,
+                               huesped_id: int, saldo_nuevo: float,
+                               pagos: list[dict]):
+    """Registra todas las líneas de pago y cierra la estancia en una transacción."""
+    with transaccion():
+        create_transacciones(pagos)
+        checkout_registro(registro_id, habitacion_id, huesped_id, saldo_nuevo)
 
 
 def get_transacciones_registro(registro_id: int) -> list[dict]:
     with get_connection() as conn:
-        rows = conn.execute(
-            "SELECT * FROM Transacciones WHERE registro_id=? ORDER BY fecha_hora",
-            (registro_id,)
-        ).fetchall()
+        rows = _q(conn, "transacciones.por_registro", (registro_id,)).fetchall()
         return [dict(r) for r in rows]
 
 
 def get_total_pagado_usd(registro_id: int) -> float:
     with get_connection() as conn:
-        row = conn.execute(
-            "SELECT COALESCE(SUM(monto_usd),0) as t FROM Transacciones WHERE registro_id=? AND tipo='Pago'",
-            (registro_id,)
-        ).fetchone()
+        row = _q(conn, "transacciones.total_pagado", (registro_id,)).fetchone()
         return row["t"]
 
 
+def iter_transacciones(desde: str, hasta: str, size: int = EXPORT_FETCH_SIZE):
+    """
+    Genera las transacciones entre dos fechas AAAA-MM-DD (inclusive), con
+    habitación, huésped y usuario, ordenadas por fecha. Lee de a `size` filas
+    con una conexión propia fuera del pool, así la memoria no depende del
+    rango y una exportación larga no retiene una conexión de la interfaz.
+    """
+    hasta_excl = (datetime.strptime(hasta, "%Y-%m-%d") + timedelta(days=1)).strftime("%Y-%m-%d")
+    backend    = get_backend()
+    conn       = backend.connect()
+    try:
+        for row in backend.stream(conn, registry.sql("exportar.transacciones"),
+                                  {"desde": desde, "hasta": hasta_excl}, size):
+            yield dict(row)
+    finally:
+        conn.close()
+
+
 # ─── CIERRE DE TURNO ──────────────────────────────────────────────────────────
 
 def get_transacciones_turno(usuario_id: int, desde: str) -> list[dict]:
     with get_connection() as conn:
-        rows = conn.execute(
-            "SELECT * FROM Transacciones WHERE usuario_id=? AND fecha_hora >= ? ORDER BY fecha_hora",
-            (usuario_id, desde)
-        ).fetchall()
+        rows = _q(conn, "transacciones.por_turno", (usuario_id, desde)).fetchall()
         return [dict(r) for r in rows]
 
 
+def get_resumen_turno(usuario_id: int, desde: str) -> dict:
+    """
+    Totales del turno por método de pago con un solo GROUP BY sobre el índice
+    (usuario_id, fecha_hora). Retorna {"total_usd", "total_bs", "metodos"}.
+    """
+    totales = ShiftTotals(usuario_id, desde)
+    with get_connection() as conn:
+        totales.apply(_q(conn, "turnos.totales", (usuario_id, desde)).fetchall())
+    return totales.as_dict()
+
+
+@dataclass
+class ShiftTotals:
+    """
+    Totales acumulados de un turno abierto. Se pone al día con el registro
+    de Cambios: solo se suman los pagos que aparecen después del último seq
+    revisado, así el costo de consultarlo no crece con el turno. Los ids ya
+    contados evitan sumar dos veces un pago visto por dos caminos.
+    """
+    usuario_id: int
+    desde:      str
+    total_usd:  float = 0.0
+    total_bs:   float = 0.0
+    cantidad:   int   = 0
+    metodos:    dict  = field(default_factory=dict)   # metodo -> total USD
+    seq:        int | None = None                     # None: sin cargar
+    contados:   set   = field(default_factory=set)    # ids de pagos ya sumados
+
+    def apply(self, grupos):
+        """Suma filas agrupadas por método (consulta "turnos.totales")."""
+        for g in grupos:
+            self.total_usd += g["total_usd"]
+            self.total_bs  += g["total_bs"]
+            self.cantidad  += g["cantidad"]
+            self.metodos[g["metodo_pago"]] = self.metodos.get(g["metodo_pago"], 0.0) + g["total_usd"]
+
+    def agregar(self, pagos):
+        """Suma pagos sueltos ("turnos.pagos"), salvo los que ya contó."""
+        for p in pagos:
+            if p["id"] in self.contados:
+                continue
+            self.contados.add(p["id"])
+            self.apply([{"metodo_pago": p["metodo_pago"], "total_usd": p["monto_usd"],
+                         "total_bs": p["monto_bs"], "cantidad": 1}])
+
+    def copia(self) -> "ShiftTotals":
+        return ShiftTotals(**{**self.__dict__, "metodos": dict(self.metodos),
+                              "contados": set(self.contados)})
+
+    def as_dict(self) -> dict:
+        return {"total_usd": self.total_usd, "total_bs": self.total_bs,
+                "cantidad": self.cantidad, "metodos": dict(self.metodos)}
+
+
+_shift_totals: dict[tuple, ShiftTotals] = {}   # (clave del motor, usuario_id, desde) -> totales
+_shift_totals_lock = threading.Lock()
+
+
+def _leer_pagos_turno(usuario_id: int, desde: str, seq: int | None) -> tuple[list, int, bool]:
+    """
+    Pagos del turno posteriores a `seq` en el registro de Cambios, o todos si
+    aún no se cargó o el registro se depuró. Retorna (pagos, seq, completo).
+    """
+    with get_connection() as conn:
+        if seq is not None:
+            header = _delta_header(conn, seq)
+            if not header["reload"]:
+                pagos = _q(conn, "turnos.pagos_cambiados",
+                           (usuario_id, desde, seq, header["seq"])).fetchall()
+                return [dict(p) for p in pagos], header["seq"], False
+        # El seq se lee antes: lo que entre entre ambas lecturas se ve dos veces
+        # (y se descarta por id), nunca ninguna
+        ultimo = _q(conn, "cambios.ultimo_seq").fetchone()[0]
+        pagos  = _q(conn, "turnos.pagos", (usuario_id, desde)).fetchall()
+        return [dict(p) for p in pagos], ultimo, True
+
+
+def _poner_al_dia(clave: tuple) -> ShiftTotals | None:
+    """
+    Suma los pagos nuevos del turno `clave`. Las consultas corren fuera de
+    _shift_totals_lock (sobre una copia); el bloqueo solo cubre la mezcla.
+    """
+    with _shift_totals_lock:
+        totales = _shift_totals.get(clave)
+        if totales is None:
+            return None
+        seq = totales.seq
+    pagos, nuevo_seq, completo = _leer_pagos_turno(clave[1], clave[2], seq)
+    with _shift_totals_lock:
+        totales = _shift_totals.get(clave)
+        if totales is None:             # el turno se cerró mientras tanto
+            return None
+        if completo:
+            totales = _shift_totals[clave] = ShiftTotals(clave[1], clave[2], seq=nuevo_seq)
+        else:
+            totales.seq = max(totales.seq or 0, nuevo_seq)
+        totales.agregar(pagos)
+        return totales.copia()
+
+
+def get_shift_totals(usuario_id: int, desde: str) -> ShiftTotals:
+    """
+    Totales del turno abierto de un usuario. La primera consulta suma todos
+    sus pagos; las siguientes solo los nuevos del registro de Cambios
+    (también los registrados desde otras terminales).
+    """
+    clave = (get_backend().key, usuario_id, desde)
+    with _shift_totals_lock:
+        if clave not in _shift_totals:
+            # Un turno nuevo reemplaza a los anteriores del mismo usuario
+            for k in [k for k in _shift_totals if k[:2] == clave[:2]]:
+                del _shift_totals[k]
+            _shift_totals[clave] = ShiftTotals(usuario_id, desde)
+    return _poner_al_dia(clave) or ShiftTotals(usuario_id, desde)
+
+
+def _refresh_shift_totals(usuarios: set):
+    """Tras registrar pagos, pone al día los turnos abiertos de esos usuarios."""
+    motor = get_backend().key
+    with _shift_totals_lock:
+        pendientes = [k for k in _shift_totals if k[0] == motor and k[1] in usuarios]
+    for clave in pendientes:
+        _poner_al_dia(clave)
+
+
+@_escritura
 def registrar_cierre_turno(usuario_id: int, fecha_apertura: str,
                             total_usd: float, total_bs: float, resumen: dict):
     fecha_cierre = datetime.now().isoformat()
-    with get_connection() as conn:
-        conn.execute("""
-            INSERT INTO CierresTurno (usuario_id, fecha_apertura, fecha_cierre, total_usd, total_bs, resumen)
-            VALUES (?,?,?,?,?,?)
-        """, (usuario_id, fecha_apertura, fecha_cierre, total_usd, total_bs,
-               json.dumps(resumen, ensure_ascii=False)))
-        conn.execute("UPDATE Configuracion SET turno_inicio=? WHERE id=1", (fecha_cierre,))
+    with get_connection(write=True) as conn:
+        _q(conn, "cierres.insertar", (usuario_id, fecha_apertura, fecha_cierre, total_usd, total_bs,
+                                      json.dumps(resumen, ensure_ascii=False)))
+        _q(conn, "config.fijar_turno", (fecha_cierre,))
+    _config_cache().invalidate()
+    with _shift_totals_lock:
+        for k in [k for k in _shift_totals if k[:2] == (get_backend().key, usuario_id)]:
+            del _shift_totals[k]
 
 
 def get_historial_cierres() -> list[dict]:
     with get_connection() as conn:
-        rows = conn.execute("""
-            SELECT c.*, u.nombre AS usuario_nombre
-            FROM CierresTurno c
-            JOIN Usuarios u ON c.usuario_id = u.id
-            ORDER BY c.fecha_cierre DESC LIMIT 30
-        """).fetchall()
+        rows = _q(conn, "cierres.historial").fetchall()
         return [dict(r) for r in rows]
 
 
+# ─── RESERVAS ─────────────────────────────────────────────────────────────────
+# Fechas AAAA-MM-DD; fecha_salida es el día en que se libera la habitación.
+# El chequeo de solapamiento se hace dentro de la transacción de escritura;
+# reservas.py responde las consultas de disponibilidad desde memoria.
+
+ESTADOS_RESERVA = ("Confirmada", "Cancelada", "Cumplida")
+_RESERVA_LOCK   = 0x525356     # clase del bloqueo por habitación (lock_key)
+
+
+def _fecha_reserva(valor: str, campo: str) -> str:
+    try:
+        return datetime.strptime((valor or "").strip()[:10], "%Y-%m-%d").strftime("%Y-%m-%d")
+    except ValueError:
+        raise ValueError(f"{campo} inválida: {valor!r} (use AAAA-MM-DD)") from None
+
+
+def _check_solapamiento(conn, habitacion_id: int, entrada: str, salida: str,
+                        excluir_id: int = 0):
+    choque = _q(conn, "reservas.solapada", (habitacion_id, salida, entrada, excluir_id)).fetchone()
+    if choque:
+        raise ValueError(f"La habitación #{habitacion_id} ya está reservada del "
+                         f"{choque['fecha_entrada']} al {choque['fecha_salida']}.")
+
+
+def _check_estancia_activa(conn, habitacion_id: int, entrada: str):
+    """Como ReservationIndex.libre(): la estancia activa ocupa al menos hasta mañana."""
+    activo = _q(conn, "registros.activo", (habitacion_id,)).fetchone()
+    if activo is None:
+        return
+    manana = (datetime.now() + timedelta(days=1)).strftime("%Y-%m-%d")
+    libre_desde = max((activo["fecha_salida_prevista"] or "")[:10], manana)
+    if libre_desde > entrada:
+        raise ValueError(f"La habitación #{habitacion_id} está ocupada hasta el {libre_desde}.")
+
+
+def _cumplir_reserva(conn, habitacion_id: int, huesped_id: int, fecha_entrada: str):
+    """
+    Marca Cumplida la reserva confirmada de la habitación que cubre el día
+    del check-in (llegada puntual o tardía), salvo que sea de otro huésped.
+    """
+    reserva = _q(conn, "reservas.del_checkin",
+                 (habitacion_id, fecha_entrada[:10], fecha_entrada[:10], huesped_id)).fetchone()
+    if reserva:
+        _q(conn, "reservas.cumplir", (huesped_id, reserva["id"]))
+        _avisar_cambio("Reservas", reserva["id"])
+
+
+@_escritura
+def create_reserva(data: dict) -> int:
+    """
+    Reserva una habitación. data: habitacion_id, nombre_contacto, fecha_entrada,
+    fecha_salida y opcionalmente huesped_id, telefono, notas, usuario_id.
+    Lanza ValueError si las fechas no son válidas o si se solapa con otra
+    reserva confirmada o con la estancia activa de la misma habitación.
+    """
+    habitacion_id = int(data["habitacion_id"])
+    entrada = _fecha_reserva(data.get("fecha_entrada"), "fecha_entrada")
+    salida  = _fecha_reserva(data.get("fecha_salida"), "fecha_salida")
+    if salida <= entrada:
+        raise ValueError("La fecha de salida debe ser posterior a la de entrada.")
+    if not (data.get("nombre_contacto") or "").strip():
+        raise ValueError("Indique el nombre de contacto de la reserva.")
+    with get_connection(write=True) as conn:
+        get_backend().lock_key(conn, _RESERVA_LOCK, habitacion_id)
+        if _q(conn, "habitaciones.por_numero", (habitacion_id,)).fetchone() is None:
+            raise ValueError(f"No existe la habitación #{habitacion_id}.")
+        _check_solapamiento(conn, habitacion_id, entrada, salida)
+        _check_estancia_activa(conn, habitacion_id, entrada)
+        reserva_id = _insert_id(conn, "reservas.crear", (
+            habitacion_id, data.get("huesped_id"), data["nombre_contacto"].strip(),
+            data.get("telefono", ""), entrada, salida, data.get("notas", ""),
+            data.get("usuario_id"), datetime.now().isoformat(timespec="seconds"),
+        ))
+        _avisar_cambio("Reservas", reserva_id)
+        return reserva_id
+
+
+@_escritura
+def set_estado_reserva(reserva_id: int, estado: str):
+    """Cancela, cumple o vuelve a confirmar una reserva (esto último, si sigue libre)."""
+    if estado not in ESTADOS_RESERVA:
+        raise ValueError(f"Estado de reserva inválido: {estado!r}")
+    with get_connection(write=True) as conn:
+        reserva = _q(conn, "reservas.por_id", (reserva_id,)).fetchone()
+        if reserva is None:
+            raise ValueError(f"No existe la reserva {reserva_id}.")
+        if estado == "Confirmada" and reserva["estado"] != "Confirmada":
+            get_backend().lock_key(conn, _RESERVA_LOCK, reserva["habitacion_id"])
+            _check_solapamiento(conn, reserva["habitacion_id"], reserva["fecha_entrada"],
+                                reserva["fecha_salida"], excluir_id=reserva_id)
+            _check_estancia_activa(conn, reserva["habitacion_id"], reserva["fecha_entrada"])
+        _q(conn, "reservas.fijar_estado", (estado, reserva_id))
+        _avisar_cambio("Reservas", reserva_id)
+
+
+def get_reserva(reserva_id: int) -> dict | None:
+    with get_connection() as conn:
+        row = _q(conn, "reservas.por_id", (reserva_id,)).fetchone()
+        return dict(row) if row else None
+
+
+def get_reservas_vigentes(desde: str) -> list[dict]:
+    """Reservas confirmadas que terminan después de `desde`, por habitación y entrada."""
+    with get_connection() as conn:
+        return [dict(r) for r in _q(conn, "reservas.vigentes", (desde,)).fetchall()]
+
+
+# ─── REGISTRO DE CAMBIOS ──────────────────────────────────────────────────────
+# Los triggers de la migración 3 anotan en Cambios cada fila modificada de
+# Habitaciones, Registros, Huespedes y Transacciones, y los de la migración 9
+# las de Reservas. Una terminal recuerda el último seq que vio y pide solo lo
+# posterior. Si su seq ya fue depurado, la respuesta trae reload=True y debe
+# recargar completo.
+
+def get_last_change_seq() -> int:
+    with get_connection() as conn:
+        return _q(conn, "cambios.ultimo_seq").fetchone()[0]
+
+
+def _delta_header(conn, seq: int) -> dict:
+    row = _q(conn, "cambios.limites").fetchone()
+    maximo = row["maximo"] or 0
+    reload = row["minimo"] is not None and seq < row["minimo"] - 1
+    return {"seq": max(maximo, seq), "reload": reload}
+
+
+def get_changes_since(seq: int, tablas: tuple[str, ...] | None = None,
+                      limit: int = 1000) -> dict:
+    """
+    Cambios con seq > seq, en orden.
+    Retorna {"seq": último seq cubierto, "reload": bool, "cambios": [...]}.
+    """
+    with get_connection() as conn:
+        header = _delta_header(conn, seq)
+        sql = "SELECT seq, tabla, fila_id, op FROM Cambios WHERE seq > ?"
+        params = [seq]
+        if tablas:
+            sql += f" AND tabla IN ({','.join('?' * len(tablas))})"
+            params += list(tablas)
+        rows = conn.execute(sql + " ORDER BY seq LIMIT ?", params + [limit]).fetchall()
+        cambios = [dict(r) for r in rows]
+        if len(cambios) == limit:
+            header["seq"] = cambios[-1]["seq"]
+        header["cambios"] = cambios
+        return header
+
+
+def get_habitaciones_changed_since(seq: int) -> dict:
+    """
+    Habitaciones cuya tarjeta pudo cambiar desde seq: cambios en la propia
+    habitación, en sus registros o en el huésped de su registro activo.
+    Retorna {"seq", "reload", "habitaciones": [filas como get_all_habitaciones]}.
+    """
+    with get_connection() as conn:
+        header = _delta_header(conn, seq)
+        rows = _q(conn, "cambios.habitaciones",
+                  {"seq": seq, "hasta": header["seq"]}).fetchall()
+    header["habitaciones"] = get_habitaciones([r["numero"] for r in rows])
+    return header
+
+
+def get_reservas_changed_since(seq: int) -> dict:
+    """
+    Reservas modificadas desde seq (estado None si la fila ya no existe) y
+    las demás tablas con cambios en el mismo tramo.
+    Retorna {"seq", "reload", "reservas": [...], "tablas": [...]}.
+    """
+    with get_connection() as conn:
+        header = _delta_header(conn, seq)
+        rango  = (seq, header["seq"])
+        header["reservas"] = [dict(r) for r in _q(conn, "cambios.reservas", rango).fetchall()]
+        header["tablas"]   = [r["tabla"] for r in _q(conn, "cambios.tablas", rango).fetchall()]
+        return header
+
+
+def get_transacciones_changed_since(registro_id: int, seq: int) -> dict:
+    """Transacciones del registro insertadas o modificadas desde seq."""
+    with get_connection() as conn:
+        header = _delta_header(conn, seq)
+        rows = _q(conn, "cambios.transacciones",
+                  (registro_id, seq, header["seq"])).fetchall()
+        header["transacciones"] = [dict(r) for r in rows]
+        return header
+
+
+# ─── TAREAS PERIÓDICAS ────────────────────────────────────────────────────────
+
+@_escritura
+def tomar_turno(tarea: str, intervalo: float) -> float:
+    """
+    Elige una sola terminal para una tarea periódica (p. ej. la copia de
+    seguridad). La hora del último turno concedido queda en Metadatos
+    ("turno_<tarea>") y se lee y escribe bajo el bloqueo de escritura, así
+    que de varias terminales que lo piden a la vez solo una lo obtiene.
+    Retorna 0 si esta terminal tiene el turno (debe ejecutar la tarea ya) o
+    los segundos que faltan para el siguiente.
+    """
+    clave = f"turno_{tarea}"
+    ahora = datetime.now()
+    with get_connection(write=True) as conn:
+        row = conn.execute("SELECT valor FROM Metadatos WHERE clave=?", (clave,)).fetchone()
+        if row:
+            transcurrido = (ahora - datetime.fromisoformat(row[0])).total_seconds()
+            if 0 <= transcurrido < intervalo:
+                return intervalo - transcurrido
+        conn.execute("""
+            INSERT INTO Metadatos (clave, valor) VALUES (?, ?)
+            ON CONFLICT (clave) DO UPDATE SET valor = excluded.valor
+        """, (clave, ahora.isoformat(timespec="seconds")))
+        return 0.0
+
+
+# ─── ARCHIVO HISTÓRICO ────────────────────────────────────────────────────────
+# Mismas columnas que en la base activa, sin FOREIGN KEY (no pueden apuntar a
+# otra base). Una migración que cambie Registros, Acompanantes o Transacciones
+# debe cambiar también estas tablas, o las vistas *Historico dejan de cuadrar.
+
+_ARCHIVO_SCHEMA = """
+    CREATE TABLE IF NOT EXISTS archivo.Registros (
+        id                    INTEGER PRIMARY KEY,
+        huesped_principal_id  INTEGER NOT NULL,
+        habitacion_id         INTEGER NOT NULL,
+        fecha_entrada         TEXT    NOT NULL,
+        fecha_salida_prevista TEXT    NOT NULL,
+        estado                TEXT,
+        notas                 TEXT
+    );
+
+    CREATE TABLE IF NOT EXISTS archivo.Acompanantes (
+        id          INTEGER PRIMARY KEY,
+        registro_id INTEGER NOT NULL,
+        huesped_id  INTEGER NOT NULL
+    );
+
+    CREATE TABLE IF NOT EXISTS archivo.Transacciones (
+        id          INTEGER PRIMARY KEY,
+        registro_id INTEGER,
+        monto_usd   REAL    NOT NULL,
+        tasa_cambio REAL    NOT NULL,
+        monto_bs    REAL    NOT NULL,
+        metodo_pago TEXT    NOT NULL,
+        tipo        TEXT    NOT NULL,
+        fecha_hora  TEXT    NOT NULL,
+        usuario_id  INTEGER,
+        referencia  TEXT,
+        descripcion TEXT
+    );
+
+    CREATE INDEX IF NOT EXISTS archivo.idx_arch_registros_entrada
+        ON Registros (fecha_entrada);
+    CREATE INDEX IF NOT EXISTS archivo.idx_arch_registros_huesped
+        ON Registros (huesped_principal_id);
+    CREATE INDEX IF NOT EXISTS archivo.idx_arch_acompanantes_registro
+        ON Acompanantes (registro_id);
+    CREATE INDEX IF NOT EXISTS archivo.idx_arch_transacciones_registro
+        ON Transacciones (registro_id, fecha_hora);
+    CREATE INDEX IF NOT EXISTS archivo.idx_arch_transacciones_fecha
+        ON Transacciones (fecha_hora);
+"""
+
+# Se ejecuta en cada conexión con el archivo adjunto (ver backends.py); las
+# vistas TEMP tienen prioridad sobre las de main con el mismo nombre.
+_VISTAS_HISTORICO = """
+    CREATE TEMP VIEW IF NOT EXISTS RegistrosHistorico AS
+        SELECT * FROM main.Registros UNION ALL SELECT * FROM archivo.Registros;
+    CREATE TEMP VIEW IF NOT EXISTS TransaccionesHistorico AS
+        SELECT * FROM main.Transacciones UNION ALL SELECT * FROM archivo.Transacciones;
+    CREATE TEMP VIEW IF NOT EXISTS AcompanantesHistorico AS
+        SELECT * FROM main.Acompanantes UNION ALL SELECT * FROM archivo.Acompanantes;
+"""
+
+# Mueve las estancias listadas en ArchivarIds y las transacciones sueltas
+# (sin registro) anteriores a :corte. INSERT OR IGNORE: en modo WAL el commit
+# no es atómico entre bases, así que un lote interrumpido se puede repetir.
+_ARCHIVAR_SQL = """
+    INSERT OR IGNORE INTO archivo.Registros
+        SELECT * FROM main.Registros WHERE id IN (SELECT id FROM ArchivarIds);
+    INSERT OR IGNORE INTO archivo.Acompanantes
+        SELECT * FROM main.Acompanantes WHERE registro_id IN (SELECT id FROM ArchivarIds);
+    INSERT OR IGNORE INTO archivo.Transacciones
+        SELECT * FROM main.Transacciones
+        WHERE registro_id IN (SELECT id FROM ArchivarIds)
+           OR id IN (SELECT id FROM ArchivarSueltas);
+
+    DELETE FROM main.Transacciones
+        WHERE registro_id IN (SELECT id FROM ArchivarIds)
+           OR id IN (SELECT id FROM ArchivarSueltas);
+    DELETE FROM main.Acompanantes WHERE registro_id IN (SELECT id FROM ArchivarIds);
+    DELETE FROM main.Registros    WHERE id IN (SELECT id FROM ArchivarIds);
+"""
+
+
+def _archivo_disponible() -> bool:
+    backend = get_backend()
+    return backend.name == "sqlite" and "archivo" in backend.attach
+
+
+def _ensure_archivo(conn):
+    for stmt in _split_sql(_ARCHIVO_SCHEMA):
+        conn.execute(stmt)
+
+
+@_escritura
+def _archivar_lote(corte: str, lote: int) -> dict:
+    with get_connection(write=True) as conn:
+        conn.execute("CREATE TEMP TABLE IF NOT EXISTS ArchivarIds (id INTEGER PRIMARY KEY)")
+        conn.execute("CREATE TEMP TABLE IF NOT EXISTS ArchivarSueltas (id INTEGER PRIMARY KEY)")
+        conn.execute("DELETE FROM ArchivarIds")
+        conn.execute("DELETE FROM ArchivarSueltas")
+        registros = conn.execute("""
+            INSERT INTO ArchivarIds (id)
+            SELECT id FROM main.Registros
+            WHERE estado = 'Cerrado' AND fecha_salida_prevista < ?
+            ORDER BY fecha_salida_prevista LIMIT ?
+        """, (corte, lote)).rowcount
+        sueltas = conn.execute("""
+            INSERT INTO ArchivarSueltas (id)
+            SELECT id FROM main.Transacciones
+            WHERE registro_id IS NULL AND fecha_hora < ?
+            LIMIT ?
+        """, (corte, lote)).rowcount
+        if not registros and not sueltas:
+            return {"registros": 0, "transacciones": 0}
+        antes = conn.execute("SELECT COUNT(*) FROM main.Transacciones").fetchone()[0]
+        for stmt in _split_sql(_ARCHIVAR_SQL):
+            conn.execute(stmt)
+        despues = conn.execute("SELECT COUNT(*) FROM main.Transacciones").fetchone()[0]
+        return {"registros": registros, "transacciones": antes - despues}
+
+
+def archivar_historial(dias: int | None = None, lote: int | None = None,
+                       progreso=None) -> dict:
+    """
+    Pasa al archivo histórico las estancias cerradas (con sus acompañantes y
+    transacciones) y las transacciones sueltas de hace más de `dias` días,
+    en transacciones de `lote` estancias para no bloquear a las terminales.
+    progreso(totales), si se indica, se llama tras cada lote.
+    Retorna {"registros", "transacciones"} movidos.
+    """
+    if not _archivo_disponible():
+        raise RuntimeError("El archivo histórico requiere SQLite con ARCHIVE_ENABLED = True.")
+    dias  = ARCHIVE_AFTER_DAYS if dias is None else dias
+    lote  = lote or ARCHIVE_BATCH
+    corte = (datetime.now() - timedelta(days=dias)).strftime("%Y-%m-%d")
+    totales = {"registros": 0, "transacciones": 0}
+    while True:
+        movidos = _archivar_lote(corte, lote)
+        if not movidos["registros"] and not movidos["transacciones"]:
+            return totales
+        for k in totales:
+            totales[k] += movidos[k]
+        if progreso:
+            progreso(dict(totales))
+
+
+def compactar():
+    """VACUUM de la base activa: devuelve al disco las páginas liberadas al archivar."""
+    conn = get_backend().connect()
+    try:
+        conn.execute("VACUUM")
+    finally:
+        conn.close()
+
+
 # ─── REPORTES ─────────────────────────────────────────────────────────────────
 
 def get_resumen_dia(fecha: str) -> dict:
     """Resumen de operaciones de un día específico."""
     with get_connection() as conn:
-        pagos = conn.execute("""
-            SELECT metodo_pago, SUM(monto_usd) as total_usd, SUM(monto_bs) as total_bs,
-                   COUNT(*) as cantidad
-            FROM Transacciones
-            WHERE tipo='Pago' AND DATE(fecha_hora)=?
-            GROUP BY metodo_pago
-        """, (fecha,)).fetchall()
+        pagos     = _q(conn, "reportes.dia_pagos", (fecha,)).fetchall()
+        estancias = _q(conn, "reportes.dia_estancias", (fecha,)).fetchone()
+
+        return {
+            "pagos":    [dict(p) for p in pagos],
+            "checkins":  estancias["checkins"] if estancias else 0,
+            "checkouts": estancias["checkouts"] if estancias else 0,
+        }
 
-        checkins = conn.execute(
-            "SELECT COUNT(*) as c FROM Registros WHERE DATE(fecha_entrada)=?", (fecha,)
-        ).fetchone()["c"]
 
-        checkouts = conn.execute(
-            "SELECT COUNT(*) as c FROM Registros WHERE DATE(fecha_salida_prevista)=? AND estado='Cerrado'",
-            (fecha,)
-        ).fetchone()["c"]
+def get_resumen_rango(desde: str, hasta: str) -> dict:
+    """
+    Resumen acumulado entre dos fechas (inclusive), p. ej. un mes completo.
+    Lee solo el resumen diario: el costo no depende del historial guardado.
+    """
+    with get_connection() as conn:
+        pagos     = _q(conn, "reportes.rango_pagos", (desde, hasta)).fetchall()
+        estancias = _q(conn, "reportes.rango_estancias", (desde, hasta)).fetchone()
+        dias      = _q(conn, "reportes.rango_dias", (desde, hasta)).fetchall()
 
         return {
-            "pagos":    [dict(p) for p in pagos],
-            "checkins":  checkins,
-            "checkouts": checkouts,
+            "pagos":     [dict(p) for p in pagos],
+            "checkins":  estancias["checkins"],
+            "checkouts": estancias["checkouts"],
+            "dias":      [dict(d) for d in dias],
         }
+
+
+def get_resumen_mes(anio: int, mes: int) -> dict:
+    return get_resumen_rango(f"{anio:04d}-{mes:02d}-01", f"{anio:04d}-{mes:02d}-31")
+
+
+@_escritura
+def rebuild_resumen_diario(desde: str | None = None, hasta: str | None = None):
+    """
+    Recalcula el resumen diario desde Transacciones y Registros, completo o
+    solo para [desde, hasta]. Para backfills o tras correcciones manuales.
+    """
+    desde = desde or "0001-01-01"
+    hasta = hasta or "9999-12-31"
+    with get_connection(write=True) as conn:
+        conn.execute("DELETE FROM ResumenDiarioPagos WHERE fecha BETWEEN ? AND ?",
+                     (desde, hasta))
+        conn.execute("DELETE FROM ResumenDiarioEstancias WHERE fecha BETWEEN ? AND ?",
+                     (desde, hasta))
+        script = _REBUILD_RESUMEN_SQL.format(
+            transacciones="TransaccionesHistorico", registros="RegistrosHistorico",
+            filtro_pagos="AND DATE(fecha_hora) BETWEEN :desde AND :hasta",
+            filtro_entrada="AND DATE(fecha_entrada) BETWEEN :desde AND :hasta",
+            filtro_salida="AND DATE(fecha_salida_prevista) BETWEEN :desde AND :hasta",
+        )
+        for stmt in _split_sql(script):
+            conn.execute(stmt, {"desde": desde, "hasta": hasta})
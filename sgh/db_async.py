@@ -0,0 +1,121 @@
+"""
+db_async.py - Fachada asíncrona del DAL para los manejadores de Flet
+Sistema de Gestión Hotelera (SGH)
+
+Las funciones de database.py bloquean (consultas, espera de bloqueos). Desde
+un manejador async se llaman así:
+
+    habitaciones = await db_async.get_all_habitaciones()
+
+Cada función pública de database.py está disponible con el mismo nombre y
+los mismos argumentos; el trabajo corre en un ejecutor de hilos propio, de
+modo que el hilo de la interfaz nunca espera a SQLite.
+
+ViewTasks agrupa las tareas de una vista para cancelarlas al navegar. Cancelar
+deja de esperar el resultado (la interfaz ya no se toca), pero una escritura
+que ya empezó termina en su hilo: la transacción se confirma o se deshace
+completa, nunca a medias.
+"""
+import asyncio
+import functools
+import inspect
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import database as db
+
+DAL_WORKERS = 4   # hilos del ejecutor (≤ POOL_MAX_SIZE del pool de conexiones)
+
+_executor      = None
+_executor_lock = threading.Lock()
+
+
+def get_executor() -> ThreadPoolExecutor:
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=DAL_WORKERS,
+                                           thread_name_prefix="dal")
+        return _executor
+
+
+def shutdown(wait: bool = True):
+    global _executor
+    with _executor_lock:
+        if _executor is not None:
+            _executor.shutdown(wait=wait, cancel_futures=True)
+            _executor = None
+
+
+async def run(fn, *args, **kwargs):
+    """Ejecuta fn(*args, **kwargs) en el ejecutor del DAL y espera su resultado."""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(get_executor(),
+                                      functools.partial(fn, *args, **kwargs))
+
+
+def _wrap(fn):
+    @functools.wraps(fn)
+    async def wrapper(*args, **kwargs):
+        return await run(fn, *args, **kwargs)
+    return wrapper
+
+
+def __getattr__(name: str):
+    # db_async.<función> → versión awaitable de database.<función>
+    fn = getattr(db, name, None) if not name.startswith("_") else None
+    if not inspect.isfunction(fn):
+        raise AttributeError(f"module 'db_async' has no attribute '{name}'")
+    wrapper = globals()[name] = _wrap(fn)
+    return wrapper
+
+
+# ─── TAREAS POR VISTA ─────────────────────────────────────────────────────────
+
+class ViewTasks:
+    """
+    Tareas async de una vista. track() envuelve un manejador async para que
+    quede registrado mientras corre; start() lanza una tarea de fondo (p. ej.
+    un sondeo). cancel_all() se llama al salir de la vista.
+    """
+
+    def __init__(self):
+        self._tasks  = set()
+        self._lock   = threading.Lock()
+        self.closed  = False
+
+    def track(self, handler):
+        @functools.wraps(handler)
+        async def wrapper(*args, **kwargs):
+            task = asyncio.current_task()
+            with self._lock:
+                if self.closed:
+                    return None
+                # Un manejador puede esperar a otro ya registrado (misma tarea)
+                propia = task not in self._tasks
+                self._tasks.add(task)
+            try:
+                return await handler(*args, **kwargs)
+            finally:
+                if propia:
+                    with self._lock:
+                        self._tasks.discard(task)
+        return wrapper
+
+    def start(self, page, handler, *args):
+        """Lanza handler(*args) en el bucle de eventos de Flet."""
+        return page.run_task(self.track(handler), *args)
+
+    def cancel_all(self):
+        # La tarea que provoca la navegación (p. ej. tras un check-in) no se
+        # cancela a sí misma: termina sola al volver del manejador.
+        try:
+            actual = asyncio.current_task()
+        except RuntimeError:
+            actual = None
+        with self._lock:
+            self.closed = True
+            tareas, self._tasks = self._tasks, set()
+        for task in tareas:
+            if task is not actual and not task.done():
+                task.get_loop().call_soon_threadsafe(task.cancel)
@@ -0,0 +1,66 @@
+"""
+exportacion.py - Exportación de transacciones para contabilidad
+Sistema de Gestión Hotelera (SGH)
+
+Recorre database.iter_transacciones() y escribe cada fila apenas llega, en
+CSV o JSON Lines (un objeto JSON por línea). La memoria usada es la misma
+para un día que para un año de movimientos. Tasa y monto en Bs salen tal como
+se registraron; solo las filas sin tasa (datos viejos) toman la vigente en su
+fecha según el historial de tasas.
+
+    python manage.py exportar-transacciones --mes 2024-05 --salida mayo.csv
+"""
+import csv
+import json
+
+import database as db
+
+COLUMNAS = ("id", "fecha_hora", "tipo", "metodo_pago", "monto_usd", "tasa_cambio",
+            "monto_bs", "referencia", "descripcion", "registro_id", "habitacion",
+            "huesped_documento", "huesped_nombre", "usuario")
+
+FORMATOS = ("csv", "jsonl")
+
+
+def escribir_csv(filas, f) -> int:
+    w = csv.DictWriter(f, fieldnames=COLUMNAS, extrasaction="ignore")
+    w.writeheader()
+    n = 0
+    for fila in filas:
+        w.writerow(fila)
+        n += 1
+    return n
+
+
+def escribir_jsonl(filas, f) -> int:
+    n = 0
+    for fila in filas:
+        f.write(json.dumps(fila, ensure_ascii=False))
+        f.write("\n")
+        n += 1
+    return n
+
+
+def _con_tasa(filas):
+    """
+    Completa tasa_cambio y monto_bs de las filas que no traen tasa registrada,
+    con el historial cargado una sola vez para toda la exportación.
+    """
+    tasas = db.get_rate_history()
+    for fila in filas:
+        if not (fila["tasa_cambio"] or 0) > 0:
+            fila["tasa_cambio"] = tasas.rate_at(fila["fecha_hora"]) or db.get_tasa()
+            if not fila["monto_bs"]:
+                fila["monto_bs"] = round((fila["monto_usd"] or 0) * fila["tasa_cambio"], 2)
+        yield fila
+
+
+def exportar_transacciones(desde: str, hasta: str, f, formato: str = "csv") -> int:
+    """
+    Escribe en el archivo abierto f las transacciones de [desde, hasta]
+    (AAAA-MM-DD, inclusive). Retorna la cantidad de filas escritas.
+    """
+    if formato not in FORMATOS:
+        raise ValueError(f"Formato no soportado: {formato!r} (use {', '.join(FORMATOS)})")
+    escribir = escribir_csv if formato == "csv" else escribir_jsonl
+    return escribir(_con_tasa(db.iter_transacciones(desde, hasta)), f)
@@ -0,0 +1,127 @@
+"""
+importacion.py - Importación masiva de huéspedes desde CSV
+Sistema de Gestión Hotelera (SGH)
+
+El archivo se lee fila a fila con un generador (no se carga completo en
+memoria), cada fila se valida y normaliza, y las válidas se insertan o
+actualizan por documento en bloques de IMPORT_CHUNK_SIZE filas: un
+executemany y un commit por bloque, en lugar de una transacción por huésped.
+
+Columnas reconocidas (sin importar mayúsculas; el separador , ; o tab se
+detecta solo): documento (o cedula), nombres (o nombre), telefono,
+fecha_nacimiento (AAAA-MM-DD o DD/MM/AAAA), nacionalidad, profesion, vehiculo.
+
+    python manage.py importar-huespedes huespedes.csv
+"""
+import csv
+import re
+from datetime import datetime
+from itertools import islice
+
+import database as db
+
+IMPORT_CHUNK_SIZE = 1000    # filas por transacción
+
+CAMPOS = ("documento", "nombres", "telefono", "fecha_nacimiento",
+          "nacionalidad", "profesion", "vehiculo")
+
+_ALIAS = {
+    "cedula": "documento", "cédula": "documento", "ci": "documento",
+    "nombre": "nombres", "nombre_completo": "nombres",
+    "teléfono": "telefono", "celular": "telefono",
+    "nacimiento": "fecha_nacimiento", "profesión": "profesion",
+}
+
+_DOCUMENTO_RE = re.compile(r"^[A-Z0-9]{4,20}$")
+
+
+class FilaInvalida(ValueError):
+    pass
+
+
+def es_documento(doc: str) -> bool:
+    """True si `doc`, ya normalizado, tiene la forma de un documento válido."""
+    return bool(_DOCUMENTO_RE.match(doc))
+
+
+def _columna(nombre: str) -> str:
+    clave = nombre.strip().lower().replace(" ", "_")
+    return _ALIAS.get(clave, clave)
+
+
+def _fecha(valor: str) -> str:
+    if not valor:
+        return ""
+    for formato in ("%Y-%m-%d", "%d/%m/%Y", "%d-%m-%Y"):
+        try:
+            return datetime.strptime(valor, formato).strftime("%Y-%m-%d")
+        except ValueError:
+            pass
+    raise FilaInvalida(f"fecha_nacimiento inválida: {valor!r}")
+
+
+def normalizar_fila(fila: dict) -> dict:
+    """Fila del CSV → dict con los campos de Huespedes. Lanza FilaInvalida."""
+    datos = {c: (fila.get(c) or "").strip() for c in CAMPOS}
+    datos["documento"] = db.normalizar_documento(datos["documento"])
+    if not datos["documento"]:
+        raise FilaInvalida("documento vacío")
+    if not es_documento(datos["documento"]):
+        raise FilaInvalida(f"documento inválido: {datos['documento']!r}")
+    if not datos["nombres"]:
+        raise FilaInvalida("nombres vacío")
+    datos["nombres"]          = " ".join(datos["nombres"].split())
+    datos["fecha_nacimiento"] = _fecha(datos["fecha_nacimiento"])
+    return datos
+
+
+def leer_huespedes_csv(path: str):
+    """
+    Genera (linea, datos, error) por cada fila del archivo: datos es el dict
+    normalizado o None, y error el motivo del rechazo o None.
+    """
+    with open(path, newline="", encoding="utf-8-sig") as f:
+        muestra = f.read(4096)
+        f.seek(0)
+        try:
+            dialecto = csv.Sniffer().sniff(muestra, delimiters=",;\t")
+        except csv.Error:
+            dialecto = csv.excel
+        lector = csv.DictReader(f, dialect=dialecto)
+        lector.fieldnames = [_columna(c) for c in lector.fieldnames or []]
+        if "documento" not in lector.fieldnames or "nombres" not in lector.fieldnames:
+            raise ValueError("El CSV debe tener las columnas documento y nombres.")
+        for fila in lector:
+            try:
+                yield lector.line_num, normalizar_fila(fila), None
+            except FilaInvalida as ex:
+                yield lector.line_num, None, str(ex)
+
+
+def _bloques(iterable, tamano: int):
+    it = iter(iterable)
+    while bloque := list(islice(it, tamano)):
+        yield bloque
+
+
+def importar_huespedes_csv(path: str, chunk_size: int = IMPORT_CHUNK_SIZE,
+                           progreso=None) -> dict:
+    """
+    Importa el CSV en bloques de chunk_size filas. progreso(leidas, importadas),
+    si se indica, se llama tras cada bloque confirmado.
+    Retorna {"leidas", "importadas", "rechazadas": [(linea, motivo), ...]}.
+    Si un bloque falla, los anteriores ya quedan confirmados.
+    """
+    leidas, importadas, rechazadas = 0, 0, []
+    for bloque in _bloques(leer_huespedes_csv(path), chunk_size):
+        validas = []
+        for linea, datos, error in bloque:
+            if error:
+                rechazadas.append((linea, error))
+            else:
+                validas.append(datos)
+        importadas += db.upsert_huespedes(validas)
+        leidas     += len(bloque)
+        if progreso:
+            progreso(leidas, importadas)
+    return {"leidas": leidas, "importadas": importadas, "rechazadas": rechazadas}
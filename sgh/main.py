@@ -6,6 +6,20 @@ main.py - Punto de entrada del Sistema de Gestión Hotelera (SGH)
   Estructura  :
       main.py          ← Este archivo (routing + app init)
       database.py      ← DAL: modelos y CRUD
+      config_cache.py  ← Caché de configuración / tasa
+      tasas.py         ← Historial de la tasa Bs/$ (búsqueda por fecha)
+      db_async.py      ← Fachada async del DAL (ejecutor propio)
+      backends.py      ← Motores SQLite / PostgreSQL
+      schema_pg.py     ← Migraciones para PostgreSQL
+      queries.py       ← Sentencias SQL con nombre
+      importacion.py   ← Importación de huéspedes (CSV)
+      exportacion.py   ← Exportación de transacciones
+      backup.py        ← Copias de seguridad automáticas
+      analytics.py     ← Ocupación, ADR y RevPAR (numpy)
+      reportes.py      ← Reportes PDF (proceso aparte, con caché)
+      reservas.py      ← Disponibilidad y llegadas (índice en memoria)
+      notificaciones.py← Avisos de salidas y llegadas (heap + hilo)
+      manage.py        ← Comandos de mantenimiento (CLI)
       views/
           login.py     ← Pantalla de inicio de sesión
           dashboard.py ← Grid de 39 habitaciones
@@ -18,7 +32,9 @@ main.py - Punto de entrada del Sistema de Gestión Hotelera (SGH)
 =========================================================================
 """
 import flet as ft
+import backup
 import database as db
+import notificaciones
 from datetime import datetime
 
 from views.login    import LoginView
@@ -48,6 +64,30 @@ def main(page: ft.Page):
 
     # ── Inicializar DB ────────────────────────────────────────────────────────
     db.init_db()
+    backup.start_scheduler()
+    notificaciones.start_scheduler()
+
+    # ── Avisos de salidas / llegadas (llegan desde el hilo de notificaciones) ──
+    def on_notificacion(aviso: notificaciones.Notificacion):
+        if not page.session.get("current_user"):
+            return
+        page.snack_bar = ft.SnackBar(
+            ft.Row(
+                controls=[
+                    ft.Icon(ft.icons.LOGOUT if aviso.tipo == "salida" else ft.icons.LOGIN,
+                            color="#fbbf24", size=18),
+                    ft.Text(f"{aviso.titulo} — {aviso.mensaje}", color="#f1f5f9"),
+                ],
+                spacing=8,
+            ),
+            bgcolor="#1e293b",
+            duration=10000,
+        )
+        page.snack_bar.open = True
+        page.update()
+
+    def on_disconnect(e):
+        notificaciones.unsubscribe(page.session.get("avisos_token"))
 
     # ── Navegación helper ─────────────────────────────────────────────────────
     def navigate(route: str, **kwargs):
@@ -58,6 +98,8 @@ def main(page: ft.Page):
     # ── Callback login exitoso ─────────────────────────────────────────────────
     def on_login_success(user: dict):
         page.session.set("current_user", user)
+        if page.session.get("avisos_token") is None:
+            page.session.set("avisos_token", notificaciones.subscribe(on_notificacion))
 
         # Iniciar/recuperar turno
         cfg         = db.get_config()
@@ -80,6 +122,12 @@ def main(page: ft.Page):
                 page.go("/login")
                 return
 
+        # Cancelar las tareas async pendientes de la vista que se abandona
+        tareas = page.session.get("view_tasks")
+        if tareas:
+            tareas.cancel_all()
+            page.session.set("view_tasks", None)
+
         page.views.clear()
 
         if route in ("/", "/login"):
@@ -122,6 +170,7 @@ def main(page: ft.Page):
 
     page.on_route_change = route_change
     page.on_view_pop     = view_pop
+    page.on_disconnect   = on_disconnect
 
     # Arrancar en login
     page.go("/login")
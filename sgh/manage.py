@@ -0,0 +1,289 @@
+"""
+manage.py - Comandos de mantenimiento del SGH (sin interfaz gráfica)
+=========================================================================
+  Uso:
+      python manage.py reconstruir-resumen [--desde AAAA-MM-DD] [--hasta AAAA-MM-DD]
+      python manage.py verificar-saldos [--completo]
+      python manage.py importar-huespedes ARCHIVO.csv [--bloque N] [--rechazos ARCHIVO]
+      python manage.py fusionar-documentos [--aplicar [--sin-backup]]
+      python manage.py exportar-transacciones (--mes AAAA-MM | --desde … --hasta …)
+                                              [--formato csv|jsonl] [--salida ARCHIVO]
+      python manage.py backup [--sin-comprimir]
+      python manage.py verificar-backup [ARCHIVO]
+      python manage.py archivar [--dias N] [--lote N] [--compactar]
+      python manage.py ocupacion (--mes AAAA-MM | --desde … --hasta …)
+      python manage.py reporte ingresos|ocupacion (--mes AAAA-MM | --desde … --hasta …)
+                               [--salida ARCHIVO.pdf]
+=========================================================================
+"""
+import argparse
+import calendar
+import csv
+import shutil
+import sys
+import time
+import analytics
+import backup
+import database as db
+import exportacion
+import importacion
+import reportes
+
+
+def cmd_reconstruir_resumen(args):
+    db.rebuild_resumen_diario(args.desde, args.hasta)
+    rango = f"{args.desde or 'inicio'} → {args.hasta or 'hoy'}"
+    print(f"✓ Resumen diario reconstruido ({rango}).")
+
+
+def cmd_verificar_saldos(args):
+    diferencias = db.verificar_saldos(completo=args.completo)
+    if not diferencias:
+        print("✓ Saldos consistentes con el libro de movimientos.")
+        return
+    for d in diferencias:
+        print(f"✗ Huésped {d['huesped_id']}: saldo ${d['saldo_acumulado']:.2f}"
+              f" | libro ${d['saldo_libro']:.2f}")
+    raise SystemExit(1)
+
+
+def cmd_importar_huespedes(args):
+    inicio = time.perf_counter()
+
+    def progreso(leidas, importadas):
+        print(f"\r  {leidas} filas leídas, {importadas} importadas…", end="", flush=True)
+
+    try:
+        res = importacion.importar_huespedes_csv(args.archivo, args.bloque, progreso)
+    except (ValueError, OSError) as ex:
+        raise SystemExit(f"No se pudo importar {args.archivo}: {ex}")
+    print(f"\r✓ {res['importadas']} huéspedes importados de {res['leidas']} filas"
+          f" en {time.perf_counter() - inicio:.1f} s.")
+    rechazadas = res["rechazadas"]
+    if not rechazadas:
+        return
+    print(f"✗ {len(rechazadas)} filas rechazadas.")
+    if args.rechazos:
+        with open(args.rechazos, "w", newline="", encoding="utf-8") as f:
+            w = csv.writer(f)
+            w.writerow(["linea", "motivo"])
+            w.writerows(rechazadas)
+        print(f"  Detalle en {args.rechazos}.")
+    else:
+        for linea, motivo in rechazadas[:20]:
+            print(f"  línea {linea}: {motivo}")
+        if len(rechazadas) > 20:
+            print(f"  … y {len(rechazadas) - 20} más (use --rechazos ARCHIVO).")
+
+
+def _mostrar_fusiones(plan: list[dict]):
+    for grupo in plan:
+        c = grupo["conservar"]
+        if not grupo["duplicados"]:
+            print(f"  #{c['id']} {c['documento']!r} → {grupo['documento']}")
+        for dup in grupo["duplicados"]:
+            print(f"  #{dup['id']} {dup['documento']!r} ({dup['nombres']}) se fusiona con"
+                  f" #{c['id']} {c['documento']!r} ({c['nombres']}) → {grupo['documento']}")
+
+
+def cmd_fusionar_documentos(args):
+    plan = db.plan_fusion_documentos()
+    if not plan:
+        print("✓ Todos los documentos están en forma canónica; no hay nada que fusionar.")
+        return
+    if not args.aplicar:
+        print(f"{len(plan)} documentos por normalizar o fusionar:")
+        _mostrar_fusiones(plan)
+        print("Revise la lista y repita con --aplicar (se hace una copia de seguridad antes).")
+        return
+    if not args.sin_backup:
+        try:
+            res = backup.crear_backup()
+        except RuntimeError as ex:
+            raise SystemExit(f"No se pudo crear la copia previa: {ex}"
+                             " (use --sin-backup si ya tiene una).")
+        print(f"✓ Copia previa: {res['archivo']}")
+    plan = db.fusionar_documentos()
+    _mostrar_fusiones(plan)
+    fusionados = sum(len(g["duplicados"]) for g in plan)
+    print(f"✓ {len(plan)} documentos normalizados, {fusionados} huéspedes fusionados.")
+
+
+def _rango(args) -> tuple[str, str]:
+    if args.mes:
+        anio, mes = (int(x) for x in args.mes.split("-"))
+        return (f"{anio:04d}-{mes:02d}-01",
+                f"{anio:04d}-{mes:02d}-{calendar.monthrange(anio, mes)[1]:02d}")
+    if args.desde and args.hasta:
+        return args.desde, args.hasta
+    raise SystemExit("Indique --mes AAAA-MM o bien --desde y --hasta.")
+
+
+def cmd_exportar_transacciones(args):
+    desde, hasta = _rango(args)
+    if not args.salida:
+        exportacion.exportar_transacciones(desde, hasta, sys.stdout, args.formato)
+        return
+    inicio = time.perf_counter()
+    with open(args.salida, "w", newline="", encoding="utf-8") as f:
+        n = exportacion.exportar_transacciones(desde, hasta, f, args.formato)
+    print(f"✓ {n} transacciones ({desde} → {hasta}) exportadas a {args.salida}"
+          f" en {time.perf_counter() - inicio:.1f} s.")
+
+
+def cmd_backup(args):
+    res = backup.crear_backup(comprimir=not args.sin_comprimir)
+    print(f"✓ Copia creada: {res['archivo']} ({res['bytes'] / 1024:.0f} KB,"
+          f" {res['segundos']} s, {res['detalle']}).")
+
+
+def cmd_verificar_backup(args):
+    path = args.archivo
+    if not path:
+        copias = backup.list_backups()
+        if not copias:
+            raise SystemExit(f"No hay copias en {backup.backup_dir()}.")
+        path = copias[0]
+    fallas = 0
+    for archivo in filter(None, (path, backup.archivo_de(path))):
+        ok, detalle = backup.verificar_backup(archivo)
+        print(f"{'✓' if ok else '✗'} {archivo}: {detalle}")
+        fallas += not ok
+    if fallas:
+        raise SystemExit(1)
+
+
+def cmd_archivar(args):
+    def progreso(totales):
+        print(f"\r  {totales['registros']} estancias, {totales['transacciones']} transacciones…",
+              end="", flush=True)
+
+    inicio  = time.perf_counter()
+    totales = db.archivar_historial(args.dias, args.lote, progreso)
+    print(f"\r✓ {totales['registros']} estancias y {totales['transacciones']} transacciones"
+          f" pasadas a {db.archive_path()} en {time.perf_counter() - inicio:.1f} s.")
+    if args.compactar:
+        db.compactar()
+        print("✓ Base activa compactada (VACUUM).")
+
+
+def cmd_ocupacion(args):
+    desde, hasta = _rango(args)
+    try:
+        rep = analytics.get_ocupacion(desde, hasta)
+    except RuntimeError as ex:
+        raise SystemExit(str(ex))
+    print(f"Ocupación {desde} → {hasta} ({len(rep['dias'])} días)")
+    print(f"  {'Tipo':<14}{'Hab.':>6}{'Noches':>9}{'Ocup. %':>10}{'ADR $':>10}{'RevPAR $':>10}"
+          f"{'Ingresos Bs.':>16}")
+    filas = list(rep["tipos"].items()) + [("Total", rep["total"])]
+    for tipo, serie in filas:
+        r = serie["resumen"]
+        print(f"  {tipo:<14}{serie['habitaciones']:>6}{r['noches_vendidas']:>9}"
+              f"{r['ocupacion']:>10.1f}{r['adr']:>10.2f}{r['revpar']:>10.2f}"
+              f"{r['ingresos_bs']:>16,.2f}")
+    if rep["omitidas"]:
+        print(f"  ({rep['omitidas']} estancias con fechas ilegibles no se contaron)")
+
+
+def cmd_reporte(args):
+    desde, hasta = _rango(args)
+    inicio = time.perf_counter()
+    try:
+        path = reportes.generar_reporte(args.tipo, desde, hasta, en_proceso=False)
+    except RuntimeError as ex:
+        raise SystemExit(str(ex))
+    if args.salida:
+        shutil.copyfile(path, args.salida)
+        path = args.salida
+    print(f"✓ Reporte {args.tipo} ({desde} → {hasta}) en {path}"
+          f" ({time.perf_counter() - inicio:.2f} s).")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="manage.py",
+                                     description="Comandos de mantenimiento del SGH")
+    parser.add_argument("--db", default=db.DB_NAME,
+                        help=f"Archivo de base de datos (por defecto {db.DB_NAME})")
+    sub = parser.add_subparsers(dest="comando", required=True)
+
+    p = sub.add_parser("reconstruir-resumen",
+                       help="Recalcula el resumen diario de pagos y estancias")
+    p.add_argument("--desde", help="Fecha inicial AAAA-MM-DD (inclusive)")
+    p.add_argument("--hasta", help="Fecha final AAAA-MM-DD (inclusive)")
+    p.set_defaults(func=cmd_reconstruir_resumen)
+
+    p = sub.add_parser("verificar-saldos",
+                       help="Compara los saldos de huéspedes con el libro de movimientos")
+    p.add_argument("--completo", action="store_true",
+                   help="Revisa todos los huéspedes, no solo los modificados")
+    p.set_defaults(func=cmd_verificar_saldos)
+
+    p = sub.add_parser("importar-huespedes",
+                       help="Importa o actualiza huéspedes desde un CSV")
+    p.add_argument("archivo", help="CSV con columnas documento, nombres, …")
+    p.add_argument("--bloque", type=int, default=importacion.IMPORT_CHUNK_SIZE,
+                   help=f"Filas por transacción (por defecto {importacion.IMPORT_CHUNK_SIZE})")
+    p.add_argument("--rechazos", help="Guarda las filas rechazadas (línea, motivo) en un CSV")
+    p.set_defaults(func=cmd_importar_huespedes)
+
+    p = sub.add_parser("fusionar-documentos",
+                       help="Normaliza los documentos y fusiona los huéspedes duplicados")
+    p.add_argument("--aplicar", action="store_true",
+                   help="Aplica la fusión (sin esta opción solo muestra lo que haría)")
+    p.add_argument("--sin-backup", action="store_true",
+                   help="No crea la copia de seguridad previa (p. ej. en PostgreSQL)")
+    p.set_defaults(func=cmd_fusionar_documentos)
+
+    p = sub.add_parser("exportar-transacciones",
+                       help="Exporta las transacciones de un período (CSV o JSON Lines)")
+    p.add_argument("--mes", help="Mes completo AAAA-MM")
+    p.add_argument("--desde", help="Fecha inicial AAAA-MM-DD (inclusive)")
+    p.add_argument("--hasta", help="Fecha final AAAA-MM-DD (inclusive)")
+    p.add_argument("--formato", choices=exportacion.FORMATOS, default="csv")
+    p.add_argument("--salida", help="Archivo de salida (por defecto, la salida estándar)")
+    p.set_defaults(func=cmd_exportar_transacciones)
+
+    p = sub.add_parser("backup", help="Copia en caliente de la base, verificada y rotada")
+    p.add_argument("--sin-comprimir", action="store_true",
+                   help="Guarda la copia como .db en lugar de .db.z")
+    p.set_defaults(func=cmd_backup)
+
+    p = sub.add_parser("verificar-backup",
+                       help="Comprueba que una copia se puede restaurar (integrity_check)")
+    p.add_argument("archivo", nargs="?", help="Copia a verificar (por defecto, la más reciente)")
+    p.set_defaults(func=cmd_verificar_backup)
+
+    p = sub.add_parser("archivar",
+                       help="Mueve estancias cerradas antiguas al archivo histórico")
+    p.add_argument("--dias", type=int, default=db.ARCHIVE_AFTER_DAYS,
+                   help=f"Antigüedad mínima en días (por defecto {db.ARCHIVE_AFTER_DAYS})")
+    p.add_argument("--lote", type=int, default=db.ARCHIVE_BATCH,
+                   help=f"Estancias por transacción (por defecto {db.ARCHIVE_BATCH})")
+    p.add_argument("--compactar", action="store_true",
+                   help="Ejecuta VACUUM al terminar para reducir el archivo de la base")
+    p.set_defaults(func=cmd_archivar)
+
+    p = sub.add_parser("ocupacion",
+                       help="Ocupación %%, ADR y RevPAR por tipo de habitación (requiere numpy)")
+    p.add_argument("--mes", help="Mes completo AAAA-MM")
+    p.add_argument("--desde", help="Fecha inicial AAAA-MM-DD (inclusive)")
+    p.add_argument("--hasta", help="Fecha final AAAA-MM-DD (inclusive)")
+    p.set_defaults(func=cmd_ocupacion)
+
+    p = sub.add_parser("reporte", help="Genera un reporte PDF (queda guardado en reportes/)")
+    p.add_argument("tipo", choices=list(reportes.REPORT_TYPES))
+    p.add_argument("--mes", help="Mes completo AAAA-MM")
+    p.add_argument("--desde", help="Fecha inicial AAAA-MM-DD (inclusive)")
+    p.add_argument("--hasta", help="Fecha final AAAA-MM-DD (inclusive)")
+    p.add_argument("--salida", help="Copia el PDF a este archivo")
+    p.set_defaults(func=cmd_reporte)
+
+    args = parser.parse_args(argv)
+    db.DB_NAME = args.db
+    db.init_db()
+    args.func(args)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,251 @@
+"""
+notificaciones.py - Avisos de salidas y llegadas programados con un heap
+Sistema de Gestión Hotelera (SGH)
+
+NotificationScheduler es un hilo de fondo con un min-heap de avisos
+pendientes ordenado por hora: salidas previstas de las estancias activas y
+llegadas de las reservas confirmadas. El hilo duerme exactamente hasta el
+próximo aviso (o hasta que llega un evento), lo entrega a las sesiones
+suscritas y vuelve a dormir; no recorre las tablas periódicamente.
+
+El heap se alimenta de:
+  • los eventos del DAL (database.add_change_listener): check-in, check-out,
+    reservas creadas, canceladas o cumplidas en este proceso; el hilo relee
+    solo esa fila;
+  • cada NOTIFY_SYNC_SECONDS, los cambios de Registros y Reservas del registro
+    de Cambios posteriores al último visto (lo escrito por otras terminales).
+
+Un aviso reprogramado o cancelado no se busca en el heap: la entrada vieja
+queda y se descarta al salir si ya no coincide con la vigente. El heap se
+vuelve a llenar desde la base al cambiar el día; ahí se olvidan también los
+avisos entregados de días anteriores. Los entregados viven en memoria: en la
+primera carga se dan por entregados los avisos cuya hora es anterior al
+arranque del proceso, así reiniciar la aplicación no los repite.
+
+main.py arranca el hilo y suscribe cada sesión de Flet al iniciar sesión.
+"""
+import heapq
+import itertools
+import threading
+import time
+from dataclasses import dataclass
+from datetime import date, datetime, timedelta
+
+import database as db
+
+NOTIFY_ENABLED       = True
+NOTIFY_CHECKOUT_HOUR = 12    # hora de salida (las fechas de salida no traen hora)
+NOTIFY_CHECKIN_HOUR  = 14    # hora de llegada de las reservas
+NOTIFY_LEAD_MINUTES  = 60    # anticipación del aviso
+NOTIFY_SYNC_SECONDS  = 60    # revisión del registro de Cambios (otras terminales)
+
+
+@dataclass
+class Notificacion:
+    tipo:       str     # "salida" | "llegada"
+    titulo:     str
+    mensaje:    str
+    habitacion: int
+    cuando:     str     # fecha y hora del evento avisado (ISO)
+
+
+def _hora_aviso(fecha: str, hora: int) -> tuple[datetime, float]:
+    evento = datetime.combine(date.fromisoformat(fecha[:10]), datetime.min.time()).replace(hour=hora)
+    return evento, (evento - timedelta(minutes=NOTIFY_LEAD_MINUTES)).timestamp()
+
+
+class NotificationScheduler(threading.Thread):
+    """Hilo que entrega cada aviso a su hora a las sesiones suscritas."""
+
+    def __init__(self):
+        super().__init__(name="sgh-avisos", daemon=True)
+        self.seq          = None
+        self._inicio      = time.time()   # avisos anteriores: los entregó otro proceso
+        self._dia         = None    # día de la última carga completa
+        self._heap        = []      # [(timestamp, n, clave)]
+        self._vigentes    = {}      # clave -> (timestamp, Notificacion)
+        self._entregados  = set()   # (clave, timestamp) ya avisados
+        self._orden       = itertools.count()
+        self._eventos     = set()   # (tabla, fila_id) por releer
+        self._cond        = threading.Condition()
+        self._detener     = False
+        self._suscriptores = {}     # token -> callback(Notificacion)
+        self._tokens      = itertools.count(1)
+
+    # ── Suscripciones y eventos (cualquier hilo) ──────────────────────────────
+    def subscribe(self, callback) -> int:
+        with self._cond:
+            token = next(self._tokens)
+            self._suscriptores[token] = callback
+            return token
+
+    def unsubscribe(self, token: int):
+        with self._cond:
+            self._suscriptores.pop(token, None)
+
+    def notify_change(self, tabla: str, fila_id: int):
+        """Listener del DAL: solo anota la fila; se relee en el hilo del scheduler."""
+        with self._cond:
+            self._eventos.add((tabla, fila_id))
+            self._cond.notify()
+
+    def stop(self, timeout: float | None = None):
+        with self._cond:
+            self._detener = True
+            self._cond.notify()
+        self.join(timeout)
+
+    # ── Heap (solo el hilo del scheduler) ─────────────────────────────────────
+    def _programar(self, clave: tuple, fecha: str, hora: int, aviso: dict):
+        evento, cuando = _hora_aviso(fecha, hora)
+        if evento.date() < date.today():
+            self._vigentes.pop(clave, None)     # ya pasó: la tarjeta lo marca vencido
+            return
+        self._vigentes[clave] = (cuando, Notificacion(cuando=evento.isoformat(), **aviso))
+        heapq.heappush(self._heap, (cuando, next(self._orden), clave))
+
+    def _programar_salida(self, r: dict):
+        self._programar(("salida", r["registro_id"]), r["fecha_salida_prevista"],
+                        NOTIFY_CHECKOUT_HOUR, {
+                            "tipo": "salida", "habitacion": r["habitacion_id"],
+                            "titulo": f"Salida: habitación #{r['habitacion_id']}",
+                            "mensaje": f"{r['huesped_nombre']} sale hoy a las "
+                                       f"{NOTIFY_CHECKOUT_HOUR:02d}:00.",
+                        })
+
+    def _programar_llegada(self, r: dict):
+        self._programar(("llegada", r["id"]), r["fecha_entrada"], NOTIFY_CHECKIN_HOUR, {
+            "tipo": "llegada", "habitacion": r["habitacion_id"],
+            "titulo": f"Llegada: habitación #{r['habitacion_id']}",
+            "mensaje": f"{r['nombre_contacto']} llega hoy (reserva hasta el "
+                       f"{r['fecha_salida']}).",
+        })
+
+    def _releer(self, tabla: str, fila_id: int):
+        if tabla == "Registros":
+            r = db.get_registro_by_id(fila_id)
+            if r and r["estado"] == "Activo":
+                self._programar_salida({**r, "registro_id": r["id"]})
+            else:
+                self._vigentes.pop(("salida", fila_id), None)
+        elif tabla == "Reservas":
+            r = db.get_reserva(fila_id)
+            if r and r["estado"] == "Confirmada":
+                self._programar_llegada(r)
+            else:
+                self._vigentes.pop(("llegada", fila_id), None)
+
+    def _cargar(self):
+        """Carga completa: estancias activas y reservas confirmadas desde hoy."""
+        primera = self.seq is None
+        seq = db.get_last_change_seq()
+        self._heap, self._vigentes = [], {}
+        self._dia = date.today()
+        # _programar descarta los eventos de días anteriores: sus avisos ya no vuelven
+        _, limite = _hora_aviso(self._dia.isoformat(), 0)
+        self._entregados = {e for e in self._entregados if e[1] >= limite}
+        for h in db.get_all_habitaciones():
+            if h["registro_id"]:
+                self._programar_salida({**h, "habitacion_id": h["numero"]})
+        for r in db.get_reservas_vigentes(date.today().isoformat()):
+            self._programar_llegada(r)
+        if primera:
+            self._entregados |= {(clave, cuando) for clave, (cuando, _) in self._vigentes.items()
+                                 if cuando < self._inicio}
+        self.seq = seq
+
+    def _sincronizar(self):
+        """Relee las estancias y reservas cambiadas desde self.seq (otras terminales)."""
+        while True:
+            delta = db.get_changes_since(self.seq, ("Registros", "Reservas"))
+            if delta["reload"]:
+                self._cargar()
+                return
+            for c in delta["cambios"]:
+                self._releer(c["tabla"], c["fila_id"])
+            self.seq = delta["seq"]
+            if len(delta["cambios"]) < 1000:
+                return
+
+    def _entregar_vencidos(self):
+        ahora = time.time()
+        while self._heap and self._heap[0][0] <= ahora:
+            cuando, _, clave = heapq.heappop(self._heap)
+            vigente = self._vigentes.get(clave)
+            if vigente is None or vigente[0] != cuando:
+                continue    # reprogramado o cancelado
+            del self._vigentes[clave]
+            if (clave, cuando) in self._entregados:
+                continue    # ya avisado (la fila se releyó después)
+            self._entregados.add((clave, cuando))
+            with self._cond:
+                suscriptores = list(self._suscriptores.values())
+            for callback in suscriptores:
+                try:
+                    callback(vigente[1])
+                except Exception:
+                    pass    # una sesión cerrada no impide avisar a las demás
+
+    def run(self):
+        proxima_sync = time.monotonic()     # la primera vuelta carga todo
+        while True:
+            with self._cond:
+                while not self._detener and not self._eventos:
+                    hasta_aviso = self._heap[0][0] - time.time() if self._heap else NOTIFY_SYNC_SECONDS
+                    espera = min(hasta_aviso, proxima_sync - time.monotonic())
+                    if espera <= 0:
+                        break
+                    self._cond.wait(espera)
+                if self._detener:
+                    return
+                eventos, self._eventos = self._eventos, set()
+            try:
+                if self.seq is None or self._dia != date.today():
+                    self._cargar()
+                for tabla, fila_id in eventos:
+                    self._releer(tabla, fila_id)
+                if time.monotonic() >= proxima_sync:
+                    self._sincronizar()
+                    proxima_sync = time.monotonic() + NOTIFY_SYNC_SECONDS
+            except Exception:
+                # Base ocupada o no disponible: se reintenta en la próxima revisión
+                proxima_sync = time.monotonic() + NOTIFY_SYNC_SECONDS
+            self._entregar_vencidos()
+
+
+_scheduler      = None
+_scheduler_lock = threading.Lock()
+
+
+def start_scheduler() -> NotificationScheduler | None:
+    """Arranca el hilo de avisos (una vez por proceso)."""
+    global _scheduler
+    if not NOTIFY_ENABLED:
+        return None
+    with _scheduler_lock:
+        if _scheduler is None or not _scheduler.is_alive():
+            _scheduler = NotificationScheduler()
+            db.add_change_listener(_scheduler.notify_change)
+            _scheduler.start()
+        return _scheduler
+
+
+def stop_scheduler():
+    global _scheduler
+    with _scheduler_lock:
+        if _scheduler is not None:
+            db.remove_change_listener(_scheduler.notify_change)
+            _scheduler.stop(timeout=5)
+            _scheduler = None
+
+
+def subscribe(callback) -> int | None:
+    """Suscribe callback(Notificacion); se llama desde el hilo de avisos."""
+    with _scheduler_lock:
+        return _scheduler.subscribe(callback) if _scheduler else None
+
+
+def unsubscribe(token: int | None):
+    with _scheduler_lock:
+        if _scheduler is not None and token is not None:
+            _scheduler.unsubscribe(token)
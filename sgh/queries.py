@@ -0,0 +1,431 @@
+"""
+queries.py - Registro central de sentencias SQL del DAL
+Sistema de Gestión Hotelera (SGH)
+
+Cada sentencia frecuente del DAL tiene un nombre ("grupo.accion") y un texto
+fijo con parámetros. Al no armarse el SQL en cada llamada, el texto es
+siempre idéntico y la caché de sentencias de cada conexión (cached_statements
+en SQLite, sentencias preparadas en PostgreSQL) lo reutiliza sin volver a
+analizarlo. Es también el único lugar donde ajustar una consulta.
+
+El registro cuenta llamadas y tiempo de ejecución por nombre
+(database.get_query_stats()) para ubicar las consultas calientes.
+"""
+import threading
+import time
+
+# Columnas que update_config / update_habitacion aceptan (ver database.py)
+UPDATABLE_COLUMNS = {
+    "Configuracion": ("nombre_hotel", "tasa_dolar_bs", "usuario_activo", "turno_inicio"),
+    "Habitaciones":  ("tipo", "descripcion", "precio_usd", "estado"),
+}
+
+HABITACIONES_BASE = """
+    SELECT h.*,
+           r.id              AS registro_id,
+           r.fecha_entrada,
+           r.fecha_salida_prevista,
+           g.nombres         AS huesped_nombre,
+           g.documento       AS huesped_doc,
+           g.saldo_acumulado AS huesped_saldo
+    FROM Habitaciones h
+    LEFT JOIN Registros r ON h.numero = r.habitacion_id AND r.estado = 'Activo'
+    LEFT JOIN Huespedes g ON r.huesped_principal_id = g.id
+"""
+
+STATEMENTS = {
+    # ── Configuración ────────────────────────────────────────────────────────
+    "config.obtener": "SELECT * FROM Configuracion WHERE id=1",
+    "config.actualizar": """
+        UPDATE Configuracion SET nombre_hotel=:nombre_hotel, tasa_dolar_bs=:tasa_dolar_bs,
+            usuario_activo=:usuario_activo, turno_inicio=:turno_inicio
+        WHERE id=1
+    """,
+    "config.fijar_turno": "UPDATE Configuracion SET turno_inicio=? WHERE id=1",
+    "tasas.agregar":
+        "INSERT INTO TasasCambio (tasa, vigente_desde, usuario) VALUES (?,?,?)",
+    "tasas.historial": """
+        SELECT tasa, vigente_desde FROM TasasCambio
+        ORDER BY vigente_desde, id
+    """,
+
+    # ── Usuarios ─────────────────────────────────────────────────────────────
+    "usuarios.login":
+        "SELECT * FROM Usuarios WHERE username=? AND password=? AND activo=1",
+    "usuarios.todos": "SELECT * FROM Usuarios",
+    "usuarios.crear": """
+        INSERT INTO Usuarios (username, password, nombre, rol)
+        VALUES (:username,:password,:nombre,:rol)
+    """,
+    "usuarios.alternar_activo":
+        "UPDATE Usuarios SET activo = CASE WHEN activo=1 THEN 0 ELSE 1 END WHERE id=?",
+
+    # ── Huéspedes y saldos ───────────────────────────────────────────────────
+    "huespedes.por_documento": "SELECT * FROM Huespedes WHERE documento=?",
+    "huespedes.por_id":        "SELECT * FROM Huespedes WHERE id=?",
+    "huespedes.rango_documento": """
+        SELECT * FROM Huespedes WHERE documento >= ? AND documento < ?
+        ORDER BY documento LIMIT ?
+    """,
+    "huespedes.buscar_fts": """
+        SELECT h.* FROM HuespedesFTS f
+        JOIN Huespedes h ON h.id = f.rowid
+        WHERE HuespedesFTS MATCH ?
+        ORDER BY bm25(HuespedesFTS, 2.0, 1.0)
+        LIMIT ?
+    """,
+    "huespedes.crear": """
+        INSERT INTO Huespedes (documento, nombres, telefono, fecha_nacimiento,
+                               nacionalidad, profesion, vehiculo, saldo_acumulado)
+        VALUES (:documento,:nombres,:telefono,:fecha_nacimiento,
+                :nacionalidad,:profesion,:vehiculo, 0)
+    """,
+    "huespedes.upsert": """
+        INSERT INTO Huespedes (documento, nombres, telefono, fecha_nacimiento,
+                               nacionalidad, profesion, vehiculo, saldo_acumulado)
+        VALUES (:documento,:nombres,:telefono,:fecha_nacimiento,
+                :nacionalidad,:profesion,:vehiculo, 0)
+        ON CONFLICT (documento) DO UPDATE SET
+            nombres          = excluded.nombres,
+            telefono         = COALESCE(NULLIF(excluded.telefono, ''), Huespedes.telefono),
+            fecha_nacimiento = COALESCE(NULLIF(excluded.fecha_nacimiento, ''), Huespedes.fecha_nacimiento),
+            nacionalidad     = COALESCE(NULLIF(excluded.nacionalidad, ''), Huespedes.nacionalidad),
+            profesion        = COALESCE(NULLIF(excluded.profesion, ''), Huespedes.profesion),
+            vehiculo         = COALESCE(NULLIF(excluded.vehiculo, ''), Huespedes.vehiculo)
+    """,
+    "huespedes.actualizar": """
+        UPDATE Huespedes SET nombres=:nombres, telefono=:telefono,
+            fecha_nacimiento=:fecha_nacimiento, nacionalidad=:nacionalidad,
+            profesion=:profesion, vehiculo=:vehiculo
+        WHERE id=:id
+    """,
+    "huespedes.saldo":        "SELECT saldo_acumulado FROM Huespedes WHERE id=?",
+    "huespedes.fijar_saldo":  "UPDATE Huespedes SET saldo_acumulado=? WHERE id=?",
+    "huespedes.con_saldo": """
+        SELECT id, documento, nombres, saldo_acumulado FROM Huespedes
+        WHERE saldo_acumulado <> 0 ORDER BY saldo_acumulado
+    """,
+    "saldos.insertar_movimiento": """
+        INSERT INTO MovimientosSaldo (huesped_id, registro_id, transaccion_id, monto,
+                                      saldo_resultante, concepto, fecha_hora)
+        VALUES (?,?,?,?,?,?,?)
+    """,
+    "saldos.movimientos": """
+        SELECT * FROM MovimientosSaldo WHERE huesped_id=?
+        ORDER BY id DESC LIMIT ?
+    """,
+
+    # ── Habitaciones ─────────────────────────────────────────────────────────
+    "habitaciones.todas":      HABITACIONES_BASE + " ORDER BY h.numero",
+    "habitaciones.por_numero": "SELECT * FROM Habitaciones WHERE numero=?",
+    "habitaciones.actualizar": """
+        UPDATE Habitaciones SET tipo=:tipo, descripcion=:descripcion,
+            precio_usd=:precio_usd, estado=:estado
+        WHERE numero=:numero
+    """,
+    "habitaciones.fijar_estado": "UPDATE Habitaciones SET estado=? WHERE numero=?",
+
+    # ── Registros y acompañantes ─────────────────────────────────────────────
+    "registros.crear": """
+        INSERT INTO Registros (huesped_principal_id, habitacion_id, fecha_entrada,
+                               fecha_salida_prevista, estado, notas)
+        VALUES (?,?,?,?,'Activo',?)
+    """,
+    "registros.activo": """
+        SELECT r.*,
+               g.nombres         AS huesped_nombre,
+               g.documento       AS huesped_doc,
+               g.saldo_acumulado AS huesped_saldo,
+               g.id              AS guest_id
+        FROM Registros r
+        JOIN Huespedes g ON r.huesped_principal_id = g.id
+        WHERE r.habitacion_id=? AND r.estado='Activo'
+    """,
+    "registros.por_id": """
+        SELECT r.*,
+               g.nombres         AS huesped_nombre,
+               g.documento       AS huesped_doc,
+               g.saldo_acumulado AS huesped_saldo,
+               g.id              AS guest_id,
+               hab.precio_usd,
+               hab.tipo          AS hab_tipo
+        FROM Registros r
+        JOIN Huespedes   g   ON r.huesped_principal_id = g.id
+        JOIN Habitaciones hab ON r.habitacion_id = hab.numero
+        WHERE r.id=?
+    """,
+    "registros.cerrar":
+        "UPDATE Registros SET estado='Cerrado', fecha_salida_prevista=? WHERE id=?",
+    "acompanantes.agregar":
+        "INSERT INTO Acompanantes (registro_id, huesped_id) VALUES (?,?)",
+    "acompanantes.quitar":
+        "DELETE FROM Acompanantes WHERE registro_id=? AND huesped_id=?",
+    "acompanantes.por_registro": """
+        SELECT h.* FROM Acompanantes a
+        JOIN Huespedes h ON a.huesped_id = h.id
+        WHERE a.registro_id=?
+    """,
+
+    # ── Reservas ─────────────────────────────────────────────────────────────
+    "reservas.crear": """
+        INSERT INTO Reservas (habitacion_id, huesped_id, nombre_contacto, telefono,
+                              fecha_entrada, fecha_salida, estado, notas, usuario_id,
+                              fecha_creacion)
+        VALUES (?,?,?,?,?,?,'Confirmada',?,?,?)
+    """,
+    "reservas.solapada": """
+        SELECT id, fecha_entrada, fecha_salida FROM Reservas
+        WHERE habitacion_id = ? AND estado = 'Confirmada'
+          AND fecha_entrada < ? AND fecha_salida > ? AND id <> ?
+        ORDER BY fecha_entrada LIMIT 1
+    """,
+    "reservas.por_id": """
+        SELECT r.*, h.tipo AS hab_tipo
+        FROM Reservas r
+        JOIN Habitaciones h ON h.numero = r.habitacion_id
+        WHERE r.id = ?
+    """,
+    "reservas.fijar_estado": "UPDATE Reservas SET estado=? WHERE id=?",
+    "reservas.del_checkin": """
+        SELECT id FROM Reservas
+        WHERE habitacion_id = ? AND estado = 'Confirmada'
+          AND fecha_entrada <= ? AND fecha_salida > ?
+          AND (huesped_id IS NULL OR huesped_id = ?)
+        ORDER BY fecha_entrada LIMIT 1
+    """,
+    "reservas.cumplir": """
+        UPDATE Reservas SET estado = 'Cumplida', huesped_id = COALESCE(huesped_id, ?)
+        WHERE id = ?
+    """,
+    "reservas.vigentes": """
+        SELECT id, habitacion_id, nombre_contacto, fecha_entrada, fecha_salida, estado
+        FROM Reservas
+        WHERE estado = 'Confirmada' AND fecha_salida > ?
+        ORDER BY habitacion_id, fecha_entrada
+    """,
+
+    # ── Transacciones y turnos ───────────────────────────────────────────────
+    "transacciones.insertar": """
+        INSERT INTO Transacciones
+            (registro_id, monto_usd, tasa_cambio, monto_bs, metodo_pago,
+             tipo, fecha_hora, usuario_id, referencia, descripcion)
+        VALUES (:registro_id,:monto_usd,:tasa_cambio,:monto_bs,:metodo_pago,
+                :tipo,:fecha_hora,:usuario_id,:referencia,:descripcion)
+    """,
+    "transacciones.por_registro":
+        "SELECT * FROM Transacciones WHERE registro_id=? ORDER BY fecha_hora",
+    "transacciones.ultima_de_registro":
+        "SELECT MAX(id) FROM Transacciones WHERE registro_id=?",
+    "transacciones.total_pagado": """
+        SELECT COALESCE(SUM(monto_usd),0) as t FROM Transacciones
+        WHERE registro_id=? AND tipo='Pago'
+    """,
+    "transacciones.por_turno": """
+        SELECT * FROM Transacciones WHERE usuario_id=? AND fecha_hora >= ?
+        ORDER BY fecha_hora
+    """,
+    "turnos.totales": """
+        SELECT metodo_pago, SUM(monto_usd) AS total_usd, SUM(monto_bs) AS total_bs,
+               COUNT(*) AS cantidad
+        FROM Transacciones
+        WHERE usuario_id = ? AND fecha_hora >= ? AND tipo = 'Pago'
+        GROUP BY metodo_pago
+    """,
+    "turnos.pagos": """
+        SELECT id, metodo_pago, monto_usd, monto_bs
+        FROM Transacciones
+        WHERE usuario_id = ? AND fecha_hora >= ? AND tipo = 'Pago'
+    """,
+    # Pagos del turno registrados en un tramo del registro de cambios
+    "turnos.pagos_cambiados": """
+        SELECT id, metodo_pago, monto_usd, monto_bs
+        FROM Transacciones
+        WHERE usuario_id = ? AND fecha_hora >= ? AND tipo = 'Pago' AND id IN (
+            SELECT fila_id FROM Cambios
+            WHERE seq > ? AND seq <= ? AND tabla = 'Transacciones'
+        )
+    """,
+    "cierres.insertar": """
+        INSERT INTO CierresTurno (usuario_id, fecha_apertura, fecha_cierre, total_usd, total_bs, resumen)
+        VALUES (?,?,?,?,?,?)
+    """,
+    "cierres.historial": """
+        SELECT c.*, u.nombre AS usuario_nombre
+        FROM CierresTurno c
+        JOIN Usuarios u ON c.usuario_id = u.id
+        ORDER BY c.fecha_cierre DESC LIMIT 30
+    """,
+
+    # ── Registro de cambios ──────────────────────────────────────────────────
+    "cambios.ultimo_seq": "SELECT COALESCE(MAX(seq), 0) FROM Cambios",
+    "cambios.limites":    "SELECT MIN(seq) AS minimo, MAX(seq) AS maximo FROM Cambios",
+    "cambios.habitaciones": """
+        SELECT c.fila_id AS numero
+        FROM Cambios c
+        WHERE c.seq > :seq AND c.seq <= :hasta AND c.tabla = 'Habitaciones'
+        UNION
+        SELECT r.habitacion_id
+        FROM Cambios c JOIN Registros r ON r.id = c.fila_id
+        WHERE c.seq > :seq AND c.seq <= :hasta AND c.tabla = 'Registros'
+        UNION
+        SELECT r.habitacion_id
+        FROM Cambios c
+        JOIN Registros r ON r.huesped_principal_id = c.fila_id AND r.estado = 'Activo'
+        WHERE c.seq > :seq AND c.seq <= :hasta AND c.tabla = 'Huespedes'
+    """,
+    "cambios.tablas": """
+        SELECT DISTINCT tabla FROM Cambios WHERE seq > ? AND seq <= ?
+    """,
+    "cambios.reservas": """
+        SELECT c.fila_id AS id, r.habitacion_id, r.nombre_contacto, r.fecha_entrada,
+               r.fecha_salida, r.estado
+        FROM (SELECT DISTINCT fila_id FROM Cambios
+              WHERE seq > ? AND seq <= ? AND tabla = 'Reservas') c
+        LEFT JOIN Reservas r ON r.id = c.fila_id
+    """,
+    "cambios.transacciones": """
+        SELECT t.* FROM Transacciones t
+        WHERE t.registro_id = ? AND t.id IN (
+            SELECT fila_id FROM Cambios
+            WHERE seq > ? AND seq <= ? AND tabla = 'Transacciones'
+        )
+        ORDER BY t.fecha_hora
+    """,
+
+    # ── Exportación ──────────────────────────────────────────────────────────
+    # El registro se busca con subconsultas correlacionadas: un LEFT JOIN a la
+    # vista RegistrosHistorico (UNION ALL con el archivo) la materializa
+    # completa en cada exportación; así es una búsqueda por id en cada base.
+    "exportar.transacciones": """
+        SELECT t.id, t.fecha_hora, t.tipo, t.metodo_pago, t.monto_usd, t.tasa_cambio,
+               t.monto_bs, t.referencia, t.descripcion, t.registro_id,
+               t.habitacion,
+               g.documento     AS huesped_documento,
+               g.nombres       AS huesped_nombre,
+               u.username      AS usuario
+        FROM (SELECT t.*,
+                     (SELECT r.habitacion_id FROM RegistrosHistorico r
+                      WHERE r.id = t.registro_id)        AS habitacion,
+                     (SELECT r.huesped_principal_id FROM RegistrosHistorico r
+                      WHERE r.id = t.registro_id)        AS huesped_id
+              FROM TransaccionesHistorico t
+              WHERE t.fecha_hora >= :desde AND t.fecha_hora < :hasta) t
+        LEFT JOIN Huespedes g ON g.id = t.huesped_id
+        LEFT JOIN Usuarios  u ON u.id = t.usuario_id
+        ORDER BY t.fecha_hora, t.id
+    """,
+
+    # ── Analítica (analytics.py) ─────────────────────────────────────────────
+    "analitica.habitaciones": "SELECT numero, tipo, precio_usd FROM Habitaciones ORDER BY numero",
+    "analitica.estancias": """
+        SELECT r.id, r.habitacion_id, r.fecha_entrada, r.fecha_salida_prevista, r.estado,
+               h.precio_usd, c.total AS cargos, c.total_bs AS cargos_bs
+        FROM RegistrosHistorico r
+        JOIN Habitaciones h ON h.numero = r.habitacion_id
+        LEFT JOIN (SELECT registro_id, SUM(monto_usd) AS total,
+                          SUM(CASE WHEN tasa_cambio > 0 THEN monto_bs ELSE 0 END) AS total_bs
+                   FROM TransaccionesHistorico
+                   WHERE tipo = 'Cargo'
+                   GROUP BY registro_id) c ON c.registro_id = r.id
+    """,
+    # Cargos creados, modificados o borrados en un tramo del registro de cambios
+    # (los pagos no alteran el ingreso de las estancias)
+    "analitica.cargos_modificados": """
+        SELECT 1
+        FROM Cambios c
+        LEFT JOIN Transacciones t ON t.id = c.fila_id
+        WHERE c.seq > :seq AND c.seq <= :hasta AND c.tabla = 'Transacciones'
+          AND (t.id IS NULL OR t.tipo = 'Cargo')
+        LIMIT 1
+    """,
+    # Cargos sin tasa propia (datos viejos): se valoran con el historial de tasas
+    "analitica.cargos_sin_tasa": """
+        SELECT registro_id, monto_usd, fecha_hora
+        FROM TransaccionesHistorico
+        WHERE tipo = 'Cargo' AND COALESCE(tasa_cambio, 0) <= 0
+    """,
+
+    # ── Reportes ─────────────────────────────────────────────────────────────
+    "reportes.dia_pagos": """
+        SELECT metodo_pago, total_usd, total_bs, cantidad
+        FROM ResumenDiarioPagos
+        WHERE fecha=?
+    """,
+    "reportes.dia_estancias":
+        "SELECT checkins, checkouts FROM ResumenDiarioEstancias WHERE fecha=?",
+    "reportes.rango_pagos": """
+        SELECT metodo_pago, SUM(total_usd) AS total_usd, SUM(total_bs) AS total_bs,
+               SUM(cantidad) AS cantidad
+        FROM ResumenDiarioPagos
+        WHERE fecha BETWEEN ? AND ?
+        GROUP BY metodo_pago
+    """,
+    "reportes.rango_estancias": """
+        SELECT COALESCE(SUM(checkins), 0) AS checkins, COALESCE(SUM(checkouts), 0) AS checkouts
+        FROM ResumenDiarioEstancias
+        WHERE fecha BETWEEN ? AND ?
+    """,
+    "reportes.rango_dias": """
+        SELECT fecha, SUM(total_usd) AS total_usd, SUM(total_bs) AS total_bs
+        FROM ResumenDiarioPagos
+        WHERE fecha BETWEEN ? AND ?
+        GROUP BY fecha
+        ORDER BY fecha
+    """,
+}
+
+# Sentencias con nombre + margen para las dinámicas (IN (?,?…), migraciones, …)
+STATEMENT_CACHE_SIZE = max(128, 2 * len(STATEMENTS))
+
+
+class QueryRegistry:
+    """Sentencias con nombre y contadores de uso por nombre."""
+
+    def __init__(self, statements: dict[str, str]):
+        self._sql      = dict(statements)
+        self._llamadas = dict.fromkeys(self._sql, 0)
+        self._segundos = dict.fromkeys(self._sql, 0.0)
+        self._lock     = threading.Lock()
+
+    def __len__(self):
+        return len(self._sql)
+
+    def sql(self, name: str) -> str:
+        try:
+            return self._sql[name]
+        except KeyError:
+            raise KeyError(f"Consulta no registrada: {name!r}") from None
+
+    def execute(self, conn, name: str, params=()):
+        return self.call(name, conn.execute, self.sql(name), params)
+
+    def executemany(self, conn, name: str, seq_params):
+        return self.call(name, conn.executemany, self.sql(name), seq_params)
+
+    def call(self, name: str, fn, *args):
+        """Ejecuta fn(*args) contando el tiempo a nombre de la consulta `name`."""
+        inicio = time.perf_counter()
+        try:
+            return fn(*args)
+        finally:
+            self._count(name, time.perf_counter() - inicio)
+
+    def _count(self, name: str, segundos: float):
+        with self._lock:
+            self._llamadas[name] += 1
+            self._segundos[name] += segundos
+
+    def stats(self) -> list[dict]:
+        """Consultas usadas, de la más llamada a la menos."""
+        with self._lock:
+            filas = [{"nombre": n, "llamadas": c, "segundos": round(self._segundos[n], 6)}
+                     for n, c in self._llamadas.items() if c]
+        return sorted(filas, key=lambda f: f["llamadas"], reverse=True)
+
+    def reset_stats(self):
+        with self._lock:
+            self._llamadas = dict.fromkeys(self._sql, 0)
+            self._segundos = dict.fromkeys(self._sql, 0.0)
+
+
+registry = QueryRegistry(STATEMENTS)
@@ -0,0 +1,435 @@
+"""
+reportes.py - Reportes PDF de ingresos diarios y ocupación
+Sistema de Gestión Hotelera (SGH)
+
+Los datos se leen agregados del DAL (resumen diario de pagos, analytics) y el
+PDF se arma en un proceso aparte (ProcessPoolExecutor), de modo que la
+ventana de Flet no se congela mientras se maqueta. El PDF se escribe como
+flujo: cada página se comprime y se vuelca al archivo apenas se llena, y al
+final solo quedan en memoria las posiciones de los objetos para la tabla xref.
+
+Los reportes terminados se guardan en REPORT_DIR con nombre
+<tipo>-<desde>-<hasta>-<huella>.pdf, donde la huella resume una versión
+barata de los datos (último seq de Cambios, historial de tasas, nombre del
+hotel y, si el rango llega a hoy, la fecha) que se obtiene sin recopilarlos:
+volver a abrir el reporte de ayer (sin cambios en la base) no lee el resumen
+ni carga la analítica. Solo se conservan los REPORT_CACHE_KEEP más recientes.
+
+No requiere dependencias: el PDF se escribe a mano con las fuentes estándar
+(Helvetica y Courier). El reporte de ocupación requiere numpy (analytics.py).
+
+    python manage.py reporte ingresos --mes 2024-05 --salida mayo.pdf
+"""
+import asyncio
+import hashlib
+import json
+import multiprocessing
+import os
+import tempfile
+import threading
+import zlib
+from concurrent.futures import ProcessPoolExecutor
+from datetime import date, datetime
+
+import analytics
+import database as db
+import db_async
+
+REPORT_DIR        = "reportes"   # relativo a la carpeta de la base
+REPORT_CACHE_KEEP = 100          # reportes guardados que se conservan
+REPORT_WORKERS    = 1            # procesos que maquetan PDF
+
+REPORT_TYPES = {
+    "ingresos":  "Ingresos diarios",
+    "ocupacion": "Ocupación por tipo de habitación",
+}
+
+_pool      = None
+_pool_lock = threading.Lock()
+
+
+# ─── ESCRITURA DEL PDF ────────────────────────────────────────────────────────
+
+def _texto_pdf(s: str) -> bytes:
+    """Cadena literal PDF en WinAnsi (acentos y ñ incluidos)."""
+    b = str(s).encode("cp1252", "replace")
+    return b"(" + b.replace(b"\\", b"\\\\").replace(b"(", b"\\(").replace(b")", b"\\)") + b")"
+
+
+class PdfWriter:
+    """
+    Escribe un PDF 1.4 objeto por objeto en un archivo binario abierto.
+    Cada página se vuelca al llamar add_page(); close() escribe el árbol de
+    páginas, el catálogo y la tabla xref.
+    """
+    ANCHO, ALTO = 595, 842      # A4 en puntos
+    FUENTES = {"F1": "Helvetica", "F2": "Helvetica-Bold", "F3": "Courier"}
+
+    # Objetos fijos: 1 catálogo, 2 árbol de páginas, 3.. fuentes
+    _CATALOGO, _PAGINAS = 1, 2
+
+    def __init__(self, f, titulo: str = ""):
+        self.f        = f
+        self.pos      = 0
+        self.offsets  = {}
+        self.paginas  = []
+        self._n       = self._PAGINAS + len(self.FUENTES)
+        self._escribir(b"%PDF-1.4\n%\xe2\xe3\xcf\xd3\n")
+        for num, (nombre, base) in enumerate(self.FUENTES.items(), start=self._PAGINAS + 1):
+            self._objeto(num, f"<< /Type /Font /Subtype /Type1 /BaseFont /{base}"
+                              f" /Encoding /WinAnsiEncoding >>".encode())
+        self._info = self._nuevo()
+        self._objeto(self._info, b"<< /Title " + _texto_pdf(titulo) + b" /Producer (SGH) >>")
+
+    def _escribir(self, datos: bytes):
+        self.f.write(datos)
+        self.pos += len(datos)
+
+    def _nuevo(self) -> int:
+        self._n += 1
+        return self._n
+
+    def _objeto(self, num: int, cuerpo: bytes):
+        self.offsets[num] = self.pos
+        self._escribir(f"{num} 0 obj\n".encode() + cuerpo + b"\nendobj\n")
+
+    def add_page(self, contenido: bytes):
+        datos   = zlib.compress(contenido)
+        stream  = self._nuevo()
+        self._objeto(stream, f"<< /Length {len(datos)} /Filter /FlateDecode >>\nstream\n".encode()
+                     + datos + b"\nendstream")
+        fuentes = " ".join(f"/{n} {num} 0 R"
+                           for num, n in enumerate(self.FUENTES, start=self._PAGINAS + 1))
+        pagina  = self._nuevo()
+        self._objeto(pagina, (f"<< /Type /Page /Parent {self._PAGINAS} 0 R"
+                              f" /MediaBox [0 0 {self.ANCHO} {self.ALTO}]"
+                              f" /Resources << /Font << {fuentes} >> >>"
+                              f" /Contents {stream} 0 R >>").encode())
+        self.paginas.append(pagina)
+
+    def close(self):
+        kids = " ".join(f"{p} 0 R" for p in self.paginas)
+        self._objeto(self._PAGINAS,
+                     f"<< /Type /Pages /Kids [{kids}] /Count {len(self.paginas)} >>".encode())
+        self._objeto(self._CATALOGO, f"<< /Type /Catalog /Pages {self._PAGINAS} 0 R >>".encode())
+        xref  = self.pos
+        total = self._n + 1
+        lineas = [f"xref\n0 {total}\n", "0000000000 65535 f \n"]
+        lineas += [f"{self.offsets[n]:010d} 00000 n \n" for n in range(1, total)]
+        lineas.append(f"trailer\n<< /Size {total} /Root {self._CATALOGO} 0 R"
+                      f" /Info {self._info} 0 R >>\nstartxref\n{xref}\n%%EOF\n")
+        self._escribir("".join(lineas).encode())
+
+
+class PageLayout:
+    """
+    Maqueta de arriba hacia abajo sobre un PdfWriter: encabezado en cada
+    página, párrafos y tablas cuyas filas pueden venir de un generador. Al
+    llenarse una página se entrega al PdfWriter y se repite el encabezado de
+    la tabla en curso.
+    """
+    MARGEN = 48
+    FILA   = 14
+
+    def __init__(self, pdf: PdfWriter, titulo: str, subtitulo: str):
+        self.pdf       = pdf
+        self.titulo    = titulo
+        self.subtitulo = subtitulo
+        self.numero    = 0
+        self.ops       = []
+        self.y         = 0
+        self._columnas = None     # tabla en curso, para repetir su encabezado
+        self._nueva_pagina()
+
+    # ── Primitivas ────────────────────────────────────────────────────────────
+    def _texto(self, x: float, y: float, s: str, fuente: str = "F1", tam: float = 10,
+               gris: float = 0.0):
+        self.ops.append(b"BT %.3f g /%s %g Tf %.2f %.2f Td " % (gris, fuente.encode(), tam, x, y)
+                        + _texto_pdf(s) + b" Tj ET")
+
+    def _rect(self, x: float, y: float, ancho: float, alto: float, color: tuple):
+        self.ops.append(b"%.3f %.3f %.3f rg %.2f %.2f %.2f %.2f re f" % (*color, x, y, ancho, alto))
+
+    def _linea(self, y: float):
+        self.ops.append(b"0.7 G 0.5 w %d %.2f m %d %.2f l S"
+                        % (self.MARGEN, y, self.pdf.ANCHO - self.MARGEN, y))
+
+    # ── Páginas ───────────────────────────────────────────────────────────────
+    def _cerrar_pagina(self):
+        self._texto(self.MARGEN, self.MARGEN / 2, f"Página {self.numero}", tam=8, gris=0.5)
+        self.pdf.add_page(b"\n".join(self.ops))
+        self.ops = []
+
+    def _nueva_pagina(self):
+        if self.numero:
+            self._cerrar_pagina()
+        self.numero += 1
+        self.y = self.pdf.ALTO - self.MARGEN
+        self._texto(self.MARGEN, self.y, self.titulo, "F2", 15)
+        self.y -= 15
+        self._texto(self.MARGEN, self.y, self.subtitulo, tam=9, gris=0.4)
+        self.y -= 8
+        self._linea(self.y)
+        self.y -= 18
+        if self._columnas:
+            self._encabezado_tabla()
+
+    def _espacio(self, alto: float):
+        if self.y - alto < self.MARGEN:
+            self._nueva_pagina()
+
+    # ── Contenido ─────────────────────────────────────────────────────────────
+    def parrafo(self, s: str, fuente: str = "F1", tam: float = 10):
+        self._espacio(tam + 4)
+        self._texto(self.MARGEN, self.y, s, fuente, tam)
+        self.y -= tam + 6
+
+    def separar(self, alto: float = 10):
+        self.y -= alto
+
+    def _encabezado_tabla(self):
+        x = self.MARGEN
+        for titulo, ancho, derecha in self._columnas:
+            tx = x + ancho - 5.0 * len(titulo) if derecha else x   # ancho aproximado
+            self._texto(tx, self.y, titulo, "F2", 9, gris=0.3)
+            x += ancho + 8
+        self.y -= 5
+        self._linea(self.y)
+        self.y -= self.FILA - 3
+
+    def tabla(self, columnas: list[tuple[str, float, bool]], filas, barra: bool = False):
+        """
+        columnas: [(título, ancho, alinear_derecha)]. filas: iterable de listas
+        de celdas (ya formateadas); con barra=True el último valor de cada
+        fila es una proporción 0..1 que se dibuja como barra horizontal en el
+        espacio restante.
+        """
+        self._columnas = columnas
+        self._espacio(3 * self.FILA)
+        self._encabezado_tabla()
+        x_barra   = self.MARGEN + sum(a + 8 for _, a, _ in columnas)
+        max_barra = self.pdf.ANCHO - self.MARGEN - x_barra
+        for fila in filas:
+            self._espacio(self.FILA)
+            celdas = fila[:-1] if barra else fila
+            x = self.MARGEN
+            for (_, ancho, derecha), celda in zip(columnas, celdas):
+                celda = str(celda)
+                tx = x + ancho - 5.4 * len(celda) if derecha else x   # Courier 9: 5.4 pt/carácter
+                self._texto(tx, self.y, celda, "F3", 9)
+                x += ancho + 8
+            if barra and max_barra > 0:
+                proporcion = max(0.0, min(1.0, fila[-1]))
+                if proporcion:
+                    self._rect(x_barra, self.y - 1, max_barra * proporcion, 8, (0.23, 0.51, 0.96))
+            self.y -= self.FILA
+        self._columnas = None
+        self.y -= 6
+
+    def close(self) -> int:
+        self._cerrar_pagina()
+        self.pdf.close()
+        return self.numero
+
+
+# ─── CONTENIDO DE LOS REPORTES ────────────────────────────────────────────────
+
+def _render_ingresos(hoja: PageLayout, datos: dict):
+    total_usd = sum(p["total_usd"] or 0 for p in datos["pagos"])
+    total_bs  = sum(p["total_bs"] or 0 for p in datos["pagos"])
+    hoja.parrafo(f"Total cobrado: ${total_usd:,.2f}  |  Bs. {total_bs:,.2f}", "F2", 11)
+    hoja.parrafo(f"Check-ins: {datos['checkins']}    Check-outs: {datos['checkouts']}")
+    hoja.separar()
+
+    hoja.parrafo("Por método de pago", "F2", 11)
+    hoja.tabla(
+        [("Método", 150, False), ("Pagos", 60, True), ("Total USD", 100, True),
+         ("Total Bs.", 120, True)],
+        ([p["metodo_pago"], p["cantidad"], f"{p['total_usd'] or 0:,.2f}",
+          f"{p['total_bs'] or 0:,.2f}"] for p in datos["pagos"]),
+    )
+
+    hoja.parrafo("Por día", "F2", 11)
+    maximo = max((d["total_usd"] or 0 for d in datos["dias"]), default=0) or 1
+    hoja.tabla(
+        [("Fecha", 80, False), ("Total USD", 100, True), ("Total Bs.", 120, True)],
+        ([d["fecha"], f"{d['total_usd'] or 0:,.2f}", f"{d['total_bs'] or 0:,.2f}",
+          (d["total_usd"] or 0) / maximo] for d in datos["dias"]),
+        barra=True,
+    )
+
+
+def _render_ocupacion(hoja: PageLayout, datos: dict):
+    total = datos["total"]["resumen"]
+    hoja.parrafo(f"Ocupación: {total['ocupacion']:.1f} %   ADR: ${total['adr']:,.2f}"
+                 f"   RevPAR: ${total['revpar']:,.2f}", "F2", 11)
+    tasas = datos.get("tasas") or [0]
+    hoja.parrafo(f"Ingresos: ${total['ingresos']:,.2f}  |  Bs. {total['ingresos_bs']:,.2f}"
+                 f"   (tasa del día: {min(tasas):,.2f} a {max(tasas):,.2f} Bs/$)")
+    hoja.separar()
+
+    hoja.parrafo("Por tipo de habitación", "F2", 11)
+    series = list(datos["tipos"].items()) + [("Total", datos["total"])]
+    hoja.tabla(
+        [("Tipo", 95, False), ("Hab.", 35, True), ("Noches", 50, True),
+         ("Ocup. %", 55, True), ("ADR $", 65, True), ("RevPAR $", 65, True),
+         ("Ingresos Bs.", 110, True)],
+        ([tipo, s["habitaciones"], s["resumen"]["noches_vendidas"],
+          f"{s['resumen']['ocupacion']:.1f}", f"{s['resumen']['adr']:,.2f}",
+          f"{s['resumen']['revpar']:,.2f}", f"{s['resumen']['ingresos_bs']:,.2f}"]
+         for tipo, s in series),
+    )
+
+    hoja.parrafo("Por día", "F2", 11)
+    dia = datos["total"]
+    hoja.tabla(
+        [("Fecha", 80, False), ("Ocup. %", 60, True), ("ADR $", 70, True),
+         ("RevPAR $", 70, True)],
+        ([fecha, f"{ocup:.1f}", f"{adr:,.2f}", f"{revpar:,.2f}", ocup / 100]
+         for fecha, ocup, adr, revpar in zip(datos["dias"], dia["ocupacion"], dia["adr"],
+                                             dia["revpar"])),
+        barra=True,
+    )
+
+
+_RENDER = {"ingresos": _render_ingresos, "ocupacion": _render_ocupacion}
+
+
+def render_pdf(tipo: str, datos: dict, destino: str) -> str:
+    """
+    Maqueta y escribe el PDF en `destino` (a través de un archivo temporal en
+    la misma carpeta). Corre en el proceso de reportes: solo usa `datos`.
+    """
+    titulo    = f"{REPORT_TYPES[tipo]} — {datos['hotel']}"
+    subtitulo = (f"Del {datos['desde']} al {datos['hasta']}  ·  "
+                 f"Generado el {datetime.now():%Y-%m-%d %H:%M}")
+    fd, parcial = tempfile.mkstemp(suffix=".parcial", dir=os.path.dirname(destino))
+    try:
+        with os.fdopen(fd, "wb") as f:
+            hoja = PageLayout(PdfWriter(f, titulo), titulo, subtitulo)
+            _RENDER[tipo](hoja, datos)
+            hoja.close()
+        os.replace(parcial, destino)
+    finally:
+        if os.path.exists(parcial):
+            os.remove(parcial)
+    return destino
+
+
+# ─── DATOS Y CACHÉ ────────────────────────────────────────────────────────────
+
+def report_dir() -> str:
+    base = os.path.dirname(os.path.abspath(db.DB_NAME))
+    return os.path.join(base, REPORT_DIR)
+
+
+def _validar(tipo: str, desde: str, hasta: str):
+    if tipo not in REPORT_TYPES:
+        raise ValueError(f"Reporte desconocido: {tipo!r} (use {', '.join(REPORT_TYPES)})")
+    if desde > hasta:
+        raise ValueError("La fecha final debe ser igual o posterior a la inicial.")
+
+
+def recopilar(tipo: str, desde: str, hasta: str) -> dict:
+    """Datos agregados del reporte (solo tipos simples, para pasarlos a otro proceso)."""
+    _validar(tipo, desde, hasta)
+    if tipo == "ingresos":
+        datos = db.get_resumen_rango(desde, hasta)
+    else:
+        datos = analytics.get_ocupacion(desde, hasta)
+    datos.update(desde=desde, hasta=hasta,
+                 hotel=db.get_config().get("nombre_hotel", "Mi Hotel"))
+    return datos
+
+
+def version_datos(hasta: str) -> list:
+    """
+    Versión de los datos de los reportes sin leerlos: cambia con cada fila
+    registrada en Cambios, con cada cambio de tasa o del nombre del hotel y,
+    si el rango llega a hoy, cada día (las estancias activas llegan a hoy).
+    """
+    tasas   = db.get_rate_history()
+    version = [db.get_last_change_seq(), len(tasas), tasas.desde[-1] if tasas.desde else None,
+               tasas.tasa_actual, db.get_config().get("nombre_hotel")]
+    hoy = date.today().isoformat()
+    if hasta >= hoy:
+        version.append(hoy)
+    return version
+
+
+def cache_path(tipo: str, desde: str, hasta: str) -> str:
+    """Ruta del reporte en caché para la versión actual de los datos."""
+    _validar(tipo, desde, hasta)
+    clave  = [tipo, desde, hasta, version_datos(hasta)]
+    huella = hashlib.sha256(json.dumps(clave, default=str).encode())
+    return os.path.join(report_dir(), f"{tipo}-{desde}-{hasta}-{huella.hexdigest()[:16]}.pdf")
+
+
+def _desde_cache(path: str) -> bool:
+    if not os.path.exists(path):
+        return False
+    os.utime(path)          # más reciente para la rotación
+    return True
+
+
+def podar_cache(conservar: int | None = None) -> list[str]:
+    """Borra los reportes guardados menos usados (deja REPORT_CACHE_KEEP)."""
+    carpeta = report_dir()
+    if not os.path.isdir(carpeta):
+        return []
+    pdfs = [os.path.join(carpeta, n) for n in os.listdir(carpeta) if n.endswith(".pdf")]
+    pdfs.sort(key=os.path.getmtime, reverse=True)
+    sobrantes = pdfs[REPORT_CACHE_KEEP if conservar is None else conservar:]
+    for path in sobrantes:
+        os.remove(path)
+    return sobrantes
+
+
+def get_pool() -> ProcessPoolExecutor:
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            # spawn: no se hereda por fork un proceso con hilos (Flet, pool del DAL)
+            _pool = ProcessPoolExecutor(max_workers=REPORT_WORKERS,
+                                        mp_context=multiprocessing.get_context("spawn"))
+        return _pool
+
+
+def shutdown_pool(wait: bool = True):
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.shutdown(wait=wait, cancel_futures=True)
+            _pool = None
+
+
+def generar_reporte(tipo: str, desde: str, hasta: str, en_proceso: bool = True) -> str:
+    """
+    Ruta del PDF del reporte `tipo` para [desde, hasta] (AAAA-MM-DD). Si ya
+    existe uno para la misma versión de los datos se devuelve sin recopilar
+    nada. Con en_proceso=False se maqueta en el proceso actual (manage.py).
+    """
+    path = cache_path(tipo, desde, hasta)
+    if _desde_cache(path):
+        return path
+    datos = recopilar(tipo, desde, hasta)
+    os.makedirs(report_dir(), exist_ok=True)
+    if en_proceso:
+        get_pool().submit(render_pdf, tipo, datos, path).result()
+    else:
+        render_pdf(tipo, datos, path)
+    podar_cache()
+    return path
+
+
+async def generar_reporte_async(tipo: str, desde: str, hasta: str) -> str:
+    """Como generar_reporte, sin bloquear el bucle de eventos de Flet."""
+    path = await db_async.run(cache_path, tipo, desde, hasta)
+    if _desde_cache(path):
+        return path
+    datos = await db_async.run(recopilar, tipo, desde, hasta)
+    os.makedirs(report_dir(), exist_ok=True)
+    loop = asyncio.get_running_loop()
+    await loop.run_in_executor(get_pool(), render_pdf, tipo, datos, path)
+    await db_async.run(podar_cache)
+    return path
@@ -0,0 +1,180 @@
+"""
+reservas.py - Índice en memoria de reservas para consultar disponibilidad
+Sistema de Gestión Hotelera (SGH)
+
+Las reservas confirmadas se cargan una vez y se mantienen al día con el
+registro de Cambios (solo se releen las filas modificadas). Como dos
+reservas confirmadas de una habitación nunca se solapan (create_reserva lo
+impide), sus entradas y sus salidas quedan ordenadas a la vez, y saber si
+[d1, d2) choca con alguna es un bisect en lugar de recorrer todas:
+
+    i = bisect_left(entradas, d2)        # reservas que entran antes de d2
+    choca = i > 0 and salidas[i-1] > d1  # la última de ellas sale después de d1
+
+Las llegadas de todas las habitaciones están en otra lista ordenada por
+fecha, de modo que "próximas llegadas" es un corte por rango.
+
+Las escrituras siguen pasando por database.py (create_reserva,
+set_estado_reserva); este módulo solo lee.
+"""
+import threading
+from bisect import bisect_left, insort
+from datetime import date, timedelta
+
+import database as db
+
+
+def _manana() -> str:
+    return (date.today() + timedelta(days=1)).isoformat()
+
+
+class ReservationIndex:
+    """Reservas confirmadas y estancias activas de una base, indexadas por fecha."""
+
+    def __init__(self):
+        self.seq      = None    # último cambio aplicado (None: sin cargar)
+        self.reservas = {}   # id -> {"id", "habitacion_id", "nombre_contacto", "fecha_entrada", "fecha_salida"}
+        self.entradas = {}   # habitacion -> [fecha_entrada, ...] ordenadas
+        self.salidas  = {}   # habitacion -> [fecha_salida, ...] en el mismo orden
+        self.ids      = {}   # habitacion -> [id, ...] en el mismo orden
+        self.llegadas = []   # [(fecha_entrada, id)] ordenadas, todas las habitaciones
+        self.tipos    = {}   # habitacion -> tipo
+        self.ocupadas = {}   # habitacion -> salida prevista de la estancia activa
+        self._lock    = threading.Lock()
+
+    # ── Mantenimiento ─────────────────────────────────────────────────────────
+    def _agregar(self, r: dict):
+        hab      = r["habitacion_id"]
+        entradas = self.entradas.setdefault(hab, [])
+        i        = bisect_left(entradas, r["fecha_entrada"])
+        entradas.insert(i, r["fecha_entrada"])
+        self.salidas.setdefault(hab, []).insert(i, r["fecha_salida"])
+        self.ids.setdefault(hab, []).insert(i, r["id"])
+        insort(self.llegadas, (r["fecha_entrada"], r["id"]))
+        self.reservas[r["id"]] = {k: r[k] for k in ("id", "habitacion_id", "nombre_contacto",
+                                                    "fecha_entrada", "fecha_salida")}
+
+    def _quitar(self, reserva_id: int):
+        r = self.reservas.pop(reserva_id, None)
+        if r is None:
+            return
+        hab      = r["habitacion_id"]
+        entradas = self.entradas[hab]
+        i        = bisect_left(entradas, r["fecha_entrada"])
+        del entradas[i]
+        del self.salidas[hab][i]
+        del self.ids[hab][i]
+        del self.llegadas[bisect_left(self.llegadas, (r["fecha_entrada"], reserva_id))]
+
+    def _cargar_habitaciones(self):
+        self.tipos, self.ocupadas = {}, {}
+        for h in db.get_all_habitaciones():
+            self.tipos[h["numero"]] = h["tipo"]
+            if h["registro_id"]:
+                self.ocupadas[h["numero"]] = (h["fecha_salida_prevista"] or "")[:10]
+
+    def load(self):
+        """Carga completa (al crear el índice o si el registro de cambios se depuró)."""
+        seq = db.get_last_change_seq()
+        self.reservas, self.entradas, self.salidas, self.ids = {}, {}, {}, {}
+        self.llegadas = []
+        for r in db.get_reservas_vigentes(date.today().isoformat()):
+            self._agregar(r)
+        self._cargar_habitaciones()
+        self.seq = seq
+
+    def refresh(self):
+        """Aplica los cambios posteriores a self.seq (una consulta si no hay ninguno)."""
+        with self._lock:
+            if self.seq is None:
+                self.load()
+                return
+            delta = db.get_reservas_changed_since(self.seq)
+            if delta["reload"]:
+                self.load()
+                return
+            for r in delta["reservas"]:
+                self._quitar(r["id"])
+                if r["estado"] == "Confirmada":
+                    self._agregar(r)
+            if {"Habitaciones", "Registros"} & set(delta["tablas"]):
+                self._cargar_habitaciones()
+            self.seq = delta["seq"]
+
+    # ── Consultas ─────────────────────────────────────────────────────────────
+    def _conflicto(self, habitacion_id: int, desde: str, hasta: str) -> dict | None:
+        entradas = self.entradas.get(habitacion_id)
+        if not entradas:
+            return None
+        i = bisect_left(entradas, hasta)
+        if i == 0 or self.salidas[habitacion_id][i - 1] <= desde:
+            return None
+        return dict(self.reservas[self.ids[habitacion_id][i - 1]])
+
+    def _libre(self, habitacion_id: int, desde: str, hasta: str, manana: str) -> bool:
+        # Una estancia con la salida vencida ocupa al menos hasta mañana
+        salida = self.ocupadas.get(habitacion_id)
+        if salida is not None and max(salida, manana) > desde:
+            return False
+        return self._conflicto(habitacion_id, desde, hasta) is None
+
+    def conflicto(self, habitacion_id: int, desde: str, hasta: str) -> dict | None:
+        """Reserva confirmada de la habitación que se solapa con [desde, hasta), si hay."""
+        with self._lock:
+            return self._conflicto(habitacion_id, desde, hasta)
+
+    def libre(self, habitacion_id: int, desde: str, hasta: str) -> bool:
+        """¿La habitación está libre en [desde, hasta)? (reservas y estancia activa)."""
+        with self._lock:
+            return self._libre(habitacion_id, desde, hasta, _manana())
+
+    def disponibles(self, desde: str, hasta: str, tipo: str | None = None) -> list[int]:
+        """Habitaciones (del tipo indicado, o todas) libres en [desde, hasta)."""
+        manana = _manana()
+        with self._lock:
+            return [hab for hab, t in sorted(self.tipos.items())
+                    if (tipo is None or t == tipo) and self._libre(hab, desde, hasta, manana)]
+
+    def llegadas_entre(self, desde: str, hasta: str) -> list[dict]:
+        """Reservas confirmadas con entrada en [desde, hasta), por fecha."""
+        with self._lock:
+            i = bisect_left(self.llegadas, (desde,))
+            j = bisect_left(self.llegadas, (hasta,))
+            return [dict(self.reservas[rid]) for _, rid in self.llegadas[i:j]]
+
+
+_indices      = {}      # clave del motor -> ReservationIndex
+_indices_lock = threading.Lock()
+
+
+def get_index() -> ReservationIndex:
+    """Índice de la base actual, al día con el registro de cambios."""
+    clave = db.get_backend().key
+    with _indices_lock:
+        indice = _indices.setdefault(clave, ReservationIndex())
+    indice.refresh()
+    return indice
+
+
+def _validar_rango(desde: str, hasta: str):
+    if hasta <= desde:
+        raise ValueError("La fecha de salida debe ser posterior a la de entrada.")
+
+
+def habitaciones_disponibles(desde: str, hasta: str, tipo: str | None = None) -> list[int]:
+    """Números de habitación (de `tipo`, o de todos) libres de `desde` a `hasta` (AAAA-MM-DD)."""
+    _validar_rango(desde, hasta)
+    return get_index().disponibles(desde, hasta, tipo)
+
+
+def reserva_en_conflicto(habitacion_id: int, desde: str, hasta: str) -> dict | None:
+    """La reserva que impediría reservar la habitación de `desde` a `hasta`, o None."""
+    _validar_rango(desde, hasta)
+    return get_index().conflicto(habitacion_id, desde, hasta)
+
+
+def proximas_llegadas(dias: int = 7) -> list[dict]:
+    """Reservas confirmadas que llegan de hoy a `dias` días, por fecha de entrada."""
+    hoy = date.today()
+    return get_index().llegadas_entre(hoy.isoformat(),
+                                      (hoy + timedelta(days=dias)).isoformat())
@@ -0,0 +1,371 @@
+"""
+schema_pg.py - Migraciones del esquema para el motor PostgreSQL
+Sistema de Gestión Hotelera (SGH)
+
+Misma numeración que database.MIGRATIONS: la versión N deja en PostgreSQL el
+mismo esquema lógico que la N de SQLite (tablas, columnas e índices que usa
+el DAL). Los triggers se escriben como funciones PL/pgSQL. Cada script se
+envía completo al servidor (sin dividir por ';').
+
+Diferencias deliberadas:
+  • REAL de SQLite → DOUBLE PRECISION; se define round(double precision, int)
+    para que ROUND(x, 2) del DAL funcione igual.
+  • idx_registros_activos es UNIQUE: sin BEGIN IMMEDIATE las escrituras son
+    concurrentes y el índice impide dos estancias activas en una habitación.
+  • La migración 4 (FTS5) no tiene equivalente: search_huespedes usa ILIKE.
+  • Cambios.seq sale de una secuencia: una transacción larga puede confirmar
+    un seq menor después de que otra terminal ya leyó uno mayor, y ese cambio
+    se vería recién en la siguiente recarga completa.
+"""
+
+MIGRATIONS_PG = [
+    # 1 — Esquema base
+    (1, """
+        CREATE OR REPLACE FUNCTION round(double precision, integer)
+        RETURNS double precision AS $$
+            SELECT round($1::numeric, $2)::double precision
+        $$ LANGUAGE SQL IMMUTABLE;
+
+        CREATE TABLE IF NOT EXISTS Configuracion (
+            id             INTEGER GENERATED BY DEFAULT AS IDENTITY PRIMARY KEY,
+            nombre_hotel   TEXT             DEFAULT 'Mi Hotel',
+            tasa_dolar_bs  DOUBLE PRECISION DEFAULT 36.0,
+            usuario_activo TEXT,
+            turno_inicio   TEXT
+        );
+
+        CREATE TABLE IF NOT EXISTS Usuarios (
+            id       INTEGER GENERATED BY DEFAULT AS IDENTITY PRIMARY KEY,
+            username TEXT    UNIQUE NOT NULL,
+            password TEXT    NOT NULL,
+            nombre   TEXT    NOT NULL,
+            rol      TEXT    DEFAULT 'recepcionista',
+            activo   INTEGER DEFAULT 1
+        );
+
+        CREATE TABLE IF NOT EXISTS Huespedes (
+            id               INTEGER GENERATED BY DEFAULT AS IDENTITY PRIMARY KEY,
+            documento        TEXT    UNIQUE NOT NULL,
+            nombres          TEXT    NOT NULL,
+            telefono         TEXT,
+            fecha_nacimiento TEXT,
+            nacionalidad     TEXT    DEFAULT 'Venezolano',
+            profesion        TEXT,
+            vehiculo         TEXT,
+            saldo_acumulado  DOUBLE PRECISION DEFAULT 0.0
+        );
+
+        CREATE TABLE IF NOT EXISTS Habitaciones (
+            numero      INTEGER PRIMARY KEY,
+            tipo        TEXT             DEFAULT 'Estándar',
+            descripcion TEXT,
+            precio_usd  DOUBLE PRECISION DEFAULT 30.0,
+            estado      TEXT             DEFAULT 'Libre'
+        );
+
+        CREATE TABLE IF NOT EXISTS Registros (
+            id                    INTEGER GENERATED BY DEFAULT AS IDENTITY PRIMARY KEY,
+            huesped_principal_id  INTEGER NOT NULL REFERENCES Huespedes(id),
+            habitacion_id         INTEGER NOT NULL REFERENCES Habitaciones(numero),
+            fecha_entrada         TEXT    NOT NULL,
+            fecha_salida_prevista TEXT    NOT NULL,
+            estado                TEXT    DEFAULT 'Activo',
+            notas                 TEXT
+        );
+
+        CREATE TABLE IF NOT EXISTS Acompanantes (
+            id          INTEGER GENERATED BY DEFAULT AS IDENTITY PRIMARY KEY,
+            registro_id INTEGER NOT NULL REFERENCES Registros(id),
+            huesped_id  INTEGER NOT NULL REFERENCES Huespedes(id)
+        );
+
+        CREATE TABLE IF NOT EXISTS Transacciones (
+            id          INTEGER GENERATED BY DEFAULT AS IDENTITY PRIMARY KEY,
+            registro_id INTEGER,
+            monto_usd   DOUBLE PRECISION NOT NULL,
+            tasa_cambio DOUBLE PRECISION NOT NULL,
+            monto_bs    DOUBLE PRECISION NOT NULL,
+            metodo_pago TEXT    NOT NULL,
+            tipo        TEXT    NOT NULL,
+            fecha_hora  TEXT    NOT NULL,
+            usuario_id  INTEGER,
+            referencia  TEXT,
+            descripcion TEXT
+        );
+
+        CREATE TABLE IF NOT EXISTS CierresTurno (
+            id             INTEGER GENERATED BY DEFAULT AS IDENTITY PRIMARY KEY,
+            usuario_id     INTEGER,
+            fecha_apertura TEXT,
+            fecha_cierre   TEXT,
+            total_usd      DOUBLE PRECISION,
+            total_bs       DOUBLE PRECISION,
+            resumen        TEXT
+        );
+    """),
+
+    # 2 — Índices para los accesos frecuentes del DAL
+    (2, """
+        CREATE INDEX IF NOT EXISTS idx_transacciones_usuario_fecha
+            ON Transacciones (usuario_id, fecha_hora);
+
+        CREATE INDEX IF NOT EXISTS idx_transacciones_registro
+            ON Transacciones (registro_id, fecha_hora);
+
+        CREATE UNIQUE INDEX IF NOT EXISTS idx_registros_activos
+            ON Registros (habitacion_id) WHERE estado = 'Activo';
+
+        CREATE INDEX IF NOT EXISTS idx_registros_huesped
+            ON Registros (huesped_principal_id);
+
+        CREATE INDEX IF NOT EXISTS idx_acompanantes_registro
+            ON Acompanantes (registro_id);
+
+        CREATE INDEX IF NOT EXISTS idx_cierres_fecha
+            ON CierresTurno (fecha_cierre);
+    """),
+
+    # 3 — Registro de cambios; el trigger recibe la tabla y su columna clave
+    (3, """
+        CREATE TABLE IF NOT EXISTS Cambios (
+            seq     BIGINT  GENERATED BY DEFAULT AS IDENTITY PRIMARY KEY,
+            tabla   TEXT    NOT NULL,
+            fila_id BIGINT  NOT NULL,
+            op      TEXT    NOT NULL
+        );
+
+        CREATE OR REPLACE FUNCTION sgh_registrar_cambio() RETURNS trigger AS $$
+        DECLARE
+            fila RECORD;
+        BEGIN
+            IF TG_OP = 'DELETE' THEN fila := OLD; ELSE fila := NEW; END IF;
+            INSERT INTO Cambios (tabla, fila_id, op)
+            VALUES (TG_ARGV[0], (to_jsonb(fila) ->> TG_ARGV[1])::bigint, left(TG_OP, 1));
+            RETURN NULL;
+        END;
+        $$ LANGUAGE plpgsql;
+
+        CREATE TRIGGER trg_cambios_habitaciones
+        AFTER INSERT OR UPDATE OR DELETE ON Habitaciones
+        FOR EACH ROW EXECUTE FUNCTION sgh_registrar_cambio('Habitaciones', 'numero');
+
+        CREATE TRIGGER trg_cambios_registros
+        AFTER INSERT OR UPDATE OR DELETE ON Registros
+        FOR EACH ROW EXECUTE FUNCTION sgh_registrar_cambio('Registros', 'id');
+
+        CREATE TRIGGER trg_cambios_huespedes
+        AFTER INSERT OR UPDATE OR DELETE ON Huespedes
+        FOR EACH ROW EXECUTE FUNCTION sgh_registrar_cambio('Huespedes', 'id');
+
+        CREATE TRIGGER trg_cambios_transacciones
+        AFTER INSERT OR UPDATE OR DELETE ON Transacciones
+        FOR EACH ROW EXECUTE FUNCTION sgh_registrar_cambio('Transacciones', 'id');
+    """),
+
+    # 4 — Sin FTS5 en PostgreSQL (ver docstring)
+    (4, "SELECT 1"),
+
+    # 5 — Resumen diario precalculado
+    (5, """
+        CREATE TABLE IF NOT EXISTS ResumenDiarioPagos (
+            fecha       TEXT             NOT NULL,
+            metodo_pago TEXT             NOT NULL,
+            total_usd   DOUBLE PRECISION NOT NULL DEFAULT 0,
+            total_bs    DOUBLE PRECISION NOT NULL DEFAULT 0,
+            cantidad    INTEGER          NOT NULL DEFAULT 0,
+            PRIMARY KEY (fecha, metodo_pago)
+        );
+
+        CREATE TABLE IF NOT EXISTS ResumenDiarioEstancias (
+            fecha     TEXT    PRIMARY KEY,
+            checkins  INTEGER NOT NULL DEFAULT 0,
+            checkouts INTEGER NOT NULL DEFAULT 0
+        );
+
+        CREATE OR REPLACE FUNCTION sgh_resumen_pago() RETURNS trigger AS $$
+        BEGIN
+            INSERT INTO ResumenDiarioPagos AS r (fecha, metodo_pago, total_usd, total_bs, cantidad)
+            VALUES (DATE(NEW.fecha_hora)::text, NEW.metodo_pago, NEW.monto_usd, NEW.monto_bs, 1)
+            ON CONFLICT (fecha, metodo_pago) DO UPDATE SET
+                total_usd = r.total_usd + EXCLUDED.total_usd,
+                total_bs  = r.total_bs  + EXCLUDED.total_bs,
+                cantidad  = r.cantidad  + 1;
+            RETURN NULL;
+        END;
+        $$ LANGUAGE plpgsql;
+
+        CREATE OR REPLACE FUNCTION sgh_resumen_checkin() RETURNS trigger AS $$
+        BEGIN
+            INSERT INTO ResumenDiarioEstancias AS r (fecha, checkins)
+            VALUES (DATE(NEW.fecha_entrada)::text, 1)
+            ON CONFLICT (fecha) DO UPDATE SET checkins = r.checkins + 1;
+            RETURN NULL;
+        END;
+        $$ LANGUAGE plpgsql;
+
+        CREATE OR REPLACE FUNCTION sgh_resumen_checkout() RETURNS trigger AS $$
+        BEGIN
+            INSERT INTO ResumenDiarioEstancias AS r (fecha, checkouts)
+            VALUES (DATE(NEW.fecha_salida_prevista)::text, 1)
+            ON CONFLICT (fecha) DO UPDATE SET checkouts = r.checkouts + 1;
+            RETURN NULL;
+        END;
+        $$ LANGUAGE plpgsql;
+
+        CREATE TRIGGER trg_resumen_pago
+        AFTER INSERT ON Transacciones
+        FOR EACH ROW WHEN (NEW.tipo = 'Pago')
+        EXECUTE FUNCTION sgh_resumen_pago();
+
+        CREATE TRIGGER trg_resumen_checkin
+        AFTER INSERT ON Registros
+        FOR EACH ROW EXECUTE FUNCTION sgh_resumen_checkin();
+
+        CREATE TRIGGER trg_resumen_checkout
+        AFTER UPDATE OF estado ON Registros
+        FOR EACH ROW WHEN (NEW.estado = 'Cerrado' AND OLD.estado IS DISTINCT FROM 'Cerrado')
+        EXECUTE FUNCTION sgh_resumen_checkout();
+
+        INSERT INTO ResumenDiarioPagos (fecha, metodo_pago, total_usd, total_bs, cantidad)
+        SELECT DATE(fecha_hora)::text, metodo_pago, SUM(monto_usd), SUM(monto_bs), COUNT(*)
+        FROM Transacciones
+        WHERE tipo = 'Pago'
+        GROUP BY DATE(fecha_hora), metodo_pago;
+
+        INSERT INTO ResumenDiarioEstancias (fecha, checkins)
+        SELECT DATE(fecha_entrada)::text, COUNT(*)
+        FROM Registros
+        GROUP BY DATE(fecha_entrada);
+
+        INSERT INTO ResumenDiarioEstancias (fecha, checkouts)
+        SELECT DATE(fecha_salida_prevista)::text, COUNT(*)
+        FROM Registros
+        WHERE estado = 'Cerrado'
+        GROUP BY DATE(fecha_salida_prevista)
+        ON CONFLICT (fecha) DO UPDATE SET checkouts = EXCLUDED.checkouts;
+    """),
+
+    # 6 — Libro de movimientos de saldo
+    (6, """
+        CREATE TABLE IF NOT EXISTS MovimientosSaldo (
+            id               INTEGER GENERATED BY DEFAULT AS IDENTITY PRIMARY KEY,
+            huesped_id       INTEGER NOT NULL REFERENCES Huespedes(id),
+            registro_id      INTEGER REFERENCES Registros(id),
+            transaccion_id   INTEGER REFERENCES Transacciones(id),
+            monto            DOUBLE PRECISION NOT NULL,
+            saldo_resultante DOUBLE PRECISION NOT NULL,
+            concepto         TEXT,
+            fecha_hora       TEXT    NOT NULL
+        );
+
+        CREATE INDEX IF NOT EXISTS idx_movimientos_huesped
+            ON MovimientosSaldo (huesped_id, id);
+
+        CREATE INDEX IF NOT EXISTS idx_huespedes_saldo
+            ON Huespedes (saldo_acumulado) WHERE saldo_acumulado <> 0;
+
+        CREATE TABLE IF NOT EXISTS Metadatos (
+            clave TEXT PRIMARY KEY,
+            valor TEXT
+        );
+
+        INSERT INTO MovimientosSaldo (huesped_id, monto, saldo_resultante, concepto, fecha_hora)
+        SELECT id, saldo_acumulado, saldo_acumulado, 'Saldo inicial',
+               to_char(localtimestamp, 'YYYY-MM-DD"T"HH24:MI:SS')
+        FROM Huespedes WHERE saldo_acumulado <> 0;
+    """),
+
+    # 7 — Índice por fecha de Transacciones
+    (7, """
+        CREATE INDEX IF NOT EXISTS idx_transacciones_fecha
+            ON Transacciones (fecha_hora);
+    """),
+
+    # 8 — Vínculos de MovimientosSaldo sin FOREIGN KEY y vistas *Historico
+    #     (el archivo histórico adjunto es solo de SQLite: aquí leen las tablas)
+    (8, """
+        ALTER TABLE MovimientosSaldo
+            DROP CONSTRAINT IF EXISTS movimientossaldo_registro_id_fkey,
+            DROP CONSTRAINT IF EXISTS movimientossaldo_transaccion_id_fkey;
+
+        CREATE INDEX IF NOT EXISTS idx_registros_cerrados
+            ON Registros (fecha_salida_prevista) WHERE estado = 'Cerrado';
+
+        CREATE OR REPLACE VIEW RegistrosHistorico     AS SELECT * FROM Registros;
+        CREATE OR REPLACE VIEW TransaccionesHistorico AS SELECT * FROM Transacciones;
+        CREATE OR REPLACE VIEW AcompanantesHistorico  AS SELECT * FROM Acompanantes;
+    """),
+
+    # 9 — Reservas con fecha (create_reserva serializa por habitación con un
+    #     advisory lock: ver PostgresBackend.lock_key)
+    (9, """
+        CREATE TABLE IF NOT EXISTS Reservas (
+            id              INTEGER GENERATED BY DEFAULT AS IDENTITY PRIMARY KEY,
+            habitacion_id   INTEGER NOT NULL REFERENCES Habitaciones(numero),
+            huesped_id      INTEGER REFERENCES Huespedes(id),
+            nombre_contacto TEXT    NOT NULL,
+            telefono        TEXT,
+            fecha_entrada   TEXT    NOT NULL,
+            fecha_salida    TEXT    NOT NULL,
+            estado          TEXT    NOT NULL DEFAULT 'Confirmada',
+            notas           TEXT,
+            usuario_id      INTEGER REFERENCES Usuarios(id),
+            fecha_creacion  TEXT    NOT NULL,
+            CHECK (fecha_salida > fecha_entrada)
+        );
+
+        CREATE INDEX IF NOT EXISTS idx_reservas_habitacion
+            ON Reservas (habitacion_id, fecha_entrada) WHERE estado = 'Confirmada';
+
+        CREATE INDEX IF NOT EXISTS idx_reservas_salida
+            ON Reservas (fecha_salida) WHERE estado = 'Confirmada';
+
+        CREATE TRIGGER trg_cambios_reservas
+        AFTER INSERT OR UPDATE OR DELETE ON Reservas
+        FOR EACH ROW EXECUTE FUNCTION sgh_registrar_cambio('Reservas', 'id');
+    """),
+
+    # 10 — Historial de la tasa Bs/$ sembrado desde las transacciones
+    (10, """
+        CREATE TABLE IF NOT EXISTS TasasCambio (
+            id            INTEGER GENERATED BY DEFAULT AS IDENTITY PRIMARY KEY,
+            tasa          DOUBLE PRECISION NOT NULL,
+            vigente_desde TEXT    NOT NULL,
+            usuario       TEXT,
+            origen        TEXT    NOT NULL DEFAULT 'config'
+        );
+
+        CREATE INDEX IF NOT EXISTS idx_tasas_vigente
+            ON TasasCambio (vigente_desde, id);
+
+        INSERT INTO TasasCambio (tasa, vigente_desde, origen)
+        SELECT tasa_cambio, fecha_hora, 'transacciones'
+        FROM (SELECT tasa_cambio, fecha_hora,
+                     LAG(tasa_cambio) OVER (ORDER BY fecha_hora, id) AS anterior
+              FROM TransaccionesHistorico) AS t
+        WHERE anterior IS NULL OR anterior <> tasa_cambio;
+
+        INSERT INTO TasasCambio (tasa, vigente_desde, usuario)
+        SELECT tasa_dolar_bs, to_char(localtimestamp, 'YYYY-MM-DD"T"HH24:MI:SS'), usuario_activo
+        FROM Configuracion
+        WHERE id = 1
+          AND tasa_dolar_bs IS DISTINCT FROM (SELECT tasa FROM TasasCambio
+                                              ORDER BY vigente_desde DESC, id DESC LIMIT 1);
+    """),
+
+    # 11 — Documentos de huéspedes en forma canónica, solo los que no chocan
+    #      con otro huésped (la fusión es manage.py fusionar-documentos)
+    (11, """
+        WITH n AS (
+            SELECT id, documento,
+                   UPPER(regexp_replace(documento, '[[:space:].-]', '', 'g')) AS doc
+            FROM Huespedes
+        )
+        UPDATE Huespedes h
+        SET documento = n.doc
+        FROM n
+        WHERE n.id = h.id
+          AND n.doc <> n.documento
+          AND n.doc IN (SELECT doc FROM n GROUP BY doc HAVING COUNT(*) = 1);
+    """),
+]
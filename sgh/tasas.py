@@ -0,0 +1,70 @@
+"""
+tasas.py - Historial de la tasa Bs/$ con búsqueda por fecha
+Sistema de Gestión Hotelera (SGH)
+
+Cada cambio de tasa_dolar_bs agrega una fila a TasasCambio (ver
+database.update_config). El historial completo cabe en memoria: se carga en
+dos listas paralelas ordenadas por vigente_desde y la tasa vigente en un
+momento dado es un bisect:
+
+    i = bisect_right(desde, momento) - 1     # último cambio hasta ese momento
+
+Para convertir muchas filas a la vez (las transacciones de un mes, los días
+de un reporte) se ordenan una vez por fecha y se recorren junto con el
+historial, sin una búsqueda ni una consulta por fila.
+
+Las fechas son textos ISO (AAAA-MM-DD o AAAA-MM-DDTHH:MM:SS), que se ordenan
+igual que el tiempo. Antes del primer cambio registrado rige la tasa más
+antigua conocida.
+"""
+from bisect import bisect_right
+
+
+class RateHistory:
+    """Tasas Bs/$ ordenadas por vigente_desde (filas de "tasas.historial")."""
+
+    def __init__(self, filas, tasa_actual: float | None = None):
+        self.desde = [f["vigente_desde"] for f in filas]
+        self.tasas = [f["tasa"] for f in filas]
+        # Sin historial (base recién creada) rige la tasa de Configuracion
+        self.tasa_actual = self.tasas[-1] if self.tasas else tasa_actual
+
+    def __len__(self) -> int:
+        return len(self.tasas)
+
+    def rate_at(self, momento: str) -> float | None:
+        """Tasa vigente en `momento` (fecha o fecha y hora ISO)."""
+        if not self.tasas:
+            return self.tasa_actual
+        return self.tasas[max(bisect_right(self.desde, momento) - 1, 0)]
+
+    def tasas_por_dia(self, dias: list[str]) -> list[float | None]:
+        """Tasa con la que cerró cada día AAAA-MM-DD de `dias` (ordenados)."""
+        return self._recorrer([f"{d[:10]}T23:59:59.999999" for d in dias])
+
+    def convertir(self, filas, campo_fecha: str = "fecha_hora", campo_usd: str = "monto_usd",
+                  campo_bs: str = "monto_bs_historico",
+                  campo_tasa: str = "tasa_historica") -> list[dict]:
+        """
+        Copia de `filas` (dicts o sqlite3.Row) con la tasa vigente en
+        campo_fecha y el monto en Bs a esa tasa. Conserva el orden recibido.
+        """
+        filas = [dict(f) for f in filas]
+        orden = sorted(range(len(filas)), key=lambda i: filas[i][campo_fecha])
+        tasas = self._recorrer([filas[i][campo_fecha] for i in orden])
+        for i, tasa in zip(orden, tasas):
+            fila = filas[i]
+            fila[campo_tasa] = tasa
+            fila[campo_bs]   = round((fila[campo_usd] or 0) * tasa, 2) if tasa else None
+        return filas
+
+    def _recorrer(self, momentos: list[str]) -> list[float | None]:
+        """Tasas de `momentos` ya ordenados, avanzando a la par del historial."""
+        if not self.tasas:
+            return [self.tasa_actual] * len(momentos)
+        resultado, i, n = [], 0, len(self.desde)
+        for momento in momentos:
+            while i + 1 < n and self.desde[i + 1] <= momento:
+                i += 1
+            resultado.append(self.tasas[i])
+        return resultado
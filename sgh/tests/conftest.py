@@ -0,0 +1,48 @@
+"""
+conftest.py - Configuración común de las pruebas del SGH
+
+Los módulos del proyecto se importan por nombre (import database as db),
+igual que desde main.py: la carpeta sgh/ se agrega al path.
+
+    cd sgh && python -m pytest tests
+"""
+import os
+import sys
+
+import pytest
+
+SGH_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if SGH_DIR not in sys.path:
+    sys.path.insert(0, SGH_DIR)
+
+import database as db   # noqa: E402
+
+
+@pytest.fixture
+def base(tmp_path, monkeypatch):
+    """DAL apuntando a una base SQLite nueva en un directorio temporal."""
+    db.close_pool()
+    monkeypatch.setattr(db, "BACKEND", "sqlite")
+    monkeypatch.setattr(db, "DB_NAME", str(tmp_path / "hotel.db"))
+    monkeypatch.setattr(db, "ARCHIVE_DB", "")
+    yield db
+    db.close_pool()
+
+
+def nuevo_huesped(documento: str, nombres: str = "Huésped de prueba") -> int:
+    return db.create_huesped({
+        "documento": documento, "nombres": nombres, "telefono": "",
+        "fecha_nacimiento": "", "nacionalidad": "Venezolano", "profesion": "",
+        "vehiculo": "",
+    })
+
+
+def transaccion(registro_id: int | None, monto_usd: float, tipo: str = "Pago",
+                metodo: str = "Efectivo USD", usuario_id: int = 1,
+                fecha_hora: str = "2024-05-01T10:00:00", tasa: float = 36.0) -> dict:
+    return {
+        "registro_id": registro_id, "monto_usd": monto_usd, "tasa_cambio": tasa,
+        "monto_bs": round(monto_usd * tasa, 2), "metodo_pago": metodo, "tipo": tipo,
+        "fecha_hora": fecha_hora, "usuario_id": usuario_id, "referencia": "",
+        "descripcion": "",
+    }
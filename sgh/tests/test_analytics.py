@@ -0,0 +1,99 @@
+"""
+analytics.py: la carga en arreglos se reutiliza durante el día mientras no
+cambien estancias, habitaciones ni cargos, y las fechas ilegibles no rompen
+el reporte.
+"""
+from datetime import date, timedelta
+
+import pytest
+
+from conftest import nuevo_huesped, transaccion
+
+np = pytest.importorskip("numpy")
+
+import analytics   # noqa: E402
+
+
+@pytest.fixture
+def datos(base):
+    base.init_db()
+    analytics._cache.clear()
+    yield base
+    analytics._cache.clear()
+
+
+def _checkin(db, habitacion: int, entrada: str, salida: str, cargo: float = 100.0) -> int:
+    return db.checkin_completo(nuevo_huesped(f"V-{habitacion}"), habitacion, entrada, salida,
+                               cargo=transaccion(None, cargo, tipo="Cargo", metodo="Cargo",
+                                                 fecha_hora=entrada + "T12:00:00"))
+
+
+def test_pagos_no_recargan(datos):
+    reg_id = _checkin(datos, 1, "2024-05-01", "2024-05-03")
+    primera = analytics.get_data()
+
+    datos.create_transacciones([transaccion(reg_id, 50.0), transaccion(reg_id, 50.0)])
+    assert analytics.get_data() is primera
+    assert primera.seq == datos.get_last_change_seq()
+
+    _checkin(datos, 2, "2024-05-02", "2024-05-04")
+    segunda = analytics.get_data()
+    assert segunda is not primera
+    assert len(segunda.entrada) == 2
+
+
+def test_cargo_posterior_y_cambio_de_dia_recargan(datos, monkeypatch):
+    reg_id = _checkin(datos, 1, "2024-05-01", "2024-05-03")
+    primera = analytics.get_data()
+
+    datos.create_transacciones([transaccion(reg_id, 40.0, tipo="Cargo", metodo="Cargo")])
+    segunda = analytics.get_data()
+    assert segunda is not primera
+    assert segunda.tarifa.tolist() != primera.tarifa.tolist()
+    assert analytics.get_data() is segunda
+
+    # Pasada la medianoche la estancia activa vencida ocupa un día más
+    class Manana(date):
+        @classmethod
+        def today(cls):
+            return date.today() + timedelta(days=1)
+
+    monkeypatch.setattr(analytics, "date", Manana)
+    tercera = analytics.get_data()
+    assert tercera is not segunda
+    assert tercera.salida[0] == segunda.salida[0] + 1
+
+
+def test_fechas_ilegibles_se_omiten(datos):
+    _checkin(datos, 1, "2024-05-01", "2024-05-03", cargo=80.0)
+    malas = [_checkin(datos, hab, "2024-05-01", "2024-05-03") for hab in (3, 4, 5)]
+    # Valores viejos o corregidos a mano (el resumen diario no los vuelve a leer)
+    with datos.get_connection(write=True) as conn:
+        conn.execute("UPDATE Registros SET estado='Cerrado'")   # las activas llegan hasta hoy
+        conn.executemany("UPDATE Registros SET fecha_entrada=?, fecha_salida_prevista=? WHERE id=?",
+                         [("01/05/2024", "2024-05-03", malas[0]),
+                          ("2460432.5", "2024-05-03", malas[1]),
+                          ("2024-05-01", "", malas[2])])
+
+    rep = analytics.get_ocupacion("2024-05-01", "2024-05-31")
+    assert rep["omitidas"] == 3
+    assert rep["total"]["resumen"]["noches_vendidas"] == 2
+    assert rep["total"]["resumen"]["ingresos"] == 80.0
+
+
+def test_ingresos_bs_a_la_tasa_cobrada(datos):
+    """Los Bs salen de cada cargo; el historial solo valora los cargos sin tasa."""
+    with datos.get_connection(write=True) as conn:
+        conn.executemany("INSERT INTO TasasCambio (tasa, vigente_desde, usuario) VALUES (?,?,?)",
+                         [(40.0, "2024-05-01T00:00:00", "admin"),
+                          (50.0, "2024-05-02T00:00:00", "admin")])
+    _checkin(datos, 1, "2024-05-01", "2024-05-03", cargo=50.0)    # 1800 Bs a 36
+    datos.checkin_completo(nuevo_huesped("V-2"), 2, "2024-05-02", "2024-05-03",
+                           cargo=transaccion(None, 20.0, tipo="Cargo", metodo="Cargo", tasa=0.0,
+                                             fecha_hora="2024-05-02T12:00:00"))
+    with datos.get_connection(write=True) as conn:
+        conn.execute("UPDATE Registros SET estado='Cerrado'")
+
+    resumen = analytics.get_ocupacion("2024-05-01", "2024-05-31")["total"]["resumen"]
+    assert resumen["ingresos"] == 70.0
+    assert resumen["ingresos_bs"] == 1800.0 + 20.0 * 50.0
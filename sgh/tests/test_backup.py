@@ -0,0 +1,67 @@
+"""
+Copias de seguridad: la base y su archivo histórico salen de la misma
+instantánea, y una sola terminal obtiene el turno de la copia automática.
+"""
+import sqlite3
+import time
+import types
+
+import backup
+from conftest import nuevo_huesped, transaccion
+
+
+def _contar(path: str, sql: str) -> int:
+    conn = sqlite3.connect(path)
+    try:
+        return conn.execute(sql).fetchone()[0]
+    finally:
+        conn.close()
+
+
+def test_archivo_de(tmp_path):
+    carpeta = tmp_path / "hotel.dbs"
+    carpeta.mkdir()
+    for nombre in ("sgh-20240501.db.z", "sgh-20240501.archivo.db.z",
+                   "sgh-20240502.db", "sgh-20240502.archivo.db", "sgh-20240503.db"):
+        (carpeta / nombre).touch()
+    assert backup.archivo_de(str(carpeta / "sgh-20240501.db.z")) \
+        == str(carpeta / "sgh-20240501.archivo.db.z")
+    assert backup.archivo_de(str(carpeta / "sgh-20240502.db")) \
+        == str(carpeta / "sgh-20240502.archivo.db")
+    assert backup.archivo_de(str(carpeta / "sgh-20240503.db")) is None
+
+
+def test_copia_consistente_con_el_archivo(base, monkeypatch):
+    """Archivar a mitad de la copia no duplica ni pierde la estancia en el conjunto."""
+    base.init_db()
+    huesped = nuevo_huesped("V-1")
+    reg_id = base.checkin_completo(huesped, 1, "2024-05-01", "2024-05-02",
+                                   cargo=transaccion(None, 30.0, tipo="Cargo", metodo="Cargo"))
+    base.registrar_pagos_y_checkout(reg_id, 1, huesped, 0.0, [transaccion(reg_id, 30.0)])
+
+    movidos = []
+
+    def pausa(_segundos):
+        if not movidos:
+            movidos.append(base.archivar_historial(dias=-1))
+
+    monkeypatch.setattr(backup, "BACKUP_PAGES_PER_STEP", 1)
+    monkeypatch.setattr(backup, "time", types.SimpleNamespace(
+        sleep=pausa, perf_counter=time.perf_counter, time=time.time))
+    res = backup.crear_backup(comprimir=False)
+
+    assert movidos and movidos[0]["registros"] == 1
+    assert res["archivo_historico"] == backup.archivo_de(res["archivo"])
+    copias = [_contar(res["archivo"], "SELECT COUNT(*) FROM Registros"),
+              _contar(res["archivo_historico"], "SELECT COUNT(*) FROM Registros")]
+    assert copias == [1, 0]   # la instantánea es anterior al archivado
+    assert _contar(base.archive_path(), "SELECT COUNT(*) FROM Registros") == 1
+
+
+def test_un_solo_turno_por_intervalo(base):
+    base.init_db()
+    assert base.tomar_turno("backup", 3600) == 0
+    espera = base.tomar_turno("backup", 3600)
+    assert 3590 < espera <= 3600
+    # Otro intervalo más corto ya venció: el turno vuelve a estar libre
+    assert base.tomar_turno("backup", 0) == 0
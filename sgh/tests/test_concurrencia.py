@@ -0,0 +1,87 @@
+"""
+Varias terminales (procesos) escribiendo a la vez sobre un mismo hotel.db:
+WAL, busy_timeout y BEGIN IMMEDIATE con reintentos (_reintentar_ocupado).
+Ningún "database is locked" debe llegar al llamador y no se pierde ninguna fila.
+"""
+import multiprocessing
+import sqlite3
+import traceback
+
+import database as db
+from conftest import nuevo_huesped, transaccion
+
+PROCESOS     = 4
+ESTANCIAS    = 12    # check-in + pagos + check-out por proceso
+PAGOS        = 3     # líneas de pago por estancia
+HABITACIONES = 3     # habitaciones propias de cada proceso (no comparten lógica)
+
+
+def _terminal(db_name: str, n: int, salida):
+    """Una terminal: check-ins, pagos sueltos y check-outs intercalados."""
+    db.DB_NAME = db_name
+    # Timeout corto: la contención llega a _reintentar_ocupado en vez de
+    # resolverse siempre dentro del busy handler de SQLite.
+    db.BUSY_TIMEOUT_MS = 100
+    errores = []
+    try:
+        huesped = nuevo_huesped(f"V-STRESS-{n}")
+        habitaciones = [n * HABITACIONES + i + 1 for i in range(HABITACIONES)]
+        for i in range(ESTANCIAS):
+            hab = habitaciones[i % HABITACIONES]
+            fecha = f"2024-05-{i % 28 + 1:02d}T10:00:00"
+            reg_id = db.checkin_completo(
+                huesped, hab, fecha[:10], "2024-06-01", f"terminal {n}",
+                cargo=transaccion(None, 30.0, tipo="Cargo", metodo="Cargo",
+                                  usuario_id=n + 1, fecha_hora=fecha),
+            )
+            db.create_transacciones([transaccion(reg_id, 10.0, usuario_id=n + 1,
+                                                 fecha_hora=fecha)
+                                     for _ in range(PAGOS - 1)])
+            db.registrar_pagos_y_checkout(reg_id, hab, huesped, 0.0,
+                                          [transaccion(reg_id, 10.0, usuario_id=n + 1,
+                                                       fecha_hora=fecha)])
+    except Exception:
+        errores.append(traceback.format_exc())
+    finally:
+        db.close_pool()
+    salida.put((n, errores))
+
+
+def test_terminales_concurrentes(base):
+    base.init_db()
+    base.close_pool()
+
+    ctx    = multiprocessing.get_context("spawn")
+    salida = ctx.Queue()
+    procesos = [ctx.Process(target=_terminal, args=(base.DB_NAME, n, salida))
+                for n in range(PROCESOS)]
+    for p in procesos:
+        p.start()
+    resultados = dict(salida.get(timeout=120) for _ in procesos)
+    for p in procesos:
+        p.join(timeout=30)
+        assert p.exitcode == 0
+
+    errores = [e for errs in resultados.values() for e in errs]
+    assert not [e for e in errores if "locked" in e or "busy" in e], errores[0]
+    assert not errores, errores[0]
+
+    conn = sqlite3.connect(base.DB_NAME)
+    try:
+        def contar(sql):
+            return conn.execute(sql).fetchone()[0]
+
+        estancias = PROCESOS * ESTANCIAS
+        assert contar("SELECT COUNT(*) FROM Registros") == estancias
+        assert contar("SELECT COUNT(*) FROM Registros WHERE estado = 'Cerrado'") == estancias
+        assert contar("SELECT COUNT(*) FROM Transacciones WHERE tipo = 'Cargo'") == estancias
+        assert contar("SELECT COUNT(*) FROM Transacciones WHERE tipo = 'Pago'") == estancias * PAGOS
+        # Los triggers del resumen diario vieron cada pago una sola vez
+        assert contar("SELECT SUM(cantidad) FROM ResumenDiarioPagos") == estancias * PAGOS
+        assert contar("SELECT SUM(checkins) FROM ResumenDiarioEstancias") == estancias
+        assert contar("SELECT COUNT(*) FROM Registros WHERE estado = 'Activo'") == 0
+        for n in range(PROCESOS):
+            assert contar(f"SELECT COUNT(*) FROM Transacciones WHERE usuario_id = {n + 1}") \
+                == ESTANCIAS * (PAGOS + 1)
+    finally:
+        conn.close()
@@ -0,0 +1,27 @@
+"""
+exportacion.py: tasa y monto en Bs se exportan tal como se registraron; las
+filas sin tasa toman la vigente en su fecha.
+"""
+import csv
+import io
+
+import exportacion
+from conftest import nuevo_huesped, transaccion
+
+
+def test_filas_sin_tasa_usan_el_historial(base):
+    base.init_db()
+    with base.get_connection(write=True) as conn:
+        conn.executemany("INSERT INTO TasasCambio (tasa, vigente_desde, usuario) VALUES (?,?,?)",
+                         [(40.0, "2024-05-01T00:00:00", "admin"),
+                          (50.0, "2024-05-02T00:00:00", "admin")])
+    reg_id = base.checkin_completo(nuevo_huesped("V-1"), 1, "2024-05-01", "2024-05-03")
+    base.create_transacciones([transaccion(reg_id, 10.0, fecha_hora="2024-05-02T10:00:00"),
+                               transaccion(reg_id, 20.0, fecha_hora="2024-05-02T11:00:00",
+                                           tasa=0.0)])
+
+    salida = io.StringIO()
+    assert exportacion.exportar_transacciones("2024-05-01", "2024-05-31", salida) == 2
+    filas = list(csv.DictReader(io.StringIO(salida.getvalue())))
+    assert [(float(f["tasa_cambio"]), float(f["monto_bs"])) for f in filas] \
+        == [(36.0, 360.0), (50.0, 1000.0)]
@@ -0,0 +1,16 @@
+"""
+Búsqueda de huéspedes: el documento se compara normalizado, así que el texto
+escrito con guiones, puntos o en minúsculas encuentra el documento guardado.
+"""
+from conftest import nuevo_huesped
+
+
+def test_busqueda_por_documento_con_formato(base):
+    base.init_db()
+    huesped = nuevo_huesped("V12345678", "Ana Pérez")
+    nuevo_huesped("V98765432", "Luis Gómez")
+
+    for texto in ("V12345", "V-12.345", "v-12345678", " v 12.345.678 "):
+        assert [h["id"] for h in base.search_huespedes(texto)] == [huesped], texto
+    assert [h["id"] for h in base.search_huespedes("pér")] == [huesped]
+    assert base.search_huespedes("-.") == []
@@ -0,0 +1,83 @@
+"""
+EXPLAIN QUERY PLAN de las consultas frecuentes del DAL: cada una debe
+resolverse con su índice (SEARCH … USING INDEX / COVERING INDEX) y no con un
+recorrido completo de la tabla. Si una migración o un cambio de consulta
+deja de usar el índice, la prueba lo señala.
+"""
+import re
+
+import pytest
+
+from queries import registry
+
+# (sentencia, parámetros, índice que debe usar)
+CONSULTAS = [
+    ("transacciones.por_turno",           (1, "2024-05-01"),    "idx_transacciones_usuario_fecha"),
+    ("turnos.totales",                    (1, "2024-05-01"),    "idx_transacciones_usuario_fecha"),
+    ("turnos.pagos",                      (1, "2024-05-01"),    "idx_transacciones_usuario_fecha"),
+    ("transacciones.por_registro",        (1,),                 "idx_transacciones_registro"),
+    ("transacciones.total_pagado",        (1,),                 "idx_transacciones_registro"),
+    ("transacciones.ultima_de_registro",  (1,),                 "idx_transacciones_registro"),
+    ("registros.activo",                  (1,),                 "idx_registros_activos"),
+    ("huespedes.por_documento",           ("V12345678",),       "sqlite_autoindex_Huespedes_1"),
+    ("huespedes.rango_documento",         ("V1", "V2", 20),     "sqlite_autoindex_Huespedes_1"),
+    ("huespedes.con_saldo",               (),                   "idx_huespedes_saldo"),
+    ("saldos.movimientos",                (1, 50),              "idx_movimientos_huesped"),
+    ("cierres.historial",                 (),                   "idx_cierres_fecha"),
+    ("reservas.solapada",                 (1, "2024-05-10", "2024-05-01", 0),
+                                                                "idx_reservas_habitacion"),
+    ("reservas.del_checkin",              (1, "2024-05-01", "2024-05-01", 1),
+                                                                "idx_reservas_habitacion"),
+    ("tasas.historial",                   (),                   "idx_tasas_vigente"),
+    ("exportar.transacciones",            {"desde": "2024-05-01", "hasta": "2024-06-01"},
+                                                                "idx_transacciones_fecha"),
+]
+
+# Recorrido completo sin índice: "SCAN Tabla" o "SCAN alias" sin "USING"
+_SCAN_SIN_INDICE = re.compile(r"^SCAN (\S+)$")
+
+
+def _plan(conn, nombre: str, params) -> list[str]:
+    return [fila[3] for fila in conn.execute("EXPLAIN QUERY PLAN " + registry.sql(nombre), params)]
+
+
+@pytest.fixture
+def conn(base, monkeypatch):
+    """Conexión a una base nueva migrada con migrate() (sin archivo adjunto)."""
+    monkeypatch.setattr(base, "ARCHIVE_ENABLED", False)
+    with base.get_connection() as conn:
+        assert base.migrate(conn) == base.SCHEMA_VERSION
+        yield conn
+
+
+@pytest.mark.parametrize("nombre, params, indice", CONSULTAS, ids=[c[0] for c in CONSULTAS])
+def test_consulta_usa_indice(conn, nombre, params, indice):
+    plan = _plan(conn, nombre, params)
+    texto = "\n".join(plan)
+    assert re.search(rf"USING (COVERING )?INDEX {indice}\b", texto), texto
+    assert not [p for p in plan if _SCAN_SIN_INDICE.match(p)], texto
+
+
+def test_reportes_leen_el_resumen_por_clave(conn):
+    for nombre in ("reportes.rango_pagos", "reportes.rango_dias", "reportes.dia_pagos"):
+        params = ("2024-05-01",) if nombre == "reportes.dia_pagos" else ("2024-05-01", "2024-05-31")
+        texto = "\n".join(_plan(conn, nombre, params))
+        assert "SEARCH ResumenDiarioPagos USING PRIMARY KEY" in texto, texto
+
+
+def test_cambios_por_rango_de_seq(conn):
+    plan = _plan(conn, "cambios.habitaciones", {"seq": 10, "hasta": 20})
+    assert not [p for p in plan if _SCAN_SIN_INDICE.match(p)], plan
+    assert all("USING INTEGER PRIMARY KEY (rowid>? AND rowid<?)" in p
+               for p in plan if p.startswith("SEARCH c ")), plan
+
+
+def test_exportacion_con_archivo_usa_ambos_indices(base):
+    """Con el archivo histórico adjunto, la exportación busca por fecha en las dos bases."""
+    base.init_db()
+    with base.get_connection() as conn:
+        plan  = _plan(conn, "exportar.transacciones", {"desde": "2024-05-01", "hasta": "2024-06-01"})
+    texto = "\n".join(plan)
+    assert "USING INDEX idx_transacciones_fecha" in texto, texto
+    assert "USING INDEX idx_arch_transacciones_fecha" in texto, texto
+    assert not [p for p in plan if p.startswith("SCAN ")], texto
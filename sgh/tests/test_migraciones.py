@@ -0,0 +1,71 @@
+"""
+Documentos de huéspedes: la migración 11 solo normaliza los que no chocan con
+otro huésped; la fusión de duplicados es un paso explícito (fusionar_documentos),
+también sobre el archivo histórico.
+"""
+from conftest import nuevo_huesped, transaccion
+
+
+def _volver_a_version(db, version: int):
+    with db.get_connection(write=True) as conn:
+        db.get_backend().set_schema_version(conn, version)
+
+
+def test_migracion_no_fusiona(base):
+    base.init_db()
+    # Documentos guardados antes de la normalización (create_huesped no normaliza)
+    canonico = nuevo_huesped("V12345678", "Ana Pérez")
+    legado   = nuevo_huesped("V-12.345.678", "Ana Perez")
+    suelto   = nuevo_huesped("e 987.654")
+
+    _volver_a_version(base, 10)
+    base.init_db()
+
+    assert base.get_huesped_by_documento("E987654")["id"] == suelto
+    assert base.get_huesped_by_id(legado)["documento"] == "V-12.345.678"
+    assert base.get_huesped_by_id(canonico)["documento"] == "V12345678"
+    plan = base.plan_fusion_documentos()
+    assert [(g["conservar"]["id"], [d["id"] for d in g["duplicados"]]) for g in plan] \
+        == [(canonico, [legado])]
+
+
+def test_fusiona_documentos(base):
+    base.init_db()
+    canonico = nuevo_huesped("V12345678", "Ana Pérez")
+    legado   = nuevo_huesped("V-12.345.678", "Ana Perez")
+    with base.get_connection(write=True) as conn:
+        conn.execute("UPDATE Huespedes SET telefono='0414-5551234' WHERE id=?", (legado,))
+
+    # Estancia del duplicado con saldo a favor, luego pasada al archivo
+    reg_id = base.checkin_completo(legado, 3, "2024-05-01", "2024-05-02",
+                                   cargo=transaccion(None, 30.0, tipo="Cargo", metodo="Cargo"))
+    base.registrar_pagos_y_checkout(reg_id, 3, legado, 15.0, [transaccion(reg_id, 45.0)])
+    base.archivar_historial(dias=-1)
+    reserva = base.create_reserva({"habitacion_id": 4, "huesped_id": legado,
+                                   "nombre_contacto": "Ana", "fecha_entrada": "2030-01-01",
+                                   "fecha_salida": "2030-01-03"})
+
+    plan = base.fusionar_documentos()
+    assert [g["documento"] for g in plan] == ["V12345678"]
+
+    huesped = base.get_huesped_by_documento(base.normalizar_documento("V-12.345.678"))
+    assert huesped["id"] == canonico
+    assert huesped["nombres"] == "Ana Pérez"
+    assert huesped["telefono"] == "0414-5551234"
+    assert huesped["saldo_acumulado"] == 15.0
+    assert base.get_huesped_by_id(legado) is None
+    assert base.verificar_saldos(completo=True) == []
+
+    movimientos = base.get_movimientos_saldo(canonico)
+    assert movimientos[0]["monto"] == 0
+    assert f"#{legado}" in movimientos[0]["concepto"]
+    with base.get_connection() as conn:
+        assert conn.execute("SELECT huesped_principal_id FROM RegistrosHistorico WHERE id=?",
+                            (reg_id,)).fetchone()[0] == canonico
+        assert conn.execute("SELECT COUNT(*) FROM archivo.Registros").fetchone()[0] == 1
+        assert conn.execute("SELECT huesped_id FROM Reservas WHERE id=?",
+                            (reserva,)).fetchone()[0] == canonico
+
+    # Ya normalizados: otra pasada no cambia nada
+    assert base.plan_fusion_documentos() == []
+    assert base.fusionar_documentos() == []
@@ -0,0 +1,50 @@
+"""
+notificaciones.py: la carga completa del heap olvida los avisos entregados
+de días anteriores (ya no pueden volver a programarse) y, al arrancar, no
+repite los que vencieron antes del inicio del proceso.
+"""
+from datetime import date, timedelta
+
+import notificaciones
+from conftest import nuevo_huesped
+
+
+def test_cargar_poda_entregados(base):
+    base.init_db()
+    hoy    = date.today()
+    reg_id = base.checkin_completo(nuevo_huesped("V-1"), 3, hoy.isoformat(),
+                                   (hoy + timedelta(days=1)).isoformat())
+    _, ayer   = notificaciones._hora_aviso((hoy - timedelta(days=1)).isoformat(), 23)
+    _, manana = notificaciones._hora_aviso((hoy + timedelta(days=1)).isoformat(),
+                                           notificaciones.NOTIFY_CHECKOUT_HOUR)
+
+    avisos = notificaciones.NotificationScheduler()
+    avisos._entregados = {(("salida", 99), ayer), (("salida", reg_id), manana)}
+    avisos._cargar()
+
+    assert avisos._entregados == {(("salida", reg_id), manana)}
+    assert avisos._dia == hoy
+    assert ("salida", reg_id) in avisos._vigentes
+
+
+def test_reinicio_no_repite_avisos(base, monkeypatch):
+    base.init_db()
+    hoy     = date.today()
+    vencida = base.checkin_completo(nuevo_huesped("V-1"), 3, hoy.isoformat(),
+                                    (hoy + timedelta(days=1)).isoformat())
+    base.checkin_completo(nuevo_huesped("V-2"), 4, hoy.isoformat(),
+                          (hoy + timedelta(days=2)).isoformat())
+    _, aviso = notificaciones._hora_aviso((hoy + timedelta(days=1)).isoformat(),
+                                          notificaciones.NOTIFY_CHECKOUT_HOUR)
+
+    # El proceso arrancó después de la hora del primer aviso
+    avisos = notificaciones.NotificationScheduler()
+    avisos._inicio = aviso + 1
+    avisos._cargar()
+    assert avisos._entregados == {(("salida", vencida), aviso)}
+
+    entregadas = []
+    avisos.subscribe(entregadas.append)
+    monkeypatch.setattr(notificaciones.time, "time", lambda: aviso + 2)
+    avisos._entregar_vencidos()
+    assert entregadas == []
@@ -0,0 +1,189 @@
+"""
+Motor PostgreSQL (experimental): aplica MIGRATIONS_PG sobre una base temporal
+y recorre las rutas principales del DAL a través de PostgresBackend.
+
+Solo corre si SGH_TEST_PG_DSN apunta a un servidor donde el usuario pueda
+crear bases, p. ej.:
+
+    SGH_TEST_PG_DSN="host=localhost user=postgres" python -m pytest tests/test_postgres.py
+
+La base sgh_test_<pid> se crea al empezar y se borra al terminar.
+"""
+import os
+import threading
+
+import pytest
+
+from conftest import nuevo_huesped, transaccion
+
+PG_DSN = os.environ.get("SGH_TEST_PG_DSN", "")
+if not PG_DSN:
+    pytest.skip("SGH_TEST_PG_DSN no definido", allow_module_level=True)
+psycopg = pytest.importorskip("psycopg")
+pytest.importorskip("psycopg_pool")
+
+from psycopg.conninfo import make_conninfo   # noqa: E402
+
+
+@pytest.fixture
+def pg(monkeypatch):
+    """DAL sobre una base PostgreSQL nueva, migrada con init_db()."""
+    import database as db
+
+    nombre = f"sgh_test_{os.getpid()}"
+    with psycopg.connect(PG_DSN, autocommit=True) as admin:
+        admin.execute(f"DROP DATABASE IF EXISTS {nombre}")
+        admin.execute(f"CREATE DATABASE {nombre}")
+    db.close_pool()
+    monkeypatch.setattr(db, "BACKEND", "postgresql")
+    monkeypatch.setattr(db, "PG_DSN", make_conninfo(PG_DSN, dbname=nombre))
+    monkeypatch.setattr(db, "PG_EXPERIMENTAL", True)
+    try:
+        db.init_db()
+        yield db
+    finally:
+        db.close_pool()
+        with psycopg.connect(PG_DSN, autocommit=True) as admin:
+            admin.execute(f"DROP DATABASE IF EXISTS {nombre} WITH (FORCE)")
+
+
+def test_requiere_activar_experimental(monkeypatch):
+    import database as db
+    db.close_pool()
+    monkeypatch.setattr(db, "BACKEND", "postgresql")
+    monkeypatch.setattr(db, "PG_DSN", PG_DSN)
+    with pytest.raises(RuntimeError, match="experimental"):
+        db.get_backend()
+
+
+def test_migraciones(pg):
+    backend = pg.get_backend()
+    assert backend.name == "postgresql"
+    with pg.get_connection() as conn:
+        assert pg.get_schema_version(conn) == pg.SCHEMA_VERSION
+    assert len(pg.get_all_habitaciones()) == 39
+    # Una segunda pasada no vuelve a aplicar nada
+    pg.init_db()
+    assert pg.get_config()["tasa_dolar_bs"] == 36.0
+
+
+def test_migracion_documentos(pg):
+    """La 11 normaliza sin fusionar; la fusión explícita corre igual en PostgreSQL."""
+    canonico = nuevo_huesped("V12345678")
+    legado   = nuevo_huesped("V-12.345.678")
+    suelto   = nuevo_huesped("e 987.654")
+    pg.checkin_completo(legado, 2, "2024-05-01", "2024-05-02")
+    with pg.get_connection(write=True) as conn:
+        pg.get_backend().set_schema_version(conn, 10)
+    pg.init_db()
+
+    assert pg.get_huesped_by_documento("E987654")["id"] == suelto
+    assert pg.get_huesped_by_id(legado)["documento"] == "V-12.345.678"
+
+    pg.fusionar_documentos()
+    assert pg.get_huesped_by_documento("V12345678")["id"] == canonico
+    assert pg.get_huesped_by_id(legado) is None
+    assert pg.get_registro_activo(2)["huesped_principal_id"] == canonico
+
+
+def test_checkin_pagos_y_checkout(pg):
+    huesped = nuevo_huesped("V-1", "Ana Pérez")
+    assert [h["id"] for h in pg.search_huespedes("pér")] == [huesped]
+
+    reg_id = pg.checkin_completo(huesped, 5, "2024-05-01", "2024-05-04",
+                                 cargo=transaccion(None, 90.0, tipo="Cargo", metodo="Cargo"))
+    assert pg.get_registro_activo(5)["id"] == reg_id
+    with pytest.raises(ValueError):
+        pg.checkin_completo(huesped, 5, "2024-05-01", "2024-05-04")
+
+    pg.create_transacciones([transaccion(reg_id, 20.0),
+                             transaccion(reg_id, 30.0, metodo="Zelle")])
+    turno = pg.get_resumen_turno(1, "2024-01-01")
+    assert turno["cantidad"] == 2 and turno["total_usd"] == 50.0
+    assert turno["metodos"] == {"Efectivo USD": 20.0, "Zelle": 30.0}
+    assert pg.get_shift_totals(1, "2024-01-01").as_dict() == turno
+
+    pg.registrar_pagos_y_checkout(reg_id, 5, huesped, 10.0, [transaccion(reg_id, 50.0)])
+    assert pg.get_registro_activo(5) is None
+    assert pg.get_shift_totals(1, "2024-01-01").total_usd == 100.0
+    assert pg.get_huesped_by_id(huesped)["saldo_acumulado"] == 10.0
+    assert pg.verificar_saldos(completo=True) == []
+
+
+def test_feed_de_cambios(pg):
+    inicio = pg.get_last_change_seq()
+    huesped = nuevo_huesped("V-2")
+    pg.checkin_completo(huesped, 7, "2024-05-01", "2024-05-03")
+
+    cambios = pg.get_changes_since(inicio)
+    assert not cambios["reload"]
+    assert cambios["seq"] == pg.get_last_change_seq() > inicio
+    assert {"Huespedes", "Registros"} <= {c["tabla"] for c in cambios["cambios"]}
+
+    habitaciones = pg.get_habitaciones_changed_since(inicio)["habitaciones"]
+    assert [h["numero"] for h in habitaciones] == [7]
+    assert pg.get_habitaciones_changed_since(cambios["seq"])["habitaciones"] == []
+
+
+def test_resumen_diario(pg):
+    huesped = nuevo_huesped("V-3")
+    reg_id = pg.checkin_completo(huesped, 9, "2024-05-01", "2024-05-03",
+                                 cargo=transaccion(None, 60.0, tipo="Cargo", metodo="Cargo"))
+    pg.create_transacciones([transaccion(reg_id, 25.0),
+                             transaccion(reg_id, 35.0, metodo="Zelle",
+                                         fecha_hora="2024-05-02T09:00:00")])
+
+    antes = pg.get_resumen_rango("2024-05-01", "2024-05-31")
+    assert antes["checkins"] == 1
+    assert [d["fecha"] for d in antes["dias"]] == ["2024-05-01", "2024-05-02"]
+    assert sum(p["total_usd"] for p in antes["pagos"]) == 60.0
+    # Los triggers y el recálculo completo dan lo mismo
+    pg.rebuild_resumen_diario()
+    assert pg.get_resumen_rango("2024-05-01", "2024-05-31") == antes
+
+
+def test_reservas(pg):
+    inicio = pg.get_last_change_seq()
+    reserva = {"habitacion_id": 11, "nombre_contacto": "Luis",
+               "fecha_entrada": "2030-01-01", "fecha_salida": "2030-01-05"}
+    rid = pg.create_reserva(reserva)
+    with pytest.raises(ValueError):
+        pg.create_reserva({**reserva, "fecha_entrada": "2030-01-03", "fecha_salida": "2030-01-06"})
+    # Salida y entrada el mismo día no se solapan
+    pg.create_reserva({**reserva, "fecha_entrada": "2030-01-05", "fecha_salida": "2030-01-07"})
+
+    pg.set_estado_reserva(rid, "Cancelada")
+    delta = pg.get_reservas_changed_since(inicio)
+    assert {r["id"]: r["estado"] for r in delta["reservas"]}[rid] == "Cancelada"
+    pg.create_reserva({**reserva, "fecha_salida": "2030-01-02"})
+
+    # El check-in del día cumple la reserva y bloquea nuevas reservas encima
+    hoy = pg.create_reserva({**reserva, "habitacion_id": 13, "fecha_entrada": "2024-05-01",
+                             "fecha_salida": "2024-05-03"})
+    pg.checkin_completo(nuevo_huesped("V-4"), 13, "2024-05-01", "2030-01-03")
+    assert pg.get_reserva(hoy)["estado"] == "Cumplida"
+    with pytest.raises(ValueError):
+        pg.create_reserva({**reserva, "habitacion_id": 13})
+
+
+def test_reservas_concurrentes(pg):
+    """Varias terminales reservando la misma fecha: el bloqueo deja pasar una sola."""
+    reserva = {"habitacion_id": 12, "nombre_contacto": "Terminal",
+               "fecha_entrada": "2030-02-01", "fecha_salida": "2030-02-04"}
+    resultados = []
+    barrera = threading.Barrier(4)
+
+    def reservar():
+        barrera.wait()
+        try:
+            resultados.append(pg.create_reserva(reserva))
+        except ValueError as e:
+            resultados.append(e)
+
+    hilos = [threading.Thread(target=reservar) for _ in range(4)]
+    for h in hilos:
+        h.start()
+    for h in hilos:
+        h.join()
+    assert len([r for r in resultados if isinstance(r, int)]) == 1
+    assert len([r for r in resultados if isinstance(r, ValueError)]) == 3
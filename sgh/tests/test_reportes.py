@@ -0,0 +1,54 @@
+"""
+reportes.py: la caché de PDF se consulta con una versión barata de los
+datos; recopilar() solo corre cuando no hay un reporte para esa versión.
+"""
+import pytest
+
+import reportes
+from conftest import nuevo_huesped, transaccion
+
+
+@pytest.fixture
+def contador(base, monkeypatch):
+    base.init_db()
+    llamadas = []
+    original = reportes.recopilar
+
+    def recopilar(*args):
+        llamadas.append(args)
+        return original(*args)
+
+    monkeypatch.setattr(reportes, "recopilar", recopilar)
+    return llamadas
+
+
+def _generar() -> str:
+    return reportes.generar_reporte("ingresos", "2024-05-01", "2024-05-31", en_proceso=False)
+
+
+def test_cache_por_version(base, contador):
+    huesped = nuevo_huesped("V-1")
+    reg_id = base.checkin_completo(huesped, 1, "2024-05-01", "2024-05-03")
+    base.create_transacciones([transaccion(reg_id, 40.0)])
+
+    primero = _generar()
+    assert _generar() == primero
+    assert len(contador) == 1
+
+    # Un pago nuevo cambia la versión: se recopila y se genera otro PDF
+    base.create_transacciones([transaccion(reg_id, 10.0)])
+    segundo = _generar()
+    assert segundo != primero and len(contador) == 2
+
+    # Cambiar la tasa tampoco deja un reporte viejo
+    base.update_config({"tasa_dolar_bs": 40.0})
+    assert _generar() not in (primero, segundo)
+    assert len(contador) == 3
+
+
+def test_tipo_invalido_sin_recopilar(base, contador):
+    with pytest.raises(ValueError):
+        reportes.generar_reporte("ventas", "2024-05-01", "2024-05-31", en_proceso=False)
+    with pytest.raises(ValueError):
+        reportes.generar_reporte("ingresos", "2024-06-01", "2024-05-31", en_proceso=False)
+    assert contador == []
@@ -0,0 +1,74 @@
+"""
+Reservas: el solapamiento se revisa contra otras reservas y contra la
+estancia activa de la habitación (igual que ReservationIndex.libre), y el
+check-in cumple la reserva del día.
+"""
+from datetime import date, timedelta
+
+import pytest
+
+import reservas
+from conftest import nuevo_huesped
+
+
+def _dia(n: int) -> str:
+    return (date.today() + timedelta(days=n)).isoformat()
+
+
+def _reserva(db, habitacion: int, entrada: str, salida: str, **extra) -> int:
+    return db.create_reserva({"habitacion_id": habitacion, "nombre_contacto": "Contacto",
+                              "fecha_entrada": entrada, "fecha_salida": salida, **extra})
+
+
+def test_reserva_contra_estancia_activa(base):
+    base.init_db()
+    base.checkin_completo(nuevo_huesped("V-1"), 5, _dia(0), _dia(3))
+
+    with pytest.raises(ValueError, match="ocupada hasta"):
+        _reserva(base, 5, _dia(2), _dia(4))
+    assert not reservas.get_index().libre(5, _dia(2), _dia(4))
+
+    # Desde el día de salida prevista la habitación queda libre
+    assert reservas.get_index().libre(5, _dia(3), _dia(5))
+    cancelada = _reserva(base, 5, _dia(3), _dia(5))
+    base.set_estado_reserva(cancelada, "Cancelada")
+
+    # Tampoco se puede volver a confirmar una reserva que choca con la estancia
+    vieja = _reserva(base, 6, _dia(1), _dia(2))
+    base.set_estado_reserva(vieja, "Cancelada")
+    base.checkin_completo(nuevo_huesped("V-2"), 6, _dia(0), _dia(4))
+    with pytest.raises(ValueError):
+        base.set_estado_reserva(vieja, "Confirmada")
+
+
+def test_checkin_cumple_la_reserva(base):
+    base.init_db()
+    huesped = nuevo_huesped("V-1")
+    otro    = nuevo_huesped("V-2")
+    propia  = _reserva(base, 7, _dia(-1), _dia(2))                  # llegada tardía
+    ajena   = _reserva(base, 8, _dia(0), _dia(2), huesped_id=otro)
+
+    base.checkin_completo(huesped, 7, _dia(0), _dia(2))
+    base.checkin_completo(huesped, 8, _dia(0), _dia(2))
+
+    assert base.get_reserva(propia)["estado"] == "Cumplida"
+    assert base.get_reserva(propia)["huesped_id"] == huesped
+    assert base.get_reserva(ajena)["estado"] == "Confirmada"
+    assert [r["id"] for r in reservas.proximas_llegadas(3)] == [ajena]
+
+
+def test_estancia_vencida_pasada_la_medianoche(base, monkeypatch):
+    """El índice cargado ayer sigue viendo ocupada la habitación con la salida vencida."""
+    base.init_db()
+    base.checkin_completo(nuevo_huesped("V-1"), 9, _dia(-1), _dia(0))
+    indice = reservas.get_index()
+    assert indice.libre(9, _dia(1), _dia(3))
+
+    class Manana(date):
+        @classmethod
+        def today(cls):
+            return date.today() + timedelta(days=1)
+
+    monkeypatch.setattr(reservas, "date", Manana)
+    assert not indice.libre(9, _dia(1), _dia(3))
+    assert 9 not in reservas.habitaciones_disponibles(_dia(1), _dia(3))
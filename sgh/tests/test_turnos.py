@@ -0,0 +1,33 @@
+"""
+Totales del turno abierto: se ponen al día con el registro de Cambios, sin
+contar dos veces un pago y sin retener el bloqueo durante las consultas.
+"""
+import database
+from conftest import nuevo_huesped, transaccion
+
+
+def test_totales_al_dia_con_el_registro_de_cambios(base):
+    base.init_db()
+    reg_id = base.checkin_completo(nuevo_huesped("V-1"), 1, "2024-05-01", "2024-05-03")
+    base.create_transacciones([transaccion(reg_id, 20.0), transaccion(reg_id, 30.0, metodo="Zelle")])
+
+    totales = base.get_shift_totals(1, "2024-01-01")
+    assert (totales.total_usd, totales.cantidad) == (50.0, 2)
+
+    # Pago de otra terminal (sin el aviso tras el commit) y uno de esta
+    with base.get_connection(write=True) as conn:
+        database._q(conn, "transacciones.insertar", transaccion(reg_id, 5.0))
+    base.create_transaccion(transaccion(reg_id, 10.0, metodo="Zelle"))
+    totales = base.get_shift_totals(1, "2024-01-01")
+    assert totales.cantidad == 4
+    assert totales.metodos == {"Efectivo USD": 25.0, "Zelle": 40.0}
+    assert totales.as_dict() == base.get_resumen_turno(1, "2024-01-01")
+
+    # Con el registro depurado se recalcula completo, sin duplicar
+    with base.get_connection(write=True) as conn:
+        database._q(conn, "transacciones.insertar", transaccion(reg_id, 1.0))
+        database._q(conn, "transacciones.insertar", transaccion(reg_id, 2.0))
+        conn.execute("DELETE FROM Cambios WHERE seq < (SELECT MAX(seq) FROM Cambios)")
+    totales = base.get_shift_totals(1, "2024-01-01")
+    assert (totales.total_usd, totales.cantidad) == (68.0, 6)
+    assert totales.as_dict() == base.get_resumen_turno(1, "2024-01-01")
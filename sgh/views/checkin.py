@@ -4,6 +4,8 @@ views/checkin.py - Flujo completo de Check-in y Check-out
 import flet as ft
 from datetime import datetime, date, timedelta
 import database as db
+import db_async
+import importacion
 from components.payment_row import REQUIRE_REF
 
 
@@ -31,6 +33,8 @@ def CheckinView(page: ft.Page, room_number: int, navigate, checkin_mode: str = "
     hab      = db.get_habitacion(room_number)
     cfg      = db.get_config()
     tasa     = cfg.get("tasa_dolar_bs", 36.0)
+    tasks    = db_async.ViewTasks()   # se cancelan al salir de la vista
+    page.session.set("view_tasks", tasks)
     hoy      = date.today()
 
     # ── Estado ───────────────────────────────────────────────────────────────
@@ -55,7 +59,7 @@ def CheckinView(page: ft.Page, room_number: int, navigate, checkin_mode: str = "
 
     # ── STEP 1: Búsqueda ─────────────────────────────────────────────────────
     search_field = ft.TextField(
-        label="Cédula / Pasaporte",
+        label="Cédula / Pasaporte / Nombre",
         autofocus=True,
         width=300,
         border_color="#334155",
@@ -65,6 +69,7 @@ def CheckinView(page: ft.Page, room_number: int, navigate, checkin_mode: str = "
         prefix_icon=ft.icons.SEARCH,
     )
     search_result = ft.Text("", color="#94a3b8", size=13)
+    search_matches = ft.Column(spacing=4)
 
     # ── STEP 2: Formulario huésped ────────────────────────────────────────────
     f_doc   = _field("Documento *", hint="V-12345678")
@@ -208,37 +213,82 @@ def CheckinView(page: ft.Page, room_number: int, navigate, checkin_mode: str = "
 
     # ─── PASO 1 ───────────────────────────────────────────────────────────────
     def build_step1():
-        def do_search(e):
-            doc = search_field.value.strip().upper()
+        def select_huesped(huesped):
+            state["huesped"] = huesped
+            # Rellenar formulario
+            f_doc.value   = huesped["documento"]
+            f_nom.value   = huesped["nombres"]
+            f_tel.value   = huesped.get("telefono", "")
+            f_nac.value   = huesped.get("fecha_nacimiento", "")
+            f_nacio.value = huesped.get("nacionalidad", "Venezolano")
+            f_prof.value  = huesped.get("profesion", "")
+            f_vehi.value  = huesped.get("vehiculo", "")
+            saldo = huesped["saldo_acumulado"]
+            saldo_str = (f"Saldo a favor: ${saldo:.2f}" if saldo > 0
+                         else f"Deuda pendiente: ${abs(saldo):.2f}" if saldo < 0
+                         else "Sin saldo previo")
+            search_result.value = f"✓ Huésped encontrado: {huesped['nombres']}  |  {saldo_str}"
+            search_result.color = "#4ade80"
+            search_matches.controls = []
+            state["step"] = 3  # Ya tenemos datos, saltar a configurar
+            render_step()
+
+        def nuevo_huesped(texto):
+            search_result.value = f"Huésped nuevo. Complete el formulario de registro."
+            search_result.color = "#fbbf24"
+            search_matches.controls = []
+            # Lo buscado va como documento solo si lo parece; si no, es un nombre
+            doc = db.normalizar_documento(texto)
+            if importacion.es_documento(doc) and any(c.isdigit() for c in doc):
+                f_doc.value = doc
+            else:
+                f_doc.value = ""
+                f_nom.value = " ".join(texto.split())
+            state["step"] = 2
+            render_step()
+
+        def match_row(h):
+            return ft.Container(
+                content=ft.Row(
+                    controls=[
+                        ft.Icon(ft.icons.PERSON_OUTLINE, size=16, color="#94a3b8"),
+                        ft.Text(h["nombres"], color="#f1f5f9", size=13, expand=True),
+                        ft.Text(h["documento"], color="#94a3b8", size=12),
+                    ],
+                    spacing=8,
+                ),
+                bgcolor="#1e293b", border_radius=6, ink=True,
+                padding=ft.padding.symmetric(horizontal=10, vertical=6),
+                on_click=lambda e, h=h: select_huesped(h),
+            )
+
+        @tasks.track
+        async def do_search(e):
+            texto = search_field.value.strip()
+            doc = db.normalizar_documento(texto)
             if not doc:
                 search_result.value = "Ingrese un documento."
                 page.update()
                 return
-            huesped = db.get_huesped_by_documento(doc)
+            huesped = await db_async.get_huesped_by_documento(doc)
             if huesped:
-                state["huesped"] = huesped
-                # Rellenar formulario
-                f_doc.value   = huesped["documento"]
-                f_nom.value   = huesped["nombres"]
-                f_tel.value   = huesped.get("telefono", "")
-                f_nac.value   = huesped.get("fecha_nacimiento", "")
-                f_nacio.value = huesped.get("nacionalidad", "Venezolano")
-                f_prof.value  = huesped.get("profesion", "")
-                f_vehi.value  = huesped.get("vehiculo", "")
-                saldo = huesped["saldo_acumulado"]
-                saldo_str = (f"Saldo a favor: ${saldo:.2f}" if saldo > 0
-                             else f"Deuda pendiente: ${abs(saldo):.2f}" if saldo < 0
-                             else "Sin saldo previo")
-                search_result.value = f"✓ Huésped encontrado: {huesped['nombres']}  |  {saldo_str}"
-                search_result.color = "#4ade80"
-                state["step"] = 3  # Ya tenemos datos, saltar a configurar
-                render_step()
-            else:
-                search_result.value = f"Huésped nuevo. Complete el formulario de registro."
-                search_result.color = "#fbbf24"
-                f_doc.value = doc
-                state["step"] = 2
-                render_step()
+                select_huesped(huesped)
+                return
+            # Sin coincidencia exacta: candidatos ordenados por relevancia
+            candidatos = await db_async.search_huespedes(texto, limit=10)
+            if not candidatos:
+                nuevo_huesped(texto)
+                return
+            search_result.value = f"{len(candidatos)} coincidencia(s). Seleccione o registre uno nuevo."
+            search_result.color = "#94a3b8"
+            search_matches.controls = [match_row(h) for h in candidatos] + [
+                ft.TextButton(
+                    f"+ Registrar nuevo huésped ({texto})",
+                    on_click=lambda e: nuevo_huesped(texto),
+                    style=ft.ButtonStyle(color={"": "#fbbf24"}),
+                )
+            ]
+            page.update()
 
         search_field.on_submit = do_search
 
@@ -262,18 +312,20 @@ def CheckinView(page: ft.Page, room_number: int, navigate, checkin_mode: str = "
                     spacing=8,
                 ),
                 search_result,
+                search_matches,
             ],
             spacing=12,
         )
 
     # ─── PASO 2 ───────────────────────────────────────────────────────────────
     def build_step2():
-        def save_huesped(e):
+        @tasks.track
+        async def save_huesped(e):
             if not f_doc.value.strip() or not f_nom.value.strip():
                 snack("Documento y Nombre son obligatorios.", "#ef4444")
                 return
             data = {
-                "documento":        f_doc.value.strip().upper(),
+                "documento":        db.normalizar_documento(f_doc.value),
                 "nombres":          f_nom.value.strip(),
                 "telefono":         f_tel.value.strip(),
                 "fecha_nacimiento": f_nac.value.strip(),
@@ -282,14 +334,14 @@ def CheckinView(page: ft.Page, room_number: int, navigate, checkin_mode: str = "
                 "vehiculo":         f_vehi.value.strip(),
             }
             # Verificar si ya existe (puede venir de búsqueda)
-            existing = db.get_huesped_by_documento(data["documento"])
+            existing = await db_async.get_huesped_by_documento(data["documento"])
             if existing:
                 data["id"] = existing["id"]
-                db.update_huesped(data)
-                state["huesped"] = db.get_huesped_by_id(existing["id"])
+                await db_async.update_huesped(data)
+                state["huesped"] = await db_async.get_huesped_by_id(existing["id"])
             else:
-                hid = db.create_huesped(data)
-                state["huesped"] = db.get_huesped_by_id(hid)
+                hid = await db_async.create_huesped(data)
+                state["huesped"] = await db_async.get_huesped_by_id(hid)
             state["step"] = 3
             render_step()
 
@@ -340,24 +392,25 @@ def CheckinView(page: ft.Page, room_number: int, navigate, checkin_mode: str = "
             )
             msg_f = ft.Text("", color="#94a3b8", size=12)
 
-            def confirm_acomp(e):
-                doc = doc_f.value.strip().upper()
+            @tasks.track
+            async def confirm_acomp(e):
+                doc = db.normalizar_documento(doc_f.value)
                 if not doc:
                     return
-                hg = db.get_huesped_by_documento(doc)
+                hg = await db_async.get_huesped_by_documento(doc)
                 if not hg:
                     if not nom_f.value.strip():
                         msg_f.value = "Ingrese nombre para crear nuevo huésped."
                         page.update()
                         return
-                    hid = db.create_huesped({
+                    hid = await db_async.create_huesped({
                         "documento": doc,
                         "nombres":   nom_f.value.strip(),
                         "telefono": "", "fecha_nacimiento": "",
                         "nacionalidad": "Venezolano",
                         "profesion": "", "vehiculo": "",
                     })
-                    hg = db.get_huesped_by_id(hid)
+                    hg = await db_async.get_huesped_by_id(hid)
 
                 if any(a["id"] == hg["id"] for a in state["acompanantes"]):
                     msg_f.value = "Ya está en la lista."
@@ -537,30 +590,29 @@ def CheckinView(page: ft.Page, room_number: int, navigate, checkin_mode: str = "
             for d in rows_data
         ]
 
-        def do_checkin(e):
+        @tasks.track
+        async def do_checkin(e):
             try:
-                reg_id = db.create_registro(
+                # Registro, acompañantes y cargo en una sola transacción
+                now       = datetime.now().isoformat()
+                cargo_bs  = await db_async.usd_to_bs(t["subtotal"])
+                reg_id = await db_async.checkin_completo(
                     huesped["id"], room_number,
                     fecha_entrada_ctrl.value, fecha_salida_ctrl.value,
-                    notas_ctrl.value
+                    notas_ctrl.value,
+                    acompanantes=[ac["id"] for ac in state["acompanantes"]],
+                    cargo={
+                        "monto_usd":   t["subtotal"],
+                        "tasa_cambio": tasa,
+                        "monto_bs":    cargo_bs,
+                        "metodo_pago": "Cargo",
+                        "tipo":        "Cargo",
+                        "fecha_hora":  now,
+                        "usuario_id":  user["id"],
+                        "referencia":  "",
+                        "descripcion": f"Cargo estancia {t['dias']} noche(s)",
+                    },
                 )
-                for ac in state["acompanantes"]:
-                    db.add_acompanante(reg_id, ac["id"])
-
-                # Registrar cargo
-                now = datetime.now().isoformat()
-                db.create_transaccion({
-                    "registro_id": reg_id,
-                    "monto_usd":   t["subtotal"],
-                    "tasa_cambio": tasa,
-                    "monto_bs":    db.usd_to_bs(t["subtotal"]),
-                    "metodo_pago": "Cargo",
-                    "tipo":        "Cargo",
-                    "fecha_hora":  now,
-                    "usuario_id":  user["id"],
-                    "referencia":  "",
-                    "descripcion": f"Cargo estancia {t['dias']} noche(s)",
-                })
 
                 # Navegar a pagos
                 page.session.set("selected_room",    room_number)
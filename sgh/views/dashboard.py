@@ -1,9 +1,16 @@
 """
 views/dashboard.py - Panel principal con grid de habitaciones
 """
+import asyncio
+import logging
+import pathlib
+from datetime import date, timedelta
 import flet as ft
 import database as db
-from components.room_card import RoomCard
+import db_async
+import reportes
+import reservas
+from components.room_card import RoomCard, card_signature, update_room_card
 
 ESTADOS_CYCLE = {
     "Libre":         ["Libre", "Reservada", "Aseo", "Mantenimiento"],
@@ -13,10 +20,17 @@ ESTADOS_CYCLE = {
     "Ocupada":       ["Ocupada"],   # Solo via checkout
 }
 
+AUTO_REFRESH_SECONDS = 3   # sondeo del registro de cambios (otras terminales)
+LLEGADAS_DIAS        = 7   # días hacia adelante en "Próximas llegadas"
+
+log = logging.getLogger(__name__)
+
 
 def DashboardView(page: ft.Page, navigate) -> ft.View:
-    user = page.session.get("current_user")
-    cfg  = db.get_config()
+    user  = page.session.get("current_user")
+    cfg   = db.get_config()
+    tasks = db_async.ViewTasks()   # se cancelan al salir de la vista (main.route_change)
+    page.session.set("view_tasks", tasks)
 
     # ── Estado local ─────────────────────────────────────────────────────────
     tasa_field = ft.TextField(
@@ -28,7 +42,6 @@ def DashboardView(page: ft.Page, navigate) -> ft.View:
         focused_border_color="#3b82f6",
         text_style=ft.TextStyle(color="#f1f5f9", size=13),
         suffix_text="Bs/$",
-        on_submit=lambda e: save_tasa(e),
     )
 
     tasa_label = ft.Text(
@@ -39,12 +52,22 @@ def DashboardView(page: ft.Page, navigate) -> ft.View:
     filter_estado = ft.Ref[ft.Dropdown]()
     grid_ref      = ft.Ref[ft.GridView]()
     stats_ref     = ft.Ref[ft.Row]()
+    llegadas_ref  = ft.Ref[ft.Row]()
+
+    # Tarjetas vivas por número de habitación y la firma con que se pintaron;
+    # al recargar solo se repintan las que cambiaron.
+    cards      = {}   # numero -> ft.Container
+    snapshot   = {}   # numero -> card_signature(hab)
+    rooms      = {}   # numero -> última fila conocida de la habitación
+    last_seq   = [0]  # último seq del registro de cambios aplicado
+    grid_lock  = asyncio.Lock()
 
     # ── Helpers ───────────────────────────────────────────────────────────────
-    def save_tasa(e):
+    @tasks.track
+    async def save_tasa(e):
         try:
             nueva = float(tasa_field.value.replace(",", "."))
-            db.update_config({"tasa_dolar_bs": nueva})
+            await db_async.update_config({"tasa_dolar_bs": nueva})
             tasa_label.value = f"Tasa: {nueva} Bs/$"
             page.snack_bar = ft.SnackBar(
                 ft.Text(f"✓ Tasa actualizada a {nueva} Bs/$", color="#4ade80"),
@@ -59,6 +82,8 @@ def DashboardView(page: ft.Page, navigate) -> ft.View:
             page.snack_bar.open = True
             page.update()
 
+    tasa_field.on_submit = save_tasa
+
     def get_stats(habitaciones):
         stats = {"Libre": 0, "Ocupada": 0, "Reservada": 0,
                  "Aseo": 0, "Mantenimiento": 0}
@@ -100,24 +125,121 @@ def DashboardView(page: ft.Page, navigate) -> ft.View:
         )
         return chips
 
-    def reload_grid(e=None):
-        habitaciones = db.get_all_habitaciones()
-        filtro = filter_estado.current.value if filter_estado.current else "Todas"
+    def build_llegadas(llegadas) -> list:
+        if not llegadas:
+            return [ft.Text(f"Sin llegadas reservadas en {LLEGADAS_DIAS} días.",
+                            size=11, color="#475569")]
+        hoy = date.today().isoformat()
+        return [
+            ft.Container(
+                content=ft.Text(
+                    f"{'Hoy' if r['fecha_entrada'] == hoy else r['fecha_entrada'][5:]}"
+                    f" · #{r['habitacion_id']} {r['nombre_contacto']}",
+                    size=11, color="#fbbf24" if r["fecha_entrada"] == hoy else "#cbd5e1",
+                ),
+                bgcolor="#1e293b",
+                border_radius=6,
+                padding=ft.padding.symmetric(horizontal=8, vertical=4),
+            )
+            for r in llegadas
+        ]
 
+    async def refresh_llegadas():
+        llegadas = await db_async.run(reservas.proximas_llegadas, LLEGADAS_DIAS)
+        if llegadas_ref.current:
+            llegadas_ref.current.controls = [
+                ft.Text("Próximas llegadas:", size=11, color="#475569"),
+                *build_llegadas(llegadas),
+            ]
+            llegadas_ref.current.update()
+
+    def sync_cards(habitaciones, completo=True) -> list:
+        """
+        Crea/repinta tarjetas según la firma de cada habitación; retorna las
+        modificadas. Con completo=False (delta) no se eliminan las ausentes.
+        """
+        changed = []
+        vigentes = set()
+        for h in habitaciones:
+            numero = h["numero"]
+            vigentes.add(numero)
+            rooms[numero] = h
+            firma  = card_signature(h)
+            if numero not in cards:
+                cards[numero] = RoomCard(h, on_room_click)
+            elif snapshot.get(numero) != firma:
+                update_room_card(cards[numero], h, on_room_click)
+                changed.append(cards[numero])
+            snapshot[numero] = firma
+        if completo:
+            for numero in set(cards) - vigentes:
+                del cards[numero]
+                snapshot.pop(numero, None)
+                rooms.pop(numero, None)
+        return changed
+
+    def visible_cards(habitaciones) -> list:
+        filtro = filter_estado.current.value if filter_estado.current else "Todas"
         if filtro and filtro != "Todas":
             habitaciones = [h for h in habitaciones if h["estado"] == filtro]
+        return [cards[h["numero"]] for h in habitaciones]
+
+    def render(changed):
+        habitaciones = [rooms[n] for n in sorted(rooms)]
+        visibles     = visible_cards(habitaciones)
 
         if grid_ref.current:
-            grid_ref.current.controls = [
-                RoomCard(h, on_room_click) for h in habitaciones
-            ]
+            grid = grid_ref.current
+            if [id(c) for c in grid.controls] != [id(c) for c in visibles]:
+                # Cambió el conjunto/orden (filtro o estado): se reordenan las
+                # mismas instancias, sin reconstruir tarjetas.
+                grid.controls = visibles
+                grid.update()
+            else:
+                for card in changed:
+                    card.update()
 
         # Siempre mostrar stats del total
-        all_habs = db.get_all_habitaciones()
         if stats_ref.current:
-            stats_ref.current.controls = build_stats_bar(all_habs)
-
-        page.update()
+            stats_ref.current.controls = build_stats_bar(habitaciones)
+            stats_ref.current.update()
+
+    @tasks.track
+    async def reload_grid(e=None):
+        async with grid_lock:
+            # El seq se toma antes de leer: lo que cambie en medio se verá
+            # de nuevo en el próximo sondeo (repintar es idempotente).
+            last_seq[0]  = await db_async.get_last_change_seq()
+            habitaciones = await db_async.get_all_habitaciones()
+            render(sync_cards(habitaciones))
+        await refresh_llegadas()
+
+    async def poll_changes():
+        async with grid_lock:
+            delta = await db_async.get_habitaciones_changed_since(last_seq[0])
+            if delta["reload"]:
+                last_seq[0]  = await db_async.get_last_change_seq()
+                render(sync_cards(await db_async.get_all_habitaciones()))
+                return
+            hubo_cambios = delta["seq"] != last_seq[0]
+            last_seq[0]  = delta["seq"]
+            if delta["habitaciones"]:
+                render(sync_cards(delta["habitaciones"], completo=False))
+        if hubo_cambios:
+            await refresh_llegadas()
+
+    async def auto_refresh():
+        # Corre mientras esta vista siga en pantalla; al navegar se cancela
+        while True:
+            await asyncio.sleep(AUTO_REFRESH_SECONDS)
+            if view not in page.views:
+                return
+            try:
+                await poll_changes()
+            except Exception:
+                # Un fallo transitorio (p. ej. base ocupada) no detiene el sondeo,
+                # pero queda registrado
+                log.exception("No se pudo actualizar el tablero de habitaciones")
 
     def on_room_click(hab):
         estado = hab["estado"]
@@ -144,17 +266,19 @@ def DashboardView(page: ft.Page, navigate) -> ft.View:
             color="#f1f5f9",
         )
 
-        def confirm(e):
+        @tasks.track
+        async def confirm(e):
             nuevo_estado = dd.value
             if nuevo_estado != estado_actual:
-                db.set_estado_habitacion(numero, nuevo_estado)
+                await db_async.set_estado_habitacion(numero, nuevo_estado)
                 page.snack_bar = ft.SnackBar(
                     ft.Text(f"Hab. {numero} → {nuevo_estado}", color="#4ade80"),
                     bgcolor="#1e293b"
                 )
                 page.snack_bar.open = True
             dialog.open = False
-            reload_grid()
+            page.update()
+            await reload_grid()
 
         dialog = ft.AlertDialog(
             modal=True,
@@ -185,18 +309,15 @@ def DashboardView(page: ft.Page, navigate) -> ft.View:
         dialog.open  = True
         page.update()
 
-    def open_turno_dialog(e):
+    @tasks.track
+    async def open_turno_dialog(e):
         user_id     = user["id"]
-        turno_inicio = page.session.get("turno_inicio") or db.get_config().get("turno_inicio", "")
-        transacciones = db.get_transacciones_turno(user_id, turno_inicio)
-
-        total_usd   = sum(t["monto_usd"] for t in transacciones if t["tipo"] == "Pago")
-        total_bs    = sum(t["monto_bs"]  for t in transacciones if t["tipo"] == "Pago")
-        metodos     = {}
-        for t in transacciones:
-            if t["tipo"] == "Pago":
-                m = t["metodo_pago"]
-                metodos[m] = metodos.get(m, 0) + t["monto_usd"]
+        turno_inicio = (page.session.get("turno_inicio")
+                        or (await db_async.get_config()).get("turno_inicio", ""))
+        totales     = await db_async.get_shift_totals(user_id, turno_inicio)
+        total_usd   = totales.total_usd
+        total_bs    = totales.total_bs
+        metodos     = totales.metodos
 
         rows = [
             ft.DataRow(cells=[
@@ -206,9 +327,10 @@ def DashboardView(page: ft.Page, navigate) -> ft.View:
             for m, v in metodos.items()
         ]
 
-        def do_cierre(e):
-            db.registrar_cierre_turno(user_id, turno_inicio, total_usd, total_bs,
-                                       {"metodos": metodos, "total": total_usd})
+        @tasks.track
+        async def do_cierre(e):
+            await db_async.registrar_cierre_turno(user_id, turno_inicio, total_usd, total_bs,
+                                                  {"metodos": metodos, "total": total_usd})
             from datetime import datetime
             nueva_apertura = datetime.now().isoformat()
             page.session.set("turno_inicio", nueva_apertura)
@@ -260,14 +382,179 @@ def DashboardView(page: ft.Page, navigate) -> ft.View:
         dialog.open  = True
         page.update()
 
+    def open_reserva_dialog(e):
+        hoy     = date.today()
+        tipos   = sorted({h["tipo"] for h in rooms.values()})
+        tipo    = ft.Dropdown(label="Tipo", value="Todos", width=150, dense=True,
+                              options=[ft.dropdown.Option(t) for t in ["Todos", *tipos]],
+                              border_color="#334155", color="#f1f5f9",
+                              label_style=ft.TextStyle(color="#64748b", size=11))
+        campos  = dict(width=150, dense=True, border_color="#334155",
+                       text_style=ft.TextStyle(color="#f1f5f9", size=13))
+        entrada = ft.TextField(label="Entrada", value=hoy.isoformat(), **campos)
+        salida  = ft.TextField(label="Salida", value=(hoy + timedelta(days=1)).isoformat(),
+                               **campos)
+        nombre   = ft.TextField(label="Nombre de contacto", **{**campos, "width": 308})
+        telefono = ft.TextField(label="Teléfono", **campos)
+        habitacion = ft.Dropdown(label="Habitación libre", width=150, dense=True,
+                                 border_color="#334155", color="#f1f5f9",
+                                 label_style=ft.TextStyle(color="#64748b", size=11))
+        estado  = ft.Text("", size=12, color="#94a3b8")
+
+        @tasks.track
+        async def buscar(e=None):
+            try:
+                libres = await db_async.run(
+                    reservas.habitaciones_disponibles, entrada.value.strip(),
+                    salida.value.strip(), None if tipo.value == "Todos" else tipo.value)
+            except ValueError as ex:
+                libres, estado.value, estado.color = [], str(ex), "#ef4444"
+            else:
+                estado.value = f"{len(libres)} habitaciones libres."
+                estado.color = "#94a3b8"
+            habitacion.options = [ft.dropdown.Option(str(n)) for n in libres]
+            habitacion.value   = str(libres[0]) if libres else None
+            page.update()
+
+        @tasks.track
+        async def reservar(e):
+            if not habitacion.value:
+                estado.value, estado.color = "Elija una habitación libre.", "#ef4444"
+                page.update()
+                return
+            try:
+                await db_async.create_reserva({
+                    "habitacion_id":   int(habitacion.value),
+                    "nombre_contacto": nombre.value,
+                    "telefono":        telefono.value.strip(),
+                    "fecha_entrada":   entrada.value.strip(),
+                    "fecha_salida":    salida.value.strip(),
+                    "usuario_id":      user["id"],
+                })
+            except ValueError as ex:
+                estado.value, estado.color = str(ex), "#ef4444"
+                page.update()
+                return
+            dialog.open = False
+            page.snack_bar = ft.SnackBar(
+                ft.Text(f"✓ Hab. {habitacion.value} reservada del {entrada.value} "
+                        f"al {salida.value}", color="#4ade80"),
+                bgcolor="#1e293b"
+            )
+            page.snack_bar.open = True
+            page.update()
+            await refresh_llegadas()
+
+        dialog = ft.AlertDialog(
+            modal=True,
+            title=ft.Text("Nueva reserva", color="#f1f5f9"),
+            bgcolor="#1e293b",
+            content=ft.Column(
+                controls=[
+                    ft.Row(controls=[entrada, salida], spacing=8),
+                    ft.Row(controls=[tipo, ft.TextButton("Buscar libres", on_click=buscar)],
+                           spacing=8),
+                    habitacion,
+                    nombre,
+                    telefono,
+                    estado,
+                ],
+                spacing=12,
+                tight=True,
+                width=380,
+            ),
+            actions=[
+                ft.TextButton("Cancelar",
+                              on_click=lambda e: (setattr(dialog, "open", False), page.update()),
+                              style=ft.ButtonStyle(color={"": "#94a3b8"})),
+                ft.ElevatedButton("Reservar", on_click=reservar,
+                                  style=ft.ButtonStyle(
+                                      bgcolor={"": "#3b82f6"},
+                                      color={"": "#ffffff"},
+                                  )),
+            ],
+            actions_alignment=ft.MainAxisAlignment.END,
+        )
+        page.dialog = dialog
+        dialog.open  = True
+        page.update()
+        page.run_task(buscar)
+
+    def open_reportes_dialog(e):
+        hoy   = date.today()
+        tipo  = ft.Dropdown(
+            label="Reporte",
+            value="ingresos",
+            options=[ft.dropdown.Option(k, v) for k, v in reportes.REPORT_TYPES.items()],
+            dense=True,
+            border_color="#334155",
+            color="#f1f5f9",
+            label_style=ft.TextStyle(color="#64748b", size=11),
+        )
+        desde = ft.TextField(label="Desde", value=hoy.replace(day=1).isoformat(),
+                             width=150, dense=True, border_color="#334155",
+                             text_style=ft.TextStyle(color="#f1f5f9", size=13))
+        hasta = ft.TextField(label="Hasta", value=hoy.isoformat(),
+                             width=150, dense=True, border_color="#334155",
+                             text_style=ft.TextStyle(color="#f1f5f9", size=13))
+        estado = ft.Text("", color="#94a3b8", size=12)
+        spinner = ft.ProgressRing(width=16, height=16, stroke_width=2, visible=False)
+
+        # El PDF se maqueta en el proceso de reportes: la ventana sigue respondiendo
+        @tasks.track
+        async def generar(e):
+            boton.disabled, spinner.visible = True, True
+            estado.value, estado.color = "Generando…", "#94a3b8"
+            page.update()
+            try:
+                path = await reportes.generar_reporte_async(tipo.value, desde.value.strip(),
+                                                            hasta.value.strip())
+                estado.value, estado.color = f"✓ {path}", "#4ade80"
+                page.launch_url(pathlib.Path(path).as_uri())
+            except (ValueError, RuntimeError) as ex:
+                estado.value, estado.color = str(ex), "#ef4444"
+            finally:
+                boton.disabled, spinner.visible = False, False
+                page.update()
+
+        boton = ft.ElevatedButton("Generar PDF", on_click=generar,
+                                  style=ft.ButtonStyle(
+                                      bgcolor={"": "#3b82f6"},
+                                      color={"": "#ffffff"},
+                                  ))
+        dialog = ft.AlertDialog(
+            modal=True,
+            title=ft.Text("Reportes PDF", color="#f1f5f9"),
+            bgcolor="#1e293b",
+            content=ft.Column(
+                controls=[tipo, ft.Row(controls=[desde, hasta], spacing=8),
+                          ft.Row(controls=[spinner, estado], spacing=8)],
+                spacing=12,
+                tight=True,
+                width=380,
+            ),
+            actions=[
+                ft.TextButton("Cerrar",
+                              on_click=lambda e: (setattr(dialog, "open", False), page.update()),
+                              style=ft.ButtonStyle(color={"": "#94a3b8"})),
+                boton,
+            ],
+            actions_alignment=ft.MainAxisAlignment.END,
+        )
+        page.dialog = dialog
+        dialog.open  = True
+        page.update()
+
     def do_logout(e):
         page.session.set("current_user", None)
         page.go("/login")
 
     # ── Construcción inicial ───────────────────────────────────────────────────
+    last_seq[0]  = db.get_last_change_seq()
     habitaciones = db.get_all_habitaciones()
     all_stats    = build_stats_bar(habitaciones)
-    room_cards   = [RoomCard(h, on_room_click) for h in habitaciones]
+    sync_cards(habitaciones)
+    room_cards   = visible_cards(habitaciones)
 
     grid = ft.GridView(
         ref=grid_ref,
@@ -340,6 +627,18 @@ def DashboardView(page: ft.Page, navigate) -> ft.View:
                             tooltip="Cierre de turno",
                             on_click=open_turno_dialog,
                         ),
+                        ft.IconButton(
+                            ft.icons.EVENT_AVAILABLE_OUTLINED,
+                            icon_color="#94a3b8",
+                            tooltip="Nueva reserva",
+                            on_click=open_reserva_dialog,
+                        ),
+                        ft.IconButton(
+                            ft.icons.PICTURE_AS_PDF_OUTLINED,
+                            icon_color="#94a3b8",
+                            tooltip="Reportes PDF",
+                            on_click=open_reportes_dialog,
+                        ),
                         ft.IconButton(
                             ft.icons.LOGOUT,
                             icon_color="#ef4444",
@@ -402,7 +701,21 @@ def DashboardView(page: ft.Page, navigate) -> ft.View:
         bgcolor="#0f172a",
     )
 
-    return ft.View(
+    llegadas_bar = ft.Container(
+        content=ft.Row(
+            ref=llegadas_ref,
+            controls=[
+                ft.Text("Próximas llegadas:", size=11, color="#475569"),
+                *build_llegadas(reservas.proximas_llegadas(LLEGADAS_DIAS)),
+            ],
+            spacing=8,
+            scroll=ft.ScrollMode.AUTO,
+        ),
+        padding=ft.padding.symmetric(horizontal=16, vertical=4),
+        bgcolor="#0f172a",
+    )
+
+    view = ft.View(
         route="/dashboard",
         bgcolor="#0f172a",
         padding=0,
@@ -413,6 +726,7 @@ def DashboardView(page: ft.Page, navigate) -> ft.View:
                     stats_bar,
                     usuario_badge,
                     legend,
+                    llegadas_bar,
                     ft.Container(
                         content=grid,
                         expand=True,
@@ -424,3 +738,6 @@ def DashboardView(page: ft.Page, navigate) -> ft.View:
             )
         ],
     )
+
+    tasks.start(page, auto_refresh)
+    return view
@@ -1,11 +1,18 @@
 """
 views/payments.py - Módulo de Pagos Multi-Método y Check-out
 """
+import asyncio
+import logging
 import flet as ft
 from datetime import datetime
 import database as db
+import db_async
 from components.payment_row import PaymentRow, REQUIRE_REF, METODOS
 
+AUTO_REFRESH_SECONDS = 3   # sondeo de pagos registrados desde otras terminales
+
+log = logging.getLogger(__name__)
+
 
 def PaymentsView(page: ft.Page, navigate) -> ft.View:
     user       = page.session.get("current_user")
@@ -13,6 +20,8 @@ def PaymentsView(page: ft.Page, navigate) -> ft.View:
     reg_id     = page.session.get("active_registro_id")
     cfg        = db.get_config()
     tasa       = cfg.get("tasa_dolar_bs", 36.0)
+    tasks      = db_async.ViewTasks()   # se cancelan al salir de la vista
+    page.session.set("view_tasks", tasks)
 
     reg        = db.get_registro_by_id(reg_id) if reg_id else None
     if not reg:
@@ -52,32 +61,74 @@ def PaymentsView(page: ft.Page, navigate) -> ft.View:
     btn_finalizar = ft.Ref[ft.ElevatedButton]()
 
     historial_col = ft.Column(spacing=4)
+    historial_ids = set()
+    last_seq      = [0]
+    historial_lock = asyncio.Lock()   # recarga completa y sondeo no se intercalan
+
+    def historial_item(t):
+        tipo_color = "#4ade80" if t["tipo"] == "Pago" else "#f87171"
+        return ft.Container(
+            content=ft.Row(
+                controls=[
+                    ft.Text(t["tipo"], size=11,
+                            color=tipo_color, width=55),
+                    ft.Text(t["metodo_pago"], size=11,
+                            color="#cbd5e1", expand=True),
+                    ft.Text(f"${t['monto_usd']:.2f}", size=12,
+                            color="#f1f5f9", weight=ft.FontWeight.W_600),
+                    ft.Text(f"Bs.{t['monto_bs']:,.0f}", size=11,
+                            color="#64748b"),
+                    ft.Text(t["referencia"] or "", size=10, color="#475569"),
+                ],
+                spacing=6,
+            ),
+            bgcolor="#1e293b", border_radius=6,
+            padding=ft.padding.symmetric(horizontal=10, vertical=5),
+        )
 
-    def load_historial():
-        txns = db.get_transacciones_registro(reg_id)
+    def fill_historial(seq, txns):
+        last_seq[0] = seq
+        historial_ids.clear()
         historial_col.controls = []
         for t in txns:
-            tipo_color = "#4ade80" if t["tipo"] == "Pago" else "#f87171"
-            historial_col.controls.append(
-                ft.Container(
-                    content=ft.Row(
-                        controls=[
-                            ft.Text(t["tipo"], size=11,
-                                    color=tipo_color, width=55),
-                            ft.Text(t["metodo_pago"], size=11,
-                                    color="#cbd5e1", expand=True),
-                            ft.Text(f"${t['monto_usd']:.2f}", size=12,
-                                    color="#f1f5f9", weight=ft.FontWeight.W_600),
-                            ft.Text(f"Bs.{t['monto_bs']:,.0f}", size=11,
-                                    color="#64748b"),
-                            ft.Text(t["referencia"] or "", size=10, color="#475569"),
-                        ],
-                        spacing=6,
-                    ),
-                    bgcolor="#1e293b", border_radius=6,
-                    padding=ft.padding.symmetric(horizontal=10, vertical=5),
-                )
-            )
+            historial_ids.add(t["id"])
+            historial_col.controls.append(historial_item(t))
+
+    async def _recargar_historial():
+        seq = await db_async.get_last_change_seq()
+        fill_historial(seq, await db_async.get_transacciones_registro(reg_id))
+
+    async def load_historial():
+        async with historial_lock:
+            await _recargar_historial()
+
+    async def poll_historial():
+        """Agrega al historial solo las transacciones nuevas de esta estancia."""
+        async with historial_lock:
+            delta = await db_async.get_transacciones_changed_since(reg_id, last_seq[0])
+            if delta["reload"]:
+                await _recargar_historial()
+                historial_col.update()
+                return
+            last_seq[0] = delta["seq"]
+            nuevas = [t for t in delta["transacciones"] if t["id"] not in historial_ids]
+            if nuevas:
+                for t in nuevas:
+                    historial_ids.add(t["id"])
+                    historial_col.controls.append(historial_item(t))
+                historial_col.update()
+
+    async def auto_refresh():
+        # Corre mientras esta vista siga en pantalla; al navegar se cancela
+        while True:
+            await asyncio.sleep(AUTO_REFRESH_SECONDS)
+            if view not in page.views:
+                return
+            try:
+                await poll_historial()
+            except Exception:
+                # El sondeo sigue (p. ej. base ocupada), pero el error queda registrado
+                log.exception("No se pudo actualizar el historial de pagos de la Hab. %s", room_num)
 
     def recalc_totales():
         suma_usd = sum(p.get("monto_usd", 0) for p in pagos_state.values())
@@ -129,7 +180,8 @@ def PaymentsView(page: ft.Page, navigate) -> ft.View:
                 return f"El pago #{idx + 1} ({p['metodo']}) requiere número de referencia."
         return None
 
-    def finalizar(e):
+    @tasks.track
+    async def finalizar(e):
         error = validate_refs()
         if error:
             page.snack_bar = ft.SnackBar(ft.Text(error, color="#ef4444"),
@@ -142,11 +194,9 @@ def PaymentsView(page: ft.Page, navigate) -> ft.View:
         sobrante = max(suma_usd - total_debe, 0.0)
         now = datetime.now().isoformat()
 
-        # Registrar cada pago
-        for p in pagos_state.values():
-            if p["monto_usd"] <= 0:
-                continue
-            db.create_transaccion({
+        # Pagos y check-out en una sola transacción
+        pagos = [
+            {
                 "registro_id": reg_id,
                 "monto_usd":   round(p["monto_usd"], 4),
                 "tasa_cambio": tasa,
@@ -157,11 +207,12 @@ def PaymentsView(page: ft.Page, navigate) -> ft.View:
                 "usuario_id":  user["id"],
                 "referencia":  p.get("referencia", ""),
                 "descripcion": f"Hab.{room_num} - {dias}n",
-            })
-
-        # Check-out y actualización de saldo
+            }
+            for p in pagos_state.values() if p["monto_usd"] > 0
+        ]
         nuevo_saldo = round(saldo_hues + sobrante, 2)
-        db.checkout_registro(reg_id, room_num, huesped["id"], nuevo_saldo)
+        await db_async.registrar_pagos_y_checkout(reg_id, room_num, huesped["id"],
+                                                  nuevo_saldo, pagos)
 
         # Mensaje de confirmación
         msg = f"✓ Check-out completado. Total cobrado: ${suma_usd:.2f}"
@@ -170,10 +221,10 @@ def PaymentsView(page: ft.Page, navigate) -> ft.View:
         elif nuevo_saldo < 0:
             msg += f" | Deuda registrada: ${abs(nuevo_saldo):.2f}"
 
-        open_receipt(suma_usd, sobrante, nuevo_saldo)
+        await open_receipt(suma_usd, sobrante, nuevo_saldo)
 
-    def open_receipt(cobrado, sobrante, saldo_nuevo):
-        txns = db.get_transacciones_registro(reg_id)
+    async def open_receipt(cobrado, sobrante, saldo_nuevo):
+        txns = await db_async.get_transacciones_registro(reg_id)
         rows = [
             ft.DataRow(cells=[
                 ft.DataCell(ft.Text(t["metodo_pago"], color="#cbd5e1", size=12)),
@@ -237,7 +288,8 @@ def PaymentsView(page: ft.Page, navigate) -> ft.View:
         dialog.open  = True
         page.update()
 
-    def cobro_parcial(e):
+    @tasks.track
+    async def cobro_parcial(e):
         """Registrar pago parcial sin hacer checkout."""
         error = validate_refs()
         if error:
@@ -248,10 +300,8 @@ def PaymentsView(page: ft.Page, navigate) -> ft.View:
             return
 
         now = datetime.now().isoformat()
-        for p in pagos_state.values():
-            if p["monto_usd"] <= 0:
-                continue
-            db.create_transaccion({
+        await db_async.create_transacciones([
+            {
                 "registro_id": reg_id,
                 "monto_usd":   round(p["monto_usd"], 4),
                 "tasa_cambio": tasa,
@@ -262,7 +312,9 @@ def PaymentsView(page: ft.Page, navigate) -> ft.View:
                 "usuario_id":  user["id"],
                 "referencia":  p.get("referencia", ""),
                 "descripcion": f"Pago parcial Hab.{room_num}",
-            })
+            }
+            for p in pagos_state.values() if p["monto_usd"] > 0
+        ])
 
         # Limpiar pagos actuales
         pagos_state.clear()
@@ -272,12 +324,12 @@ def PaymentsView(page: ft.Page, navigate) -> ft.View:
             bgcolor="#1e293b"
         )
         page.snack_bar.open = True
-        load_historial()
+        await load_historial()
         recalc_totales()
         page.update()
 
     # ── Init ──────────────────────────────────────────────────────────────────
-    load_historial()
+    fill_historial(db.get_last_change_seq(), db.get_transacciones_registro(reg_id))
     add_payment_row()
 
     # ── Layout ────────────────────────────────────────────────────────────────
@@ -434,7 +486,7 @@ def PaymentsView(page: ft.Page, navigate) -> ft.View:
         spacing=0,
     )
 
-    return ft.View(
+    view = ft.View(
         route="/payments",
         bgcolor="#0f172a",
         padding=0,
@@ -450,3 +502,6 @@ def PaymentsView(page: ft.Page, navigate) -> ft.View:
             )
         ],
     )
+
+    tasks.start(page, auto_refresh)
+    return view